@@ -0,0 +1,192 @@
+import json
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from locator import locate, locator_key, recorded_strategies
+from step_timings import step_grace, step_timeout
+from failure_policy import step_pages
+from wait_strategies import WAIT_MODE, wait_bound, install_network_tracker, settle
+from fast_actions import ACTION_MODE, fast_change, fast_click
+
+logger = logging.getLogger(__name__)
+
+PLAN_CACHE_SIZE = 256
+
+SCROLL_INTO_VIEW = "arguments[0].scrollIntoView({behavior: 'smooth', block: 'center'});"
+
+
+class Step:
+    """One compiled step of a recorded test case"""
+    __slots__ = ("index", "kind", "description", "css_selector", "xpath", "value",
+                 "url", "page", "scroll_x", "scroll_y", "action_type", "wait_timeout", "native_keys")
+
+    def __init__(self, index, kind, description, css_selector="", xpath="", value="",
+                 url="", page="", scroll_x=0, scroll_y=0, action_type=None, wait_timeout=None,
+                 native_keys=False):
+        self.index = index
+        self.kind = kind
+        self.description = description
+        self.css_selector = css_selector
+        self.xpath = xpath
+        self.value = value
+        self.url = url
+        self.page = page
+        self.scroll_x = scroll_x
+        self.scroll_y = scroll_y
+        self.action_type = action_type
+        self.wait_timeout = wait_timeout if wait_timeout is not None else wait_bound(kind)
+        self.native_keys = native_keys
+
+    def strategies(self):
+        return recorded_strategies(self.css_selector, self.xpath)
+
+
+def actions_hash(actions):
+    """Stable hash of a recorded action list"""
+    normalized = json.dumps(actions or [], sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(normalized.encode('utf-8')).hexdigest()
+
+
+_plan_cache = OrderedDict()
+_plan_lock = threading.Lock()
+
+
+def compile_plan(actions):
+    """Compile recorded actions into an immutable step plan, cached by action hash.
+
+    Mirrors the steps ``testcase_generator.generate_testcase_file`` emits so
+    both execution modes produce identical step records.
+    """
+    key = actions_hash(actions)
+    with _plan_lock:
+        plan = _plan_cache.get(key)
+        if plan is not None:
+            _plan_cache.move_to_end(key)
+            return plan
+
+    steps = list(_compile_steps(actions or []))
+    for step, page in zip(steps, step_pages(step.url for step in steps)):
+        step.page = page
+    plan = tuple(steps)
+
+    with _plan_lock:
+        _plan_cache[key] = plan
+        _plan_cache.move_to_end(key)
+        while len(_plan_cache) > PLAN_CACHE_SIZE:
+            _plan_cache.popitem(last=False)
+    logger.debug(f"Compiled step plan {key[:12]} with {len(plan)} steps")
+    return plan
+
+
+def _compile_steps(actions):
+    step_index = 1
+
+    # Find the login page URL from change or click actions
+    login_url = None
+    for action in actions:
+        if action.get('type') in ['change', 'click'] and action.get('url'):
+            login_url = action.get('url')
+            break
+
+    if login_url:
+        yield Step(step_index, 'navigate', 'Navigate to login page', url=login_url)
+        step_index += 1
+
+    for action in actions:
+        action_type = action.get('type')
+        if action_type == 'navigate':
+            continue  # Skip navigate actions to avoid incorrect navigation
+
+        description = action.get('description', f"Step {step_index}")
+        element = action.get('element') or {}
+        css_selector = element.get('uniqueSelector', '') or ''
+        xpath = element.get('xpath', '') or ''
+        value = str(action.get('value', ''))
+
+        if action_type == 'change' and (css_selector or xpath):
+            kind = 'change'
+        elif action_type == 'click' and (css_selector or xpath):
+            kind = 'click'
+        elif action_type == 'scroll':
+            kind = 'scroll'
+        else:
+            kind = 'unsupported'
+
+        yield Step(
+            step_index, kind, description,
+            css_selector=css_selector,
+            xpath=xpath,
+            value=value,
+            url=action.get('url', '') or '',
+            scroll_x=action.get('scrollX', 0),
+            scroll_y=action.get('scrollY', 0),
+            action_type=action_type,
+            wait_timeout=wait_bound(kind, action),
+            native_keys=bool(action.get('requiresKeyEvents'))
+        )
+        step_index += 1
+
+
+def _run_step(step, driver, key, timeout, grace, log_debug, wait_mode, action_mode):
+    if step.kind == 'navigate':
+        driver.get(step.url)
+        settle(driver, 'navigate', timeout=step.wait_timeout, mode=wait_mode)
+    elif step.kind == 'change' and action_mode == 'fast':
+        fast_change(driver, step.css_selector, step.xpath, step.value, timeout=timeout,
+                    native_keys=step.native_keys, key=key, grace=grace)
+    elif step.kind == 'click' and action_mode == 'fast':
+        fast_click(driver, step.css_selector, step.xpath, timeout=timeout, key=key, grace=grace)
+    elif step.kind == 'change':
+        element = locate(driver, step.strategies(), timeout=timeout, condition="present", key=key, grace=grace)
+        driver.execute_script(SCROLL_INTO_VIEW, element)
+        settle(driver, 'change', element, timeout=step.wait_timeout, mode=wait_mode)
+        element.clear()
+        element.send_keys(step.value)
+    elif step.kind == 'click':
+        element = locate(driver, step.strategies(), timeout=timeout, condition="clickable", key=key, grace=grace)
+        driver.execute_script(SCROLL_INTO_VIEW, element)
+        settle(driver, 'click', element, timeout=step.wait_timeout, mode=wait_mode)
+        element.click()
+    elif step.kind == 'scroll':
+        driver.execute_script(f"window.scrollTo({step.scroll_x}, {step.scroll_y})")
+        settle(driver, 'scroll', timeout=step.wait_timeout, mode=wait_mode)
+
+
+def run_plan(plan, driver, log_debug, print_step_result, wait_mode=None, action_mode=None, test_id=None,
+             skip_step=None):
+    """Execute a compiled plan with the same contract as a generated ``run_test``
+
+    ``test_id`` keys the learned locator ranking and per-step timeouts;
+    without it strategies are tried in recording order with the default timeout.
+    ``skip_step(step, description, page)`` returning True skips a step.
+    """
+    wait_mode = wait_mode or WAIT_MODE
+    action_mode = action_mode or ACTION_MODE
+    # Element lookups poll explicitly, so implicit waits would only slow down misses
+    driver.implicitly_wait(0)
+    driver.maximize_window()
+    if wait_mode != "fixed":
+        install_network_tracker(driver)
+
+    try:
+        for step in plan:
+            log_debug(step.description)
+            if step.kind == 'unsupported':
+                log_debug(f"Unsupported action type: {step.action_type}")
+                print_step_result(step.index, step.description, False, 'Unsupported action type')
+                continue
+            if skip_step is not None and skip_step(step.index, step.description, step.page):
+                continue
+            try:
+                key = locator_key(test_id, step.index, step.url) if test_id is not None else None
+                timeout = step_timeout(test_id, step.index)
+                grace = step_grace(test_id, step.index)
+                _run_step(step, driver, key, timeout, grace, log_debug, wait_mode, action_mode)
+                print_step_result(step.index, step.description, True)
+            except Exception as e:
+                print_step_result(step.index, step.description, False, str(e))
+    except Exception as e:
+        log_debug(f"Test execution aborted: {str(e)}")
+        driver.save_screenshot("test_failure.png")
+        raise
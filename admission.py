@@ -0,0 +1,285 @@
+import os
+import time
+import logging
+import threading
+import multiprocessing
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+MB = 1024 * 1024
+
+# Memory test runs may use in total; defaults to a fraction of system memory
+ADMISSION_MEMORY_BUDGET_MB = int(os.environ.get("ADMISSION_MEMORY_BUDGET_MB", "0"))
+ADMISSION_MEMORY_FRACTION = float(os.environ.get("ADMISSION_MEMORY_FRACTION", "0.7"))
+# Stop admitting while less than this much system memory is available
+ADMISSION_MEMORY_RESERVE_MB = int(os.environ.get("ADMISSION_MEMORY_RESERVE_MB", "512"))
+# ...or while the kernel reports memory stalls above this (PSI "some avg10", percent)
+ADMISSION_PRESSURE_LIMIT = float(os.environ.get("ADMISSION_PRESSURE_LIMIT", "10"))
+# Hard cap on concurrent runs whatever the memory says
+ADMISSION_MAX_CONCURRENCY = int(os.environ.get("ADMISSION_MAX_CONCURRENCY", str(multiprocessing.cpu_count() * 2)))
+# Seconds a single-test request waits for admission before it is rejected
+ADMISSION_TIMEOUT = float(os.environ.get("ADMISSION_TIMEOUT", "60"))
+# Assumed browser tree size until real runs have been measured
+BROWSER_RSS_ESTIMATE_MB = int(os.environ.get("BROWSER_RSS_ESTIMATE_MB", "400"))
+ADMISSION_SAMPLE_INTERVAL = 1.0
+ADMISSION_MAX_BACKOFF = 5.0
+# Weight of the newest peak in the per-run memory estimate
+ESTIMATE_SMOOTHING = 0.2
+
+try:
+    PAGE_BYTES = os.sysconf("SC_PAGE_SIZE")
+except (AttributeError, ValueError, OSError):
+    PAGE_BYTES = 4096
+
+
+class AdmissionRejected(Exception):
+    """A run could not be admitted before its timeout"""
+
+
+def read_processes():
+    """Parent pid and RSS bytes of every process, from /proc (empty if unavailable)"""
+    processes = {}
+    try:
+        pids = [entry for entry in os.listdir("/proc") if entry.isdigit()]
+    except OSError:
+        return processes
+    for pid in pids:
+        try:
+            with open(f"/proc/{pid}/stat", encoding="utf-8", errors="replace") as f:
+                stat = f.read()
+        except OSError:
+            continue
+        # The command name may contain spaces and parentheses
+        fields = stat[stat.rfind(")") + 2:].split()
+        try:
+            processes[int(pid)] = (int(fields[1]), int(fields[21]) * PAGE_BYTES)
+        except (IndexError, ValueError):
+            continue
+    return processes
+
+
+def process_tree(root, processes=None):
+    """Pids of ``root`` and all its descendants that are still running"""
+    processes = processes if processes is not None else read_processes()
+    children = {}
+    for pid, (ppid, _) in processes.items():
+        children.setdefault(ppid, []).append(pid)
+
+    tree = []
+    stack = [root]
+    while stack:
+        pid = stack.pop()
+        if pid in processes:
+            tree.append(pid)
+        stack.extend(children.get(pid, ()))
+    return tree
+
+
+def process_tree_rss(root_pids, processes=None):
+    """Total RSS of each root process and all its descendants"""
+    processes = processes if processes is not None else read_processes()
+    return {
+        root: sum(processes[pid][1] for pid in process_tree(root, processes))
+        for root in root_pids
+    }
+
+
+def read_meminfo():
+    """(total, available) system memory in bytes, or (None, None) if unknown"""
+    values = {}
+    try:
+        with open("/proc/meminfo", encoding="utf-8") as f:
+            for line in f:
+                name, _, rest = line.partition(":")
+                if name in ("MemTotal", "MemAvailable"):
+                    values[name] = int(rest.split()[0]) * 1024
+    except (OSError, ValueError):
+        pass
+    return values.get("MemTotal"), values.get("MemAvailable")
+
+
+def read_memory_pressure():
+    """Share of the last 10s some task stalled on memory, or None if unsupported"""
+    try:
+        with open("/proc/pressure/memory", encoding="utf-8") as f:
+            for line in f:
+                if line.startswith("some"):
+                    for field in line.split():
+                        if field.startswith("avg10="):
+                            return float(field[len("avg10="):])
+    except (OSError, ValueError):
+        pass
+    return None
+
+
+def driver_pid(driver):
+    """Pid of the chromedriver process whose tree holds the browser"""
+    try:
+        return driver.service.process.pid
+    except AttributeError:
+        return None
+
+
+class AdmissionController:
+    """Admits test runs while their projected memory stays within a budget.
+
+    Each running test's browser tree is sampled in the background; a new run
+    is admitted if the measured usage plus one more estimated browser fits
+    the budget and the system is not short of memory. At least one run is
+    always admitted so a tight budget cannot stall everything.
+    """
+
+    def __init__(self, budget_bytes=None, max_concurrency=ADMISSION_MAX_CONCURRENCY,
+                 reserve_bytes=ADMISSION_MEMORY_RESERVE_MB * MB, pressure_limit=ADMISSION_PRESSURE_LIMIT,
+                 estimate_bytes=BROWSER_RSS_ESTIMATE_MB * MB):
+        if budget_bytes is None:
+            total, _ = read_meminfo()
+            if ADMISSION_MEMORY_BUDGET_MB:
+                budget_bytes = ADMISSION_MEMORY_BUDGET_MB * MB
+            elif total:
+                budget_bytes = int(total * ADMISSION_MEMORY_FRACTION)
+        self.budget_bytes = budget_bytes
+        self.max_concurrency = max(1, max_concurrency)
+        self.reserve_bytes = reserve_bytes
+        self.pressure_limit = pressure_limit
+        self.estimate_bytes = estimate_bytes
+        self._running = 0
+        self._queued = 0
+        self._admitted = 0
+        self._rejected = 0
+        # Tracked driver pid -> [current RSS, peak RSS]
+        self._tracked = {}
+        self._available = None
+        self._pressure = None
+        self._sampler = None
+        self._cond = threading.Condition()
+
+    def _fits(self):
+        if self._running == 0:
+            return True
+        if self._running >= self.max_concurrency:
+            return False
+        if self._available is not None and self._available - self.estimate_bytes < self.reserve_bytes:
+            return False
+        if self._pressure is not None and self._pressure > self.pressure_limit:
+            return False
+        if self.budget_bytes is None:
+            return True
+        # Runs not yet measured count at the estimate
+        measured = [usage[0] for usage in self._tracked.values() if usage[0]]
+        projected = sum(measured) + (self._running - len(measured) + 1) * self.estimate_bytes
+        return projected <= self.budget_bytes
+
+    @contextmanager
+    def admit(self, timeout=None):
+        """Hold a run slot; raises ``AdmissionRejected`` if none frees up within ``timeout``"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        backoff = 0.25
+        with self._cond:
+            self._queued += 1
+            try:
+                self._refresh_system()
+                while not self._fits():
+                    remaining = None if deadline is None else deadline - time.monotonic()
+                    if remaining is not None and remaining <= 0:
+                        self._rejected += 1
+                        raise AdmissionRejected(
+                            f"Not enough memory to start another test run ({self._running} running)")
+                    # Back off while memory is short; releases wake waiters early
+                    self._cond.wait(backoff if remaining is None else min(backoff, remaining))
+                    backoff = min(backoff * 2, ADMISSION_MAX_BACKOFF)
+                    self._refresh_system()
+                self._running += 1
+                self._admitted += 1
+            finally:
+                self._queued -= 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._running -= 1
+                self._cond.notify_all()
+
+    def track(self, driver):
+        """Sample ``driver``'s browser tree while a run uses it"""
+        return self.track_pid(driver_pid(driver))
+
+    @contextmanager
+    def track_pid(self, pid):
+        """Sample the process tree under ``pid`` while a run uses it"""
+        if pid is None:
+            yield
+            return
+        with self._cond:
+            self._tracked[pid] = [0, 0]
+            self._start_sampler()
+        try:
+            yield
+        finally:
+            self._sample()
+            with self._cond:
+                _, peak = self._tracked.pop(pid, (0, 0))
+                if peak:
+                    self.estimate_bytes = int(ESTIMATE_SMOOTHING * peak + (1 - ESTIMATE_SMOOTHING) * self.estimate_bytes)
+                self._cond.notify_all()
+
+    def stats(self):
+        with self._cond:
+            return {
+                "running": self._running,
+                "queued": self._queued,
+                "admitted": self._admitted,
+                "rejected": self._rejected,
+                "maxConcurrency": self.max_concurrency,
+                "budgetBytes": self.budget_bytes,
+                "trackedBytes": sum(usage[0] for usage in self._tracked.values()),
+                "estimateBytes": self.estimate_bytes,
+                "availableBytes": self._available,
+                "memoryPressure": self._pressure
+            }
+
+    def _refresh_system(self):
+        _, self._available = read_meminfo()
+        self._pressure = read_memory_pressure()
+
+    def _start_sampler(self):
+        if self._sampler is None or not self._sampler.is_alive():
+            self._sampler = threading.Thread(target=self._sample_loop, name="admission-sampler", daemon=True)
+            self._sampler.start()
+
+    def _sample_loop(self):
+        while True:
+            time.sleep(ADMISSION_SAMPLE_INTERVAL)
+            with self._cond:
+                if not self._tracked:
+                    self._sampler = None
+                    return
+            self._sample()
+
+    def _sample(self):
+        with self._cond:
+            pids = list(self._tracked)
+        if not pids:
+            return
+        totals = process_tree_rss(pids)
+        with self._cond:
+            for pid, rss in totals.items():
+                usage = self._tracked.get(pid)
+                if usage is not None:
+                    usage[0] = rss
+                    usage[1] = max(usage[1], rss)
+            self._refresh_system()
+            self._cond.notify_all()
+
+
+_controller = None
+_controller_lock = threading.Lock()
+
+
+def get_admission_controller():
+    global _controller
+    with _controller_lock:
+        if _controller is None:
+            _controller = AdmissionController()
+        return _controller
@@ -1,32 +1,87 @@
 import os
-import importlib.util
-from selenium import webdriver
+import time
+import types
+import hashlib
+import inspect
+import threading
+from collections import OrderedDict
 from selenium.common.exceptions import WebDriverException
-from webdriver_manager.chrome import ChromeDriverManager
-from selenium.webdriver.chrome.service import Service
+from driver_pool import create_driver
+from action_interpreter import run_plan
+from step_timings import get_step_timings
+from failure_policy import FAILURE_POLICY, StepGate
+from admission import get_admission_controller
+from session_cache import PrefixRun
+from network_profiles import apply_network_profile, collect_network_stats, get_network_profile
+from tracing import Trace, activate, trace_commands
+from run_result import RunResult, StepResult
 from datetime import datetime
-import json
 import traceback
 import logging
 
 
 
 logger = logging.getLogger(__name__)
-def run_selenium_test(testcase_file, test_case_id=None, test_case_name=None):
-    result = {
-        "testCaseId": test_case_id or os.path.basename(testcase_file).replace('.py', ''),
-        "name": test_case_name or os.path.basename(testcase_file).replace('.py', '').replace('_', ' ').title(),
-        "response": {
-            "steps": [],
-            "summary": {
-                "totalSteps": 0,
-                "passed": 0,
-                "failed": 0,
-                "successRate": 0,
-                "status": "PASSED"
-            }
-        }
-    }
+
+# Compiled test modules kept in memory, keyed by path and validated by mtime/size
+MODULE_CACHE_SIZE = 256
+_module_code_cache = OrderedDict()
+_module_code_lock = threading.Lock()
+
+def _load_testcase_module(testcase_file):
+    """Execute a test case file as a fresh module, compiling it only once.
+
+    Modules are never registered in sys.modules, so concurrent runs of
+    the same file do not share module state.
+    """
+    path = os.path.abspath(testcase_file)
+    stat = os.stat(path)
+    signature = (stat.st_mtime_ns, stat.st_size)
+
+    with _module_code_lock:
+        cached = _module_code_cache.get(path)
+        if cached is not None and cached[0] == signature:
+            _module_code_cache.move_to_end(path)
+            code = cached[1]
+        else:
+            code = None
+
+    if code is None:
+        with open(path, encoding='utf-8') as f:
+            code = compile(f.read(), path, 'exec')
+        with _module_code_lock:
+            _module_code_cache[path] = (signature, code)
+            _module_code_cache.move_to_end(path)
+            while len(_module_code_cache) > MODULE_CACHE_SIZE:
+                _module_code_cache.popitem(last=False)
+
+    module_name = f"test_case_{hashlib.sha1(path.encode('utf-8')).hexdigest()[:12]}"
+    module = types.ModuleType(module_name)
+    module.__file__ = path
+    exec(code, module.__dict__)
+    return module
+
+def run_selenium_test(testcase_file, test_case_id=None, test_case_name=None, pool=None, on_event=None,
+                      failure_policy=FAILURE_POLICY, session_prefix=None, network_profile=None, session_cache=None):
+    """Run a generated test case file.
+
+    When ``pool`` is given, the browser is leased from that ``DriverPool``
+    and handed back afterwards instead of being launched and quit per run.
+    Returns a ``RunResult``; call ``to_dict``/``to_json`` at the boundary.
+    ``on_event`` receives each debug line and step record as it happens.
+    ``failure_policy`` ("continue", "abort" or "skip-dependent") decides
+    which steps are marked SKIPPED after a failure. With a ``session_prefix``
+    the login steps are replaced by a cached session when one is available
+    and reported as RESTORED; ``session_cache`` replaces the process-wide
+    cache (worker processes pass a ``SessionHandoff``).
+    ``network_profile`` names the ``network_profiles`` profile deciding
+    which requests the browser blocks (the configured default when None).
+    """
+    result = RunResult(
+        test_case_id or os.path.basename(testcase_file).replace('.py', ''),
+        test_case_name or os.path.basename(testcase_file).replace('.py', '').replace('_', ' ').title()
+    )
+    trace = Trace(result.name)
 
     # File existence check
     if not os.path.isfile(testcase_file):
@@ -34,12 +89,8 @@ def run_selenium_test(testcase_file, test_case_id=None, test_case_name=None):
 
     # Load test case module
     try:
-        spec = importlib.util.spec_from_file_location("test_case", testcase_file)
-        if spec is None or spec.loader is None:
-            return create_error_result(result, f"Failed to create module spec from {testcase_file}")
-            
-        testcase = importlib.util.module_from_spec(spec)
-        spec.loader.exec_module(testcase)
+        with trace.span("module.load", "module", file=os.path.basename(testcase_file)):
+            testcase = _load_testcase_module(testcase_file)
         
         if not hasattr(testcase, 'run_test'):
             return create_error_result(result, f"Test case file {testcase_file} missing 'run_test' function")
@@ -47,64 +98,134 @@ def run_selenium_test(testcase_file, test_case_id=None, test_case_name=None):
     except Exception as e:
         return create_error_result(result, f"Failed to load test case: {str(e)}")
 
-    # Configure Chrome options for low resource usage
-    options = webdriver.ChromeOptions()
-    options.add_argument("--no-sandbox")
-    options.add_argument('--headless=new')  # Enable headless mode
-    options.add_argument("--disable-dev-shm-usage")
-    options.add_argument("--disable-gpu")  # Disable GPU for headless
-    options.add_argument("--disable-extensions")
-    options.add_argument("--window-size=1920,1080")  # Set consistent window size
-    options.add_experimental_option('excludeSwitches', ['enable-logging'])
+    run_test = testcase.run_test
+    if len(inspect.signature(run_test).parameters) < 4:
+        # Files generated before step gating cannot skip steps
+        legacy_run_test = run_test
+        run_test = lambda driver, log_debug, print_step_result, skip_step: legacy_run_test(
+            driver, log_debug, print_step_result)
+
+    return _execute_test(result, run_test, test_case_id, pool, on_event, failure_policy, session_prefix,
+                         network_profile, trace, session_cache)
+
+def run_selenium_plan(plan, test_case_id=None, test_case_name=None, pool=None, on_event=None,
+                      failure_policy=FAILURE_POLICY, session_prefix=None, network_profile=None, session_cache=None):
+    """Run a step plan compiled by ``action_interpreter.compile_plan``.
+
+    Steps execute directly against the driver, skipping file generation and
+    module import; the result has the same shape as ``run_selenium_test``.
+    """
+    result = RunResult(test_case_id, test_case_name)
 
+    def run_test(driver, log_debug, print_step_result, skip_step):
+        run_plan(plan, driver, log_debug, print_step_result, test_id=test_case_id, skip_step=skip_step)
+
+    return _execute_test(result, run_test, test_case_id, pool, on_event, failure_policy, session_prefix,
+                         network_profile, session_cache=session_cache)
+
+def _execute_test(result, run_test, test_case_id, pool, on_event=None, failure_policy=FAILURE_POLICY,
+                  session_prefix=None, network_profile=None, trace=None, session_cache=None):
     driver = None
+    session = None
     current_step_debug = []
+    gate = StepGate(failure_policy)
+    prefix_run = PrefixRun(session_prefix, session_cache) if session_prefix is not None else None
+    timings = get_step_timings()
+    profile = get_network_profile(network_profile)
+    network_applied = False
+    # Spans of this run, on the monotonic clock; also gives each step its durationMs
+    trace = trace or Trace(result.name)
+    result.trace = trace
+    step_started = time.monotonic_ns()
+
+    def emit(event_type, **payload):
+        if on_event is None:
+            return
+        try:
+            on_event({"type": event_type, "testCaseId": result.test_case_id, **payload})
+        except Exception as e:
+            logger.warning(f"Event listener failed for test case {test_case_id}: {str(e)}")
 
     def log_debug(message):
         timestamp = datetime.now().strftime("%H:%M:%S.%f")[:-3]
-        current_step_debug.append(f"[{timestamp}] {message}")
+        line = f"[{timestamp}] {message}"
+        current_step_debug.append(line)
+        emit("log", message=line)
 
-    def print_step_result(step_num, description, success, error_msg=""):
-        nonlocal result
-        status = "PASSED" if success else "FAILED"
-        error = None if success else clean_error_message(error_msg)
-        
-        step_result = {
-            "step": step_num,
-            "description": description,
-            "status": status,
-            "debug": current_step_debug.copy(),
-            "error": error
-        }
-        
-        result["response"]["steps"].append(step_result)
-        
-        if success:
-            result["response"]["summary"]["passed"] += 1
-        else:
-            result["response"]["summary"]["failed"] += 1
-            result["response"]["summary"]["status"] = "FAILED"
-        
+    def add_step(step_num, description, status, error=None):
+        nonlocal step_started
+        now = time.monotonic_ns()
+        trace.add(f"Step {step_num}", "step", step_started, now, description=description, status=status)
+        step_result = StepResult(
+            step=step_num,
+            description=description,
+            status=status,
+            debug=current_step_debug.copy(),
+            error=error,
+            duration_ms=round((now - step_started) / 1e6, 1)
+        )
+        step_started = now
+        result.add_step(step_result)
         current_step_debug.clear()
+        emit("step", step=step_result.to_dict())
+
+    def print_step_result(step_num, description, success, error_msg=""):
+        timings.record(test_case_id, step_num, (time.monotonic_ns() - step_started) / 1e9)
+        gate.step_finished(step_num, success)
+        if prefix_run is not None:
+            prefix_run.after_step(driver, step_num, success)
+        add_step(step_num, description, "PASSED" if success else "FAILED",
+                 None if success else clean_error_message(error_msg))
+
+    def skip_step(step_num, description, page=""):
+        """Record the step as RESTORED or SKIPPED and return True if it must not run"""
+        if prefix_run is not None and prefix_run.before_step(driver, step_num, log_debug):
+            # Not PASSED: the login step never ran, a cached session stood in for it
+            add_step(step_num, description, "RESTORED")
+            return True
+        reason = gate.should_skip(step_num, page)
+        if reason is None:
+            return False
+        add_step(step_num, description, "SKIPPED", f"Skipped because {reason}")
+        return True
+
+    emit("testStarted", name=result.name)
 
     try:
         # Initialize WebDriver
-        logger.debug(f"Initializing Chrome WebDriver for test case {test_case_id}")
-        driver = webdriver.Chrome(
-            service=Service(ChromeDriverManager().install()),
-            options=options
-        )
-        driver.implicitly_wait(5)
-        
+        acquire_started = time.monotonic_ns()
+        with activate(trace):
+            if pool is not None:
+                logger.debug(f"Leasing pooled Chrome WebDriver for test case {test_case_id}")
+                session = pool.acquire(profile.page_load_strategy)
+                driver = session.driver
+            else:
+                logger.debug(f"Initializing Chrome WebDriver for test case {test_case_id}")
+                driver = create_driver(page_load_strategy=profile.page_load_strategy)
+        launched = session is None or session.created_at * 1e9 >= acquire_started
+        trace.add("driver.launch" if launched else "driver.lease", "driver", acquire_started)
+        # Lookups use explicit waits sized per step; implicit waits would only slow down misses
+        driver.implicitly_wait(0)
+        try:
+            with trace.span("network.profile", "driver", profile=profile.name):
+                apply_network_profile(driver, profile)
+            network_applied = True
+        except WebDriverException as e:
+            logger.warning(f"Failed to apply network profile {profile.name}: {str(e)}")
+        step_started = time.monotonic_ns()
+
         # Run the test case
-        logger.debug(f"Starting test execution: {result['name']}")
-        testcase.run_test(driver, log_debug, print_step_result)
+        logger.debug(f"Starting test execution: {result.name}")
+        with activate(trace), get_admission_controller().track(driver), trace_commands(driver, trace):
+            run_test(driver, log_debug, print_step_result, skip_step)
 
     except WebDriverException as e:
+        if session is not None:
+            session.mark_broken()
         error_msg = clean_error_message(str(e))
         logger.error(f"WebDriver error in test case {test_case_id}: {error_msg}")
         print_step_result(
-            len(result["response"]["steps"]) + 1,
+            len(result.steps) + 1,
             "Test execution",
             False,
             error_msg
@@ -114,29 +235,44 @@ def run_selenium_test(testcase_file, test_case_id=None, test_case_name=None):
         error_msg = clean_error_message(traceback.format_exc())
         logger.error(f"Unexpected error in test case {test_case_id}: {error_msg}")
         print_step_result(
-            len(result["response"]["steps"]) + 1,
+            len(result.steps) + 1,
             "Test execution",
             False,
             error_msg
         )
 
     finally:
+        if prefix_run is not None:
+            prefix_run.close()
+
+        if network_applied:
+            try:
+                result.network = collect_network_stats(driver, profile)
+            except WebDriverException as e:
+                logger.warning(f"Failed to collect network stats for test case {test_case_id}: {str(e)}")
+
         # Calculate summary
-        result["response"]["summary"]["totalSteps"] = len(result["response"]["steps"])
-        if result["response"]["summary"]["totalSteps"] > 0:
-            result["response"]["summary"]["successRate"] = int(
-                (result["response"]["summary"]["passed"] / result["response"]["summary"]["totalSteps"]) * 100
-            )
+        result.finalize()
         
-        # Clean up WebDriver
-        if driver:
+        # Hand pooled sessions back, quit one-off ones
+        if session is not None:
+            with trace.span("driver.release", "driver"):
+                pool.release(session)
+            logger.debug(f"WebDriver returned to pool for test case {test_case_id}")
+        elif driver:
             try:
-                driver.quit()
+                with trace.span("driver.quit", "driver"):
+                    driver.quit()
                 logger.debug(f"WebDriver quit for test case {test_case_id}")
             except Exception as e:
                 logger.error(f"Error quitting WebDriver for test case {test_case_id}: {str(e)}")
 
-    return json.dumps(result, indent=2)
+        result.summary.duration_ms = round(trace.elapsed_ms(), 1)
+        result.summary.phases_ms = trace.breakdown()
+        # Root span, so exported traces nest every phase under the test
+        trace.add(f"Test {result.test_case_id}", "test", trace.started_ns)
+
+    return result
 def clean_error_message(error_msg):
     """Simplify and clean up error messages"""
     if not error_msg:
@@ -157,15 +293,13 @@ def clean_error_message(error_msg):
 
 def create_error_result(result, error_message):
     """Create an error result structure"""
-    result["response"]["summary"]["status"] = "ERROR"
-    result["response"]["steps"].append({
-        "step": 1,
-        "description": "Test initialization",
-        "status": "FAILED",
-        "debug": [error_message],
-        "error": error_message
-    })
-    result["response"]["summary"]["totalSteps"] = 1
-    result["response"]["summary"]["failed"] = 1
-    result["response"]["summary"]["successRate"] = 0
-    return json.dumps(result, indent=2)
\ No newline at end of file
+    result.add_step(StepResult(
+        step=1,
+        description="Test initialization",
+        status="FAILED",
+        debug=[error_message],
+        error=error_message
+    ))
+    result.summary.status = "ERROR"
+    result.finalize()
+    return result
\ No newline at end of file
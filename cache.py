@@ -0,0 +1,186 @@
+import os
+import time
+import logging
+import threading
+from collections import OrderedDict
+from run_result import dumps
+
+logger = logging.getLogger(__name__)
+
+# Memory budget per cache, measured as serialized JSON size
+CACHE_MAX_BYTES = int(os.environ.get("CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+# Entries older than this are revalidated with a cheap version query
+CACHE_REVALIDATE_AFTER = float(os.environ.get("CACHE_REVALIDATE_AFTER", "30"))
+
+
+class _Entry:
+    __slots__ = ("value", "version", "size", "checked_at")
+
+    def __init__(self, value, version, size):
+        self.value = value
+        self.version = version
+        self.size = size
+        self.checked_at = time.monotonic()
+
+
+class _Flight:
+    """A load in progress that concurrent callers wait on"""
+    __slots__ = ("done", "value", "error", "superseded")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+        # Set when we write the key while the load is running
+        self.superseded = False
+
+
+class ReadThroughCache:
+    """LRU read-through cache with a memory budget.
+
+    ``load(key)`` fetches a value (None when it does not exist, which is not
+    cached). Entries older than ``revalidate_after`` seconds are checked with
+    ``load_version(key)`` and kept if ``version_of(value)`` still matches,
+    e.g. an ``updated_at`` column. Our own writes go through ``put`` or
+    ``invalidate``. Concurrent misses for the same key share one load.
+    """
+
+    def __init__(self, name, load, load_version=None, version_of=None,
+                 max_bytes=CACHE_MAX_BYTES, revalidate_after=CACHE_REVALIDATE_AFTER):
+        self.name = name
+        self.load = load
+        self.load_version = load_version
+        self.version_of = version_of or (lambda value: None)
+        self.max_bytes = max_bytes
+        self.revalidate_after = revalidate_after
+        self._entries = OrderedDict()
+        self._flights = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._stats = {
+            "hits": 0,
+            "misses": 0,
+            "coalesced": 0,
+            "revalidated": 0,
+            "stale": 0,
+            "evictions": 0,
+            "invalidations": 0
+        }
+
+    def peek(self, key):
+        """Fresh cached value without any I/O, or None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or time.monotonic() - entry.checked_at >= self.revalidate_after:
+                return None
+            self._entries.move_to_end(key)
+            self._stats["hits"] += 1
+            return entry.value
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                if time.monotonic() - entry.checked_at < self.revalidate_after:
+                    self._stats["hits"] += 1
+                    return entry.value
+
+        if entry is not None and self._still_current(key, entry):
+            return entry.value
+        return self._load_coalesced(key)
+
+    def put(self, key, value):
+        """Store a value we just wrote ourselves"""
+        self._store(key, value, from_load=False)
+
+    def _store(self, key, value, from_load):
+        size = len(dumps(value))
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is not None:
+                if from_load and flight.superseded:
+                    # A newer value was written while this load was running
+                    return
+                if not from_load:
+                    flight.superseded = True
+            self._remove(key)
+            if size > self.max_bytes:
+                return
+            self._entries[key] = _Entry(value, self.version_of(value), size)
+            self._bytes += size
+            while self._bytes > self.max_bytes and self._entries:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= evicted.size
+                self._stats["evictions"] += 1
+
+    def invalidate(self, key):
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is not None:
+                flight.superseded = True
+            if self._remove(key):
+                self._stats["invalidations"] += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self._stats["hits"] + self._stats["misses"]
+            return {
+                **self._stats,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "maxBytes": self.max_bytes,
+                "hitRate": round(self._stats["hits"] / lookups, 4) if lookups else 0
+            }
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry.size
+        return entry is not None
+
+    def _still_current(self, key, entry):
+        if self.load_version is None or entry.version is None:
+            return False
+        try:
+            version = self.load_version(key)
+        except Exception as e:
+            logger.warning(f"Version check failed for {self.name} cache key {key}: {str(e)}")
+            return False
+        with self._lock:
+            if version is not None and version == entry.version:
+                entry.checked_at = time.monotonic()
+                self._stats["hits"] += 1
+                self._stats["revalidated"] += 1
+                return True
+            self._stats["stale"] += 1
+        return False
+
+    def _load_coalesced(self, key):
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+                self._stats["misses"] += 1
+            else:
+                self._stats["coalesced"] += 1
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+
+        try:
+            flight.value = self.load(key)
+            if flight.value is not None:
+                self._store(key, flight.value, from_load=True)
+            return flight.value
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
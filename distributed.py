@@ -0,0 +1,189 @@
+import os
+import time
+import socket
+import logging
+import threading
+from work_queue import WORK_LEASE_SECONDS, DONE, open_work_queue
+from action_interpreter import compile_plan
+from app import create_error_result, run_selenium_plan, run_selenium_test
+from driver_pool import DriverPool
+from failure_policy import FAILURE_POLICY
+from run_result import RunResult
+from session_cache import SESSION_REUSE, find_session_prefix
+from profile_template import PROFILE_TEMPLATE, get_profile_template, start_url
+from tracing import export_trace
+from testcase_generator import generate_testcase_file
+
+logger = logging.getLogger(__name__)
+
+# "local" runs tests on this host, "distributed" hands them to queue workers
+EXECUTION_BACKEND = os.environ.get("EXECUTION_BACKEND", "local")
+# Test runs the coordinator keeps outstanding on the queue during a suite
+DISTRIBUTED_MAX_IN_FLIGHT = int(os.environ.get("DISTRIBUTED_MAX_IN_FLIGHT", "64"))
+# Seconds the coordinator waits for a queued test before giving up on it
+DISTRIBUTED_RESULT_TIMEOUT = float(os.environ.get("DISTRIBUTED_RESULT_TIMEOUT", "3600"))
+COORDINATOR_POLL_INTERVAL = 0.5
+WORKER_IDLE_POLL_INTERVAL = 1.0
+
+
+class _Waiter:
+    __slots__ = ("done", "finished")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.finished = None
+
+
+class Coordinator:
+    """Enqueues test runs for remote workers and waits for their results.
+
+    ``run`` blocks like a local run, so run-all, jobs and single runs work
+    unchanged; one background thread polls the queue for all waiters.
+    """
+
+    def __init__(self, queue=None, result_timeout=DISTRIBUTED_RESULT_TIMEOUT):
+        self.queue = queue or open_work_queue()
+        self.result_timeout = result_timeout
+        self._waiters = {}
+        self._poller = None
+        self._lock = threading.Lock()
+
+    def run(self, testcase, test_case_id, test_case_name, execution_mode, on_event=None,
+            failure_policy=FAILURE_POLICY, network_profile=None):
+        """Run a test case on whichever worker claims it and return its ``RunResult``"""
+        item_id = self.queue.enqueue({
+            "testcase": {"id": testcase["id"], "name": testcase.get("name"), "actions": testcase.get("actions") or []},
+            "testCaseId": test_case_id,
+            "testCaseName": test_case_name,
+            "executionMode": execution_mode,
+            "failurePolicy": failure_policy,
+            "networkProfile": network_profile
+        })
+        waiter = _Waiter()
+        with self._lock:
+            self._waiters[item_id] = waiter
+            if self._poller is None:
+                self._poller = threading.Thread(target=self._poll_loop, name="coordinator-poller", daemon=True)
+                self._poller.start()
+
+        if not waiter.done.wait(self.result_timeout):
+            with self._lock:
+                self._waiters.pop(item_id, None)
+            # Also drops an item a worker is still running, so it is never left unacknowledged
+            self.queue.cancel([item_id])
+            return create_error_result(RunResult(test_case_id, test_case_name),
+                                       f"No worker finished the test within {self.result_timeout:.0f}s")
+
+        finished = waiter.finished
+        if finished.status != DONE:
+            return create_error_result(RunResult(test_case_id, test_case_name),
+                                       f"Remote execution failed: {finished.error}")
+        result = RunResult.from_dict(finished.result)
+        # Workers post results, not live events; replay the steps for listeners
+        if on_event is not None:
+            for step in result.steps:
+                on_event({"type": "step", "testCaseId": test_case_id, "step": step.to_dict()})
+        return result
+
+    def stats(self):
+        with self._lock:
+            waiting = len(self._waiters)
+        return {**self.queue.stats(), "waiting": waiting}
+
+    def _poll_loop(self):
+        while True:
+            time.sleep(COORDINATOR_POLL_INTERVAL)
+            with self._lock:
+                item_ids = list(self._waiters)
+                if not item_ids:
+                    self._poller = None
+                    return
+            try:
+                self.queue.requeue_expired()
+                finished = self.queue.finished(item_ids)
+                self.queue.acknowledge([item.id for item in finished])
+            except Exception as e:
+                logger.warning(f"Polling the work queue failed: {str(e)}")
+                continue
+            with self._lock:
+                for item in finished:
+                    waiter = self._waiters.pop(item.id, None)
+                    if waiter is not None:
+                        waiter.finished = item
+                        waiter.done.set()
+
+
+_coordinator = None
+_coordinator_lock = threading.Lock()
+
+
+def get_coordinator():
+    global _coordinator
+    with _coordinator_lock:
+        if _coordinator is None:
+            _coordinator = Coordinator()
+        return _coordinator
+
+
+def _execute_item(payload, pool):
+    testcase = payload["testcase"]
+    # Each worker host keeps its own captured logins
+    session_prefix = find_session_prefix(testcase["actions"]) if SESSION_REUSE else None
+    if PROFILE_TEMPLATE:
+        get_profile_template().observe(start_url(testcase["actions"]))
+    if payload["executionMode"] == "codegen":
+        output_path = generate_testcase_file(testcase, output_dir="testcases")
+        return run_selenium_test(output_path, payload["testCaseId"], payload["testCaseName"], pool=pool,
+                                 failure_policy=payload["failurePolicy"], session_prefix=session_prefix,
+                                 network_profile=payload.get("networkProfile"))
+    return run_selenium_plan(compile_plan(testcase["actions"]), payload["testCaseId"], payload["testCaseName"],
+                             pool=pool, failure_policy=payload["failurePolicy"], session_prefix=session_prefix,
+                             network_profile=payload.get("networkProfile"))
+
+
+def _heartbeat(queue, item_id, worker_id, lease_seconds, stop):
+    while not stop.wait(lease_seconds / 3):
+        try:
+            if not queue.heartbeat(item_id, worker_id, lease_seconds):
+                logger.warning(f"Lost the lease on work item {item_id}; its result will be discarded")
+                return
+        except Exception as e:
+            logger.warning(f"Heartbeat for work item {item_id} failed: {str(e)}")
+
+
+def run_worker(queue=None, worker_id=None, lease_seconds=WORK_LEASE_SECONDS):
+    """Claim and run queued tests on this host's browser until interrupted"""
+    queue = queue or open_work_queue()
+    worker_id = worker_id or os.environ.get("WORKER_ID") or f"{socket.gethostname()}-{os.getpid()}"
+    pool = DriverPool(size=1)
+    logger.info(f"Worker {worker_id} polling for test runs")
+    try:
+        while True:
+            item = queue.claim(worker_id, lease_seconds)
+            if item is None:
+                time.sleep(WORKER_IDLE_POLL_INTERVAL)
+                continue
+
+            logger.info(f"Worker {worker_id} running work item {item.id} (attempt {item.attempts})")
+            stop = threading.Event()
+            threading.Thread(target=_heartbeat, args=(queue, item.id, worker_id, lease_seconds, stop),
+                             name="worker-heartbeat", daemon=True).start()
+            try:
+                result = _execute_item(item.payload, pool)
+                if not queue.complete(item.id, worker_id, result.to_dict()):
+                    logger.warning(f"Work item {item.id} was reassigned or cancelled before it finished")
+                export_trace(result.trace, item.payload["testCaseId"])
+            except Exception as e:
+                logger.error(f"Work item {item.id} failed on worker {worker_id}: {str(e)}")
+                queue.release(item.id, worker_id, str(e))
+            finally:
+                stop.set()
+    except KeyboardInterrupt:
+        logger.info(f"Worker {worker_id} stopping")
+    finally:
+        pool.close()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    run_worker()
@@ -0,0 +1,298 @@
+import os
+import time
+import logging
+import threading
+from selenium import webdriver
+from selenium.webdriver.chrome.service import Service
+from driver_provisioning import get_chromedriver_path
+from network_profiles import PAGE_LOAD_STRATEGY, take_visited_origins, url_origin
+from profile_template import PROFILE_TEMPLATE, get_profile_template
+from tracing import span
+
+logger = logging.getLogger(__name__)
+
+# Pool configuration (overridable through the environment)
+DRIVER_POOL_SIZE = int(os.environ.get("DRIVER_POOL_SIZE", "2"))
+DRIVER_POOL_MAX_USES = int(os.environ.get("DRIVER_POOL_MAX_USES", "25"))
+DRIVER_POOL_MAX_AGE = float(os.environ.get("DRIVER_POOL_MAX_AGE", "1800"))
+# "1" turns off Chrome's background services (updates, sync, safe browsing, translate...)
+CHROME_DISABLE_BACKGROUND = os.environ.get("CHROME_DISABLE_BACKGROUND", "1") == "1"
+
+BACKGROUND_SERVICE_FLAGS = (
+    "--disable-background-networking",
+    "--disable-component-update",
+    "--disable-default-apps",
+    "--disable-sync",
+    "--disable-client-side-phishing-detection",
+    "--disable-domain-reliability",
+    "--disable-features=Translate,OptimizationHints,MediaRouter",
+    "--metrics-recording-only",
+    "--no-first-run",
+    "--mute-audio"
+)
+
+
+def build_chrome_options(user_data_dir=None, page_load_strategy=PAGE_LOAD_STRATEGY):
+    """Chrome options shared by pooled and one-off sessions"""
+    options = webdriver.ChromeOptions()
+    if user_data_dir:
+        options.add_argument(f"--user-data-dir={user_data_dir}")
+    options.add_argument("--no-sandbox")
+    options.add_argument('--headless=new')  # Enable headless mode
+    options.add_argument("--disable-dev-shm-usage")
+    options.add_argument("--disable-gpu")  # Disable GPU for headless
+    options.add_argument("--disable-extensions")
+    options.add_argument("--window-size=1920,1080")  # Set consistent window size
+    options.add_experimental_option('excludeSwitches', ['enable-logging'])
+    if CHROME_DISABLE_BACKGROUND:
+        for flag in BACKGROUND_SERVICE_FLAGS:
+            options.add_argument(flag)
+    options.page_load_strategy = page_load_strategy
+    # Network events feed the per-test request and bytes-saved counts
+    options.set_capability('goog:loggingPrefs', {'performance': 'ALL'})
+    return options
+
+
+class ProfiledChrome(webdriver.Chrome):
+    """Chrome running on a clone of the profile template; the clone is deleted on quit"""
+
+    def __init__(self, profile, **kwargs):
+        self.profile = profile
+        super().__init__(**kwargs)
+
+    def quit(self):
+        try:
+            super().quit()
+        finally:
+            self.profile.discard()
+
+
+def create_driver(user_data_dir=None, page_load_strategy=PAGE_LOAD_STRATEGY):
+    """Launch a new headless Chrome session, on a warm profile clone when a template exists"""
+    with span("driver.provision", "driver"):
+        driver_path = get_chromedriver_path()
+        profile = get_profile_template().clone() if user_data_dir is None and PROFILE_TEMPLATE else None
+    if profile is not None:
+        try:
+            return ProfiledChrome(
+                profile,
+                service=Service(driver_path),
+                options=build_chrome_options(profile.path, page_load_strategy)
+            )
+        except Exception:
+            profile.discard()
+            raise
+    return webdriver.Chrome(
+        service=Service(driver_path),
+        options=build_chrome_options(user_data_dir, page_load_strategy)
+    )
+
+
+def reset_driver(driver):
+    """Return a session to a blank state so the next lease starts clean.
+
+    Raises if the origins the session visited are unknown; the pool then
+    recycles the session instead of leaking storage into the next lease.
+    """
+    origins = take_visited_origins(driver)
+    if origins is None:
+        raise RuntimeError("Visited origins are unknown without the performance log")
+
+    # Close every tab except the first one
+    handles = driver.window_handles
+    for handle in handles[1:]:
+        driver.switch_to.window(handle)
+        driver.close()
+    driver.switch_to.window(handles[0])
+
+    # Clear storage of the current page, then of every origin visited during the lease;
+    # a test may end on an SSO page or on chrome-error:// while the app origin holds tokens
+    driver.execute_script("try { window.localStorage.clear(); window.sessionStorage.clear(); } catch (e) {}")
+    current = url_origin(driver.current_url)
+    if current:
+        origins.add(current)
+    for origin in sorted(origins):
+        driver.execute_cdp_cmd("Storage.clearDataForOrigin", {"origin": origin, "storageTypes": "all"})
+
+    # Cookies for every domain, not just the current one
+    driver.execute_cdp_cmd("Network.clearBrowserCookies", {})
+    driver.get("about:blank")
+    driver.implicitly_wait(0)
+    driver.set_script_timeout(30)
+
+
+class PooledSession:
+    """A leased browser session and its bookkeeping"""
+
+    def __init__(self, driver, page_load_strategy=PAGE_LOAD_STRATEGY):
+        self.driver = driver
+        self.page_load_strategy = page_load_strategy
+        self.created_at = time.monotonic()
+        self.uses = 0
+        self.broken = False
+
+    @property
+    def age(self):
+        return time.monotonic() - self.created_at
+
+    def mark_broken(self):
+        """Flag the session so it is recycled instead of returned to the pool"""
+        self.broken = True
+
+
+class DriverPool:
+    """Process-wide pool of pre-launched headless Chrome sessions.
+
+    Sessions are reset between leases and recycled after ``max_uses`` leases,
+    once older than ``max_age`` seconds, when marked broken, or once a newer
+    profile template replaced the one they started from. ``size`` sessions
+    are launched ahead of time; released sessions stay idle up to the peak
+    number leased at once, so a suite running more tests concurrently than
+    ``size`` reuses its browsers instead of launching new ones per test.
+    Sessions are launched with ``PAGE_LOAD_STRATEGY`` ahead of time; a
+    lease asking for another strategy only reuses sessions started with it.
+    """
+
+    def __init__(self, size=DRIVER_POOL_SIZE, max_uses=DRIVER_POOL_MAX_USES,
+                 max_age=DRIVER_POOL_MAX_AGE, driver_factory=create_driver):
+        self.size = max(0, size)
+        self.max_uses = max(1, max_uses)
+        self.max_age = max_age
+        self.driver_factory = driver_factory
+        self._idle = []
+        self._leased = 0
+        self._peak = 0
+        self._launching = 0
+        self._closed = False
+        self._lock = threading.Lock()
+
+    def warm(self):
+        """Launch sessions until ``size`` idle sessions are available"""
+        while True:
+            with self._lock:
+                if self._closed or len(self._idle) + self._launching >= self.size:
+                    return
+                self._launching += 1
+            try:
+                session = PooledSession(self.driver_factory(page_load_strategy=PAGE_LOAD_STRATEGY))
+            except Exception as e:
+                logger.error(f"Failed to pre-launch Chrome session: {str(e)}")
+                with self._lock:
+                    self._launching -= 1
+                return
+            with self._lock:
+                self._launching -= 1
+                if self._closed:
+                    self._quit(session)
+                    return
+                self._idle.append(session)
+            logger.debug("Pre-launched Chrome session added to pool")
+
+    def warm_async(self):
+        threading.Thread(target=self.warm, name="driver-pool-warm", daemon=True).start()
+
+    def acquire(self, page_load_strategy=PAGE_LOAD_STRATEGY):
+        """Lease a session, launching a new one if no idle session is usable"""
+        while True:
+            with self._lock:
+                if self._closed:
+                    raise RuntimeError("Driver pool is closed")
+                session = self._take_idle(page_load_strategy)
+                self._leased += 1
+                self._peak = max(self._peak, self._leased)
+            if session is None:
+                break
+            if session.age < self.max_age:
+                return session
+            # Expired while idle
+            with self._lock:
+                self._leased -= 1
+            self._quit(session)
+
+        try:
+            return PooledSession(self.driver_factory(page_load_strategy=page_load_strategy), page_load_strategy)
+        except Exception:
+            with self._lock:
+                self._leased -= 1
+            raise
+
+    def _take_idle(self, page_load_strategy):
+        # Most recently released first; the caller holds the lock
+        for i in range(len(self._idle) - 1, -1, -1):
+            if self._idle[i].page_load_strategy == page_load_strategy:
+                return self._idle.pop(i)
+        return None
+
+    def release(self, session):
+        """Return a leased session, resetting or recycling it"""
+        session.uses += 1
+        recycle = (
+            session.broken
+            or session.uses >= self.max_uses
+            or session.age >= self.max_age
+            or (PROFILE_TEMPLATE and get_profile_template().is_stale(session.driver))
+        )
+        if not recycle:
+            try:
+                reset_driver(session.driver)
+            except Exception as e:
+                logger.warning(f"Recycling Chrome session after failed reset: {str(e)}")
+                recycle = True
+
+        with self._lock:
+            self._leased -= 1
+            keep = not recycle and not self._closed and len(self._idle) < max(self.size, self._peak)
+            if keep:
+                self._idle.append(session)
+
+        if not keep:
+            self._quit(session)
+            self.warm_async()
+
+    def close(self):
+        """Quit every idle session; leased sessions are quit on release"""
+        with self._lock:
+            self._closed = True
+            idle, self._idle = self._idle, []
+        for session in idle:
+            self._quit(session)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "size": self.size,
+                "idle": len(self._idle),
+                "leased": self._leased,
+                "peakLeased": self._peak,
+                "launching": self._launching,
+                "maxUses": self.max_uses,
+                "maxAge": self.max_age
+            }
+
+    @staticmethod
+    def _quit(session):
+        try:
+            session.driver.quit()
+        except Exception as e:
+            logger.error(f"Error quitting pooled WebDriver: {str(e)}")
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_driver_pool():
+    """Return the process-wide driver pool, creating it on first use"""
+    global _pool
+    with _pool_lock:
+        if _pool is None or _pool._closed:
+            _pool = DriverPool()
+        return _pool
+
+
+def shutdown_driver_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+            _pool = None
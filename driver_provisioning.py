@@ -0,0 +1,126 @@
+import os
+import re
+import time
+import logging
+import subprocess
+import threading
+from datetime import datetime
+from file_utils import state_path, read_json, atomic_write_json
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_FILE = "chromedriver.json"
+
+_driver_path = None
+_lock = threading.Lock()
+_provision_lock = threading.Lock()
+
+
+def _major(version):
+    if not version:
+        return None
+    match = re.search(r"(\d+)\.", version)
+    return match.group(1) if match else None
+
+
+def detect_chrome_version():
+    """Version of the locally installed Chrome, or None if it cannot be found"""
+    binary = os.environ.get("CHROME_BINARY")
+    if binary:
+        try:
+            output = subprocess.run([binary, "--version"], capture_output=True, text=True, timeout=10).stdout
+            match = re.search(r"\d+\.\d+\.\d+\.\d+", output)
+            return match.group(0) if match else None
+        except (OSError, subprocess.SubprocessError) as e:
+            logger.warning(f"Failed to query Chrome version from {binary}: {str(e)}")
+            return None
+    try:
+        from webdriver_manager.core.os_manager import OperationSystemManager, ChromeType
+        return OperationSystemManager().get_browser_version_from_os(ChromeType.GOOGLE)
+    except Exception as e:
+        logger.warning(f"Failed to detect installed Chrome version: {str(e)}")
+        return None
+
+
+def detect_driver_version(driver_path):
+    try:
+        output = subprocess.run([driver_path, "--version"], capture_output=True, text=True, timeout=10).stdout
+    except (OSError, subprocess.SubprocessError) as e:
+        logger.warning(f"Failed to query chromedriver version from {driver_path}: {str(e)}")
+        return None
+    match = re.search(r"\d+\.\d+\.\d+\.\d+", output)
+    return match.group(0) if match else None
+
+
+def _check_compatible(chrome_version, driver_version):
+    chrome_major = _major(chrome_version)
+    driver_major = _major(driver_version)
+    # Without both versions there is nothing to compare against
+    return chrome_major is None or driver_major is None or chrome_major == driver_major
+
+
+def provision_chromedriver(force=False):
+    """Resolve the chromedriver binary and record it in a local manifest.
+
+    The manifest is reused as long as the binary still exists and matches the
+    installed Chrome major version, so later calls work fully offline. Setting
+    ``CHROMEDRIVER_PATH`` bypasses resolution entirely.
+    """
+    global _driver_path
+    override = os.environ.get("CHROMEDRIVER_PATH")
+    if override:
+        with _lock:
+            _driver_path = override
+        return override
+
+    manifest_path = state_path(MANIFEST_FILE)
+    chrome_version = detect_chrome_version()
+
+    manifest = None if force else read_json(manifest_path)
+    if manifest and os.path.isfile(manifest.get("chromedriverPath", "")):
+        if _check_compatible(chrome_version, manifest.get("driverVersion")):
+            logger.info(f"Using chromedriver from manifest: {manifest['chromedriverPath']}")
+            with _lock:
+                _driver_path = manifest["chromedriverPath"]
+            return _driver_path
+        logger.info(
+            f"Manifest chromedriver {manifest.get('driverVersion')} does not match "
+            f"Chrome {chrome_version}, resolving again"
+        )
+
+    # Only this path needs the network
+    from webdriver_manager.chrome import ChromeDriverManager
+    driver_path = ChromeDriverManager().install()
+    driver_version = detect_driver_version(driver_path)
+    if not _check_compatible(chrome_version, driver_version):
+        raise RuntimeError(
+            f"chromedriver {driver_version} at {driver_path} does not match installed Chrome {chrome_version}"
+        )
+
+    atomic_write_json(manifest_path, {
+        "chromedriverPath": driver_path,
+        "driverVersion": driver_version,
+        "chromeVersion": chrome_version,
+        "resolvedAt": datetime.now().isoformat()
+    })
+    logger.info(f"Resolved chromedriver {driver_version} at {driver_path}")
+    with _lock:
+        _driver_path = driver_path
+    return driver_path
+
+
+def get_chromedriver_path():
+    """Provisioned chromedriver path, provisioning on first use outside the API"""
+    with _provision_lock:
+        if _driver_path:
+            return _driver_path
+        return provision_chromedriver()
+
+
+def provision_at_startup():
+    """Provision the driver and log how long the cold start took"""
+    started = time.perf_counter()
+    driver_path = provision_chromedriver()
+    elapsed = time.perf_counter() - started
+    logger.info(f"Chromedriver provisioning took {elapsed * 1000:.0f} ms ({driver_path})")
+    return driver_path
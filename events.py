@@ -0,0 +1,85 @@
+import asyncio
+import logging
+import threading
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+# Events replayed to subscribers that connect after a run started
+EVENT_HISTORY = 2000
+# Per-subscriber buffer; the oldest events are dropped for slow consumers
+SUBSCRIBER_BUFFER = 1000
+
+
+def _offer(queue, event):
+    if queue.full():
+        try:
+            queue.get_nowait()
+        except asyncio.QueueEmpty:
+            pass
+    queue.put_nowait(event)
+
+
+class EventStream:
+    """Fan-out of run events from worker threads to async subscribers.
+
+    ``publish`` is called from test threads; each subscriber is an asyncio
+    queue fed through its own event loop. Recent events are kept so late
+    subscribers first receive what they missed.
+    """
+
+    def __init__(self, history=EVENT_HISTORY):
+        self._history = deque(maxlen=history)
+        self._subscribers = []
+        self._seq = 0
+        self._closed = False
+        self._lock = threading.Lock()
+
+    def publish(self, event):
+        with self._lock:
+            if self._closed:
+                return
+            self._seq += 1
+            event = {"seq": self._seq, **event}
+            self._history.append(event)
+            self._dispatch(event)
+
+    def close(self):
+        """Mark the stream finished; subscribers end after draining"""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._dispatch(None)
+
+    def _dispatch(self, event):
+        for subscriber in list(self._subscribers):
+            loop, queue = subscriber
+            try:
+                loop.call_soon_threadsafe(_offer, queue, event)
+            except RuntimeError:
+                # The subscriber's loop is gone
+                self._subscribers.remove(subscriber)
+
+    async def subscribe(self):
+        """Yield past and live events until the stream is closed"""
+        subscriber = (asyncio.get_running_loop(), asyncio.Queue(maxsize=SUBSCRIBER_BUFFER))
+        with self._lock:
+            backlog = list(self._history)
+            closed = self._closed
+            if not closed:
+                self._subscribers.append(subscriber)
+        try:
+            for event in backlog:
+                yield event
+            if closed:
+                return
+            while True:
+                event = await subscriber[1].get()
+                if event is None:
+                    return
+                yield event
+        finally:
+            with self._lock:
+                if subscriber in self._subscribers:
+                    self._subscribers.remove(subscriber)
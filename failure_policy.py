@@ -0,0 +1,53 @@
+import os
+import logging
+from locator import page_key
+
+logger = logging.getLogger(__name__)
+
+# "continue" runs every step, "abort" skips everything after the first
+# failure, "skip-dependent" skips later steps on the page that failed
+FAILURE_POLICY = os.environ.get("FAILURE_POLICY", "continue")
+FAILURE_POLICIES = ("continue", "abort", "skip-dependent")
+
+
+def step_pages(urls):
+    """Page context of each step: its recorded page, else the previous step's"""
+    pages = []
+    page = ""
+    for url in urls:
+        page = page_key(url) or page
+        pages.append(page)
+    return pages
+
+
+class StepGate:
+    """Tracks failures during one run and decides which later steps to skip.
+
+    Only steps that asked ``should_skip`` (the ones acting on the page) can
+    trigger skipping; unsupported steps fail without affecting the rest.
+    """
+
+    def __init__(self, policy=FAILURE_POLICY):
+        if policy not in FAILURE_POLICIES:
+            raise ValueError(f"Unknown failure policy: {policy}")
+        self.policy = policy
+        self._pages = {}
+        self._failed_pages = set()
+        self._aborted = False
+
+    def should_skip(self, step, page=""):
+        """Reason to skip ``step``, or None if it should run"""
+        self._pages[step] = page
+        if self._aborted:
+            return "an earlier step failed"
+        if page in self._failed_pages:
+            return f"an earlier step on {page or 'this page'} failed"
+        return None
+
+    def step_finished(self, step, success):
+        if success or step not in self._pages:
+            return
+        if self.policy == "abort":
+            self._aborted = True
+        elif self.policy == "skip-dependent":
+            self._failed_pages.add(self._pages[step])
@@ -0,0 +1,161 @@
+import os
+import logging
+from selenium.common.exceptions import NoSuchElementException, TimeoutException, WebDriverException
+from locator import LOCATOR_GRACE, get_locator_ranking, locate, recorded_strategies
+
+logger = logging.getLogger(__name__)
+
+# "native" issues one WebDriver command per operation; "fast" batches each step into one script call
+ACTION_MODE = os.environ.get("ACTION_MODE", "native")
+
+# Locates the element (polling every recorded strategy in the page), scrolls it
+# into view and performs the action in a single round-trip. Inputs that need
+# real key events are handed back to Python with status "native". Gives up
+# early with status "notfound" once the page has been idle for graceMs.
+STEP_JS = """
+var strategies = arguments[0], kind = arguments[1], value = arguments[2];
+var timeoutMs = arguments[3], graceMs = arguments[4];
+var callback = arguments[arguments.length - 1];
+var deadline = Date.now() + timeoutMs;
+var idleSince = null;
+var TEXT_TYPES = ['text', 'email', 'password', 'search', 'tel', 'url', 'number', 'date',
+                  'datetime-local', 'month', 'time', 'week', 'color', 'range', 'hidden'];
+
+function find(by, selector) {
+    try {
+        if (by === 'xpath') {
+            return document.evaluate(selector, document, null, XPathResult.FIRST_ORDERED_NODE_TYPE, null).singleNodeValue;
+        }
+        return document.querySelector(selector);
+    } catch (e) { return null; }
+}
+
+function locate() {
+    for (var i = 0; i < strategies.length; i++) {
+        var el = find(strategies[i][0], strategies[i][1]);
+        if (el && visible(el) && !(kind === 'click' && el.disabled)) {
+            return {el: el, by: strategies[i][0]};
+        }
+    }
+    return null;
+}
+
+function visible(el) {
+    var style = window.getComputedStyle(el);
+    return el.getClientRects().length > 0 && style.visibility !== 'hidden' && style.display !== 'none';
+}
+
+function valueSetter(el) {
+    var tag = el.tagName.toLowerCase();
+    if (el.isContentEditable) { return null; }
+    if (tag === 'textarea') { return Object.getOwnPropertyDescriptor(HTMLTextAreaElement.prototype, 'value').set; }
+    if (tag === 'select') { return Object.getOwnPropertyDescriptor(HTMLSelectElement.prototype, 'value').set; }
+    if (tag === 'input' && TEXT_TYPES.indexOf((el.type || 'text').toLowerCase()) >= 0) {
+        return Object.getOwnPropertyDescriptor(HTMLInputElement.prototype, 'value').set;
+    }
+    return null;
+}
+
+function attempt() {
+    var match = locate();
+    if (match) {
+        var el = match.el;
+        el.scrollIntoView({block: 'center', inline: 'center'});
+        if (kind === 'click') {
+            el.click();
+            callback({status: 'done', strategy: match.by});
+            return;
+        }
+        var setter = valueSetter(el);
+        if (!setter) {
+            callback({status: 'native', element: el, strategy: match.by});
+            return;
+        }
+        el.focus();
+        // Native setter so framework-controlled inputs (React, Vue) see the change
+        setter.call(el, value);
+        el.dispatchEvent(new Event('input', {bubbles: true}));
+        el.dispatchEvent(new Event('change', {bubbles: true}));
+        callback({status: 'done', strategy: match.by});
+        return;
+    }
+    var now = Date.now();
+    if (now >= deadline) {
+        callback({status: 'timeout'});
+        return;
+    }
+    if (document.readyState === 'complete' && !(window.__pendingRequests > 0)) {
+        idleSince = idleSince || now;
+        if (now - idleSince >= graceMs) {
+            callback({status: 'notfound'});
+            return;
+        }
+    } else {
+        idleSince = null;
+    }
+    setTimeout(attempt, 50);
+}
+attempt();
+"""
+
+
+def _run_step_script(driver, strategies, kind, value, timeout, key, grace):
+    # The in-page poll must finish before the script timeout does
+    if timeout + 5 > 30:
+        driver.set_script_timeout(timeout + 5)
+    outcome = driver.execute_async_script(
+        STEP_JS, [list(strategy) for strategy in strategies], kind, value,
+        int(timeout * 1000), int((timeout if grace is None else grace) * 1000)
+    )
+    if outcome["status"] == "timeout":
+        raise TimeoutException(f"No recorded locator matched within {timeout}s: {strategies}")
+    if outcome["status"] == "notfound":
+        raise NoSuchElementException(f"No recorded locator matched on the idle page: {strategies}")
+    get_locator_ranking().record(key, outcome["strategy"])
+    return outcome
+
+
+def _native_change(driver, element, value):
+    element.clear()
+    element.send_keys(value)
+
+
+def fast_change(driver, css_selector, xpath, value, timeout=10, native_keys=False, key=None, grace=LOCATOR_GRACE):
+    """Locate, scroll, clear and set an input's value in one script call.
+
+    Falls back to native ``clear``/``send_keys`` when ``native_keys`` is set,
+    the element needs real key events (contenteditable, file inputs...), or
+    the script could not run (e.g. the page navigated mid-poll).
+    """
+    strategies = get_locator_ranking().order(key, recorded_strategies(css_selector, xpath))
+    if not native_keys:
+        try:
+            outcome = _run_step_script(driver, strategies, "change", value, timeout, key, grace)
+            if outcome["status"] == "done":
+                return
+            _native_change(driver, outcome["element"], value)
+            return
+        except (TimeoutException, NoSuchElementException):
+            raise
+        except WebDriverException as e:
+            logger.debug(f"Fast change failed, falling back to native input: {str(e)}")
+
+    element = locate(driver, strategies, timeout=timeout, condition="present", key=key, grace=grace)
+    driver.execute_script("arguments[0].scrollIntoView({block: 'center'});", element)
+    _native_change(driver, element, value)
+
+
+def fast_click(driver, css_selector, xpath, timeout=10, key=None, grace=LOCATOR_GRACE):
+    """Locate, scroll and click an element in one script call"""
+    strategies = get_locator_ranking().order(key, recorded_strategies(css_selector, xpath))
+    try:
+        _run_step_script(driver, strategies, "click", None, timeout, key, grace)
+        return
+    except (TimeoutException, NoSuchElementException):
+        raise
+    except WebDriverException as e:
+        logger.debug(f"Fast click failed, falling back to native click: {str(e)}")
+
+    element = locate(driver, strategies, timeout=timeout, condition="clickable", key=key, grace=grace)
+    driver.execute_script("arguments[0].scrollIntoView({block: 'center'});", element)
+    element.click()
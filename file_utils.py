@@ -0,0 +1,62 @@
+import os
+import json
+import fcntl
+import tempfile
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Local state shared by the runner (manifests, spools, learned statistics)
+STATE_DIR = os.environ.get("RUNNER_STATE_DIR", ".runner_state")
+
+
+def state_path(name):
+    """Path of a file inside the runner state directory"""
+    os.makedirs(STATE_DIR, exist_ok=True)
+    return os.path.join(STATE_DIR, name)
+
+
+def atomic_write_text(path, text):
+    """Write a file so readers never observe a partially written version"""
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-")
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(text)
+        os.replace(tmp_path, path)
+    except Exception:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def atomic_write_json(path, data):
+    atomic_write_text(path, json.dumps(data, indent=2))
+
+
+def read_json(path, default=None):
+    """Load a JSON file, returning ``default`` if it is missing or unreadable"""
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return default
+    except (OSError, ValueError) as e:
+        logger.warning(f"Ignoring unreadable state file {path}: {str(e)}")
+        return default
+
+
+def update_json(path, merge, default=None):
+    """Re-read a JSON file, apply ``merge`` and write the result back under a lock held across processes.
+
+    ``merge`` receives the current contents (``default`` if missing) and returns the new ones,
+    which are also returned.
+    """
+    with open(path + ".lock", 'a') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        data = merge(read_json(path, default=default))
+        atomic_write_json(path, data)
+        return data
@@ -0,0 +1,97 @@
+import os
+import json
+import hashlib
+import logging
+from datetime import datetime, timezone
+from action_interpreter import actions_hash
+from testcase_generator import GENERATOR_VERSION
+
+logger = logging.getLogger(__name__)
+
+# Build or deployment id of the app under test; a new id makes every test case run again
+TARGET_BUILD_ID = os.environ.get("TARGET_BUILD_ID", "")
+# Seconds after which a passing result is rerun even if nothing changed
+INCREMENTAL_MAX_AGE = float(os.environ.get("INCREMENTAL_MAX_AGE", "86400"))
+
+# The last run's stamp, read from the stored response without loading it
+LAST_RUN_COLUMNS = ("last_fingerprint:response->>fingerprint, last_finished_at:response->>finishedAt, "
+                    "last_status:response->response->summary->>status")
+
+
+def testcase_fingerprint(actions, build_id=None):
+    """Hash of everything that decides a run's outcome: the actions, the generator and the target build"""
+    normalized = json.dumps({
+        "actions": actions_hash(actions),
+        "generator": GENERATOR_VERSION,
+        "build": TARGET_BUILD_ID if build_id is None else build_id
+    }, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(normalized.encode('utf-8')).hexdigest()
+
+
+def stamp_result(result_data, actions, build_id=None):
+    """Store the fingerprint and finish time beside a result's response"""
+    result_data["fingerprint"] = testcase_fingerprint(actions, build_id)
+    result_data["finishedAt"] = datetime.now(timezone.utc).isoformat()
+    return result_data
+
+
+def _age_seconds(finished_at, now):
+    try:
+        finished = datetime.fromisoformat(finished_at)
+    except (TypeError, ValueError):
+        return None
+    if finished.tzinfo is None:
+        finished = finished.replace(tzinfo=timezone.utc)
+    return (now - finished).total_seconds()
+
+
+def rerun_reason(row, fingerprint, max_age=INCREMENTAL_MAX_AGE, now=None):
+    """Why a test case must run again, or None if its last result still holds"""
+    if not row.get("last_fingerprint"):
+        return "no previous run"
+    if row["last_fingerprint"] != fingerprint:
+        return "changed"
+    if row.get("last_status") != "PASSED":
+        return "failed"
+    age = _age_seconds(row.get("last_finished_at"), now or datetime.now(timezone.utc))
+    if age is None or age >= max_age:
+        return "stale"
+    return None
+
+
+class IncrementalFilter:
+    """Drops test cases whose last passing result is current from a stream of rows.
+
+    Rows must carry ``LAST_RUN_COLUMNS``. Dropped test cases are collected in
+    ``skipped`` as result lines that point at their last stored result.
+    """
+
+    def __init__(self, build_id=None, max_age=INCREMENTAL_MAX_AGE):
+        self.build_id = build_id
+        self.max_age = max_age
+        self.skipped = []
+        self.reasons = {}
+
+    def __call__(self, rows):
+        now = datetime.now(timezone.utc)
+        for row in rows:
+            reason = rerun_reason(row, testcase_fingerprint(row.get("actions"), self.build_id), self.max_age, now)
+            if reason is not None:
+                self.reasons[reason] = self.reasons.get(reason, 0) + 1
+                yield row
+                continue
+            self.skipped.append({
+                "testcaseId": row["id"],
+                "success": True,
+                "skipped": True,
+                "reason": "unchanged since its last passing run",
+                "lastRun": {
+                    "fingerprint": row["last_fingerprint"],
+                    "finishedAt": row.get("last_finished_at"),
+                    "status": row.get("last_status"),
+                    "result": f"/testresult/{row['id']}"
+                }
+            })
+
+    def to_dict(self):
+        return {"skipped": len(self.skipped), "rerunReasons": self.reasons}
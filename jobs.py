@@ -0,0 +1,176 @@
+import os
+import time
+import uuid
+import logging
+import threading
+from collections import OrderedDict
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor
+from events import EventStream
+from suite_runner import run_suite
+from admission import ADMISSION_MAX_CONCURRENCY
+
+logger = logging.getLogger(__name__)
+
+# Worker threads across all jobs; the admission controller decides how many actually run
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", str(ADMISSION_MAX_CONCURRENCY)))
+# Finished jobs kept in memory for status queries
+JOB_RETENTION = int(os.environ.get("JOB_RETENTION", "200"))
+
+QUEUED = "QUEUED"
+RUNNING = "RUNNING"
+COMPLETED = "COMPLETED"
+FAILED = "FAILED"
+CANCELLED = "CANCELLED"
+
+FINISHED_STATES = (COMPLETED, FAILED, CANCELLED)
+
+
+class Job:
+    """A submitted test run: one test case or a suite"""
+
+    def __init__(self, kind, testcase_ids=None):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.testcase_ids = testcase_ids
+        self.status = QUEUED
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.total = len(testcase_ids) if testcase_ids else 0
+        self.completed = 0
+        self.results = []
+        self.error = None
+        self.cancel_event = threading.Event()
+        self.events = EventStream()
+        self._lock = threading.Lock()
+
+    @property
+    def cancelled(self):
+        return self.cancel_event.is_set()
+
+    def add_result(self, result):
+        with self._lock:
+            self.results.append(result)
+            self.completed += 1
+
+    def to_dict(self, include_results=True):
+        with self._lock:
+            data = {
+                "id": self.id,
+                "kind": self.kind,
+                "status": self.status,
+                "createdAt": self.created_at,
+                "startedAt": self.started_at,
+                "finishedAt": self.finished_at,
+                "progress": {
+                    "total": self.total,
+                    "completed": self.completed,
+                    "successful": sum(1 for r in self.results if r.get("success")),
+                    "failed": sum(1 for r in self.results if not r.get("success"))
+                },
+                "error": self.error
+            }
+            if include_results:
+                data["results"] = list(self.results)
+        return data
+
+
+class JobManager:
+    """Runs jobs off the event loop on a bounded executor.
+
+    ``load_testcases(ids)`` returns the number of test cases and an iterator
+    over their rows (all rows when ``ids`` is None) and ``run_one(testcase, on_event)`` runs one of them, returning the
+    same result dict as ``run_single_testcase``. Step and log events of every
+    test case are published on the job's ``events`` stream. Each job gets a lightweight
+    coordinator thread; the test runs themselves share one executor so the
+    number of browsers stays bounded no matter how many jobs are queued.
+    """
+
+    def __init__(self, run_one, load_testcases, max_workers=JOB_WORKERS, retention=JOB_RETENTION):
+        self.run_one = run_one
+        self.load_testcases = load_testcases
+        self.retention = retention
+        self.max_in_flight = max(1, max_workers) * 2
+        self._executor = ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix="job-worker")
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+
+    def submit(self, kind, testcase_ids=None):
+        job = Job(kind, testcase_ids)
+        with self._lock:
+            self._jobs[job.id] = job
+            self._prune()
+        threading.Thread(target=self._coordinate, args=(job,), name=f"job-{job.id[:8]}", daemon=True).start()
+        logger.info(f"Submitted {kind} job {job.id}")
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id):
+        """Stop a job; tests already running finish, queued ones are skipped"""
+        job = self.get(job_id)
+        if job is None:
+            return None
+        job.cancel_event.set()
+        logger.info(f"Cancellation requested for job {job_id}")
+        return job
+
+    def shutdown(self):
+        with self._lock:
+            jobs = list(self._jobs.values())
+        for job in jobs:
+            job.cancel_event.set()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _prune(self):
+        # Drop the oldest finished jobs beyond the retention limit
+        finished = [job_id for job_id, job in self._jobs.items() if job.status in FINISHED_STATES]
+        for job_id in finished[:max(0, len(finished) - self.retention)]:
+            del self._jobs[job_id]
+
+    def _coordinate(self, job):
+        job.status = RUNNING
+        job.started_at = time.time()
+        try:
+            job.total, testcases = self.load_testcases(job.testcase_ids)
+
+            for result in run_suite(testcases, partial(self._run_testcase, job), self._executor,
+                                    self.max_in_flight, job.cancel_event):
+                job.add_result(result)
+
+            job.status = CANCELLED if job.cancelled else COMPLETED
+        except Exception as e:
+            logger.error(f"Job {job.id} failed: {str(e)}")
+            job.error = str(e)
+            job.status = FAILED
+        finally:
+            job.finished_at = time.time()
+            with self._lock:
+                self._prune()
+            job.events.publish({"type": "jobFinished", "job": job.to_dict(include_results=False)})
+            job.events.close()
+            logger.info(f"Job {job.id} finished with status {job.status}")
+
+    def _run_testcase(self, job, testcase):
+        if job.cancelled:
+            return None
+        try:
+            result = self.run_one(testcase, job.events.publish)
+        except Exception as e:
+            logger.error(f"Test case {testcase.get('id')} in job {job.id} failed: {str(e)}")
+            result = {
+                "testcaseId": testcase.get("id"),
+                "success": False,
+                "error": str(e)
+            }
+        job.events.publish({
+            "type": "testFinished",
+            "testCaseId": str(testcase.get("id")),
+            "success": result.get("success"),
+            "summary": (result.get("data") or {}).get("response", {}).get("summary"),
+            "error": result.get("error")
+        })
+        return result
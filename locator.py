@@ -0,0 +1,191 @@
+import os
+import time
+import atexit
+import logging
+import threading
+from urllib.parse import urlsplit
+from selenium.common.exceptions import (
+    InvalidSelectorException,
+    NoSuchElementException,
+    StaleElementReferenceException,
+    TimeoutException
+)
+from selenium.webdriver.common.by import By
+from file_utils import state_path, read_json, update_json
+from wait_strategies import PAGE_READY_JS
+
+logger = logging.getLogger(__name__)
+
+# Idle-page seconds before a missing element fails a step; steps with a longer p99 wait that long
+LOCATOR_GRACE = float(os.environ.get("LOCATOR_GRACE", "0.5"))
+LOCATOR_POLL_INTERVAL = 0.1
+# Minimum seconds between writes of the ranking file
+RANKING_SAVE_INTERVAL = 5.0
+
+RANKING_FILE = "locator_ranks.json"
+
+
+def page_key(url):
+    """Page part of a locator key: scheme, host and path of the recorded URL"""
+    if not url:
+        return ""
+    parts = urlsplit(url)
+    return f"{parts.scheme}://{parts.netloc}{parts.path}"
+
+
+def locator_key(test_id, step, url):
+    return f"{test_id}|{step}|{page_key(url)}"
+
+
+def recorded_strategies(css_selector, xpath):
+    """All recorded strategies for an element, in recording preference order"""
+    strategies = []
+    if css_selector:
+        strategies.append((By.CSS_SELECTOR, css_selector))
+    if xpath:
+        strategies.append((By.XPATH, xpath))
+    return strategies
+
+
+class LocatorRanking:
+    """Persisted record of which strategy matched for each test, step and page.
+
+    Worker processes share the file: a save adds this process's new wins to
+    the file's current counts under a lock.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or state_path(RANKING_FILE)
+        self._wins = read_json(self.path, default={}) or {}
+        # Wins since the last save, added to the file on save
+        self._added = {}
+        self._dirty = False
+        self._saved_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def order(self, key, strategies):
+        """Strategies sorted so the historically winning one is tried first"""
+        if not key:
+            return list(strategies)
+        with self._lock:
+            wins = self._wins.get(key, {})
+        # Stable sort keeps recording order among equally ranked strategies
+        return sorted(strategies, key=lambda strategy: -wins.get(strategy[0], 0))
+
+    def record(self, key, by):
+        if not key:
+            return
+        with self._lock:
+            wins = self._wins.setdefault(key, {})
+            wins[by] = wins.get(by, 0) + 1
+            added = self._added.setdefault(key, {})
+            added[by] = added.get(by, 0) + 1
+            self._dirty = True
+            due = time.monotonic() - self._saved_at >= RANKING_SAVE_INTERVAL
+        if due:
+            self.save()
+
+    def save(self):
+        with self._lock:
+            if not self._dirty:
+                return
+            added = self._added
+            self._added = {}
+            self._dirty = False
+            self._saved_at = time.monotonic()
+
+        def merge(stored):
+            stored = stored if isinstance(stored, dict) else {}
+            for key, counts in added.items():
+                wins = stored.setdefault(key, {})
+                for by, count in counts.items():
+                    wins[by] = wins.get(by, 0) + count
+            return stored
+
+        try:
+            merged = update_json(self.path, merge, default={})
+        except OSError as e:
+            logger.warning(f"Failed to save locator ranking: {str(e)}")
+            with self._lock:
+                # Keep the wins for the next save
+                for key, counts in added.items():
+                    pending = self._added.setdefault(key, {})
+                    for by, count in counts.items():
+                        pending[by] = pending.get(by, 0) + count
+                self._dirty = True
+            return
+        with self._lock:
+            # Adopt other processes' wins, keeping what was recorded during the write
+            for key, counts in self._added.items():
+                wins = merged.setdefault(key, {})
+                for by, count in counts.items():
+                    wins[by] = wins.get(by, 0) + count
+            self._wins = merged
+
+
+_ranking = None
+_ranking_lock = threading.Lock()
+
+
+def get_locator_ranking():
+    global _ranking
+    with _ranking_lock:
+        if _ranking is None:
+            _ranking = LocatorRanking()
+            atexit.register(_ranking.save)
+        return _ranking
+
+
+def _matches(element, condition):
+    if condition == "clickable":
+        return element.is_displayed() and element.is_enabled()
+    return True
+
+
+def _page_idle(driver):
+    try:
+        return bool(driver.execute_script(PAGE_READY_JS))
+    except Exception:
+        return False
+
+
+def locate(driver, strategies, timeout=10, condition="present", key=None, grace=LOCATOR_GRACE):
+    """Find an element trying every recorded strategy in one polling loop.
+
+    Strategies are ordered by the persisted ranking for ``key`` and the one
+    that matches is recorded. Invalid selectors are dropped immediately, and
+    once the page has been idle for ``grace`` seconds without a match the
+    lookup fails instead of waiting for the full ``timeout`` (``None`` waits
+    the full timeout). Requires the driver's implicit wait to be 0.
+    """
+    ranking = get_locator_ranking()
+    remaining = ranking.order(key, strategies)
+    deadline = time.monotonic() + timeout
+    idle_since = None
+
+    while remaining:
+        for strategy in list(remaining):
+            by, value = strategy
+            try:
+                for element in driver.find_elements(by, value):
+                    if _matches(element, condition):
+                        ranking.record(key, by)
+                        return element
+            except InvalidSelectorException:
+                logger.debug(f"Dropping invalid {by} selector: {value}")
+                remaining.remove(strategy)
+            except StaleElementReferenceException:
+                pass
+
+        now = time.monotonic()
+        if now >= deadline:
+            raise TimeoutException(f"No recorded locator matched within {timeout}s: {strategies}")
+        if grace is not None and grace < timeout and _page_idle(driver):
+            idle_since = idle_since or now
+            if now - idle_since >= grace:
+                raise NoSuchElementException(f"No recorded locator matched on the idle page: {strategies}")
+        else:
+            idle_since = None
+        time.sleep(LOCATOR_POLL_INTERVAL)
+
+    raise InvalidSelectorException(f"All recorded selectors are invalid: {strategies}")
@@ -0,0 +1,225 @@
+import os
+import json
+import logging
+import threading
+from dataclasses import dataclass
+from typing import Tuple
+from urllib.parse import urlsplit
+from wait_strategies import WAIT_MODE
+
+logger = logging.getLogger(__name__)
+
+# Profile used when a test case does not name one
+NETWORK_PROFILE = os.environ.get("NETWORK_PROFILE", "lean")
+# Extra comma-separated URL patterns blocked by every profile except "full"
+NETWORK_BLOCK_PATTERNS = [p.strip() for p in os.environ.get("NETWORK_BLOCK_PATTERNS", "").split(",") if p.strip()]
+# test_cases column naming a test's profile ("full", "lean" or "minimal"). Off by default since
+# the column is not part of the base schema: add a text column and set this to its name to enable it
+NETWORK_PROFILE_COLUMN = os.environ.get("NETWORK_PROFILE_COLUMN", "")
+# "eager" returns from navigation at DOMContentLoaded; the "ready" wait mode still waits for the full load.
+# Used by every profile except "full", which always waits for the load event
+PAGE_LOAD_STRATEGY = os.environ.get("PAGE_LOAD_STRATEGY", "eager" if WAIT_MODE == "ready" else "normal")
+
+# Network.setBlockedURLs matches URLs only, so resource types map to file extensions
+TYPE_EXTENSIONS = {
+    "Image": ("png", "jpg", "jpeg", "gif", "webp", "avif", "ico", "bmp"),
+    "Font": ("woff", "woff2", "ttf", "otf", "eot"),
+    "Media": ("mp4", "webm", "ogg", "ogv", "mp3", "wav", "m4a", "mov")
+}
+
+TRACKER_HOSTS = (
+    "google-analytics.com", "googletagmanager.com", "doubleclick.net", "googlesyndication.com",
+    "connect.facebook.net", "hotjar.com", "clarity.ms", "segment.io", "cdn.segment.com",
+    "mixpanel.com", "amplitude.com", "nr-data.net", "js-agent.newrelic.com", "fullstory.com"
+)
+
+
+def extension_patterns(extension):
+    """Patterns matching URLs whose path ends in ``.extension``.
+
+    Patterns match the whole URL, so an unanchored ``*.mov*`` would also
+    block https://www.movavi.com/ or ``?q=song.mp3&page=2``. ``*`` is the
+    only wildcard, so a query string that itself ends in ``.mp3`` still matches.
+    """
+    return (f"*.{extension}", f"*.{extension}?*", f"*.{extension}#*")
+
+
+def host_patterns(host):
+    """Patterns matching URLs on ``host`` or its subdomains, in any path"""
+    return (f"*://{host}/*", f"*://*.{host}/*", f"*://{host}:*", f"*://*.{host}:*")
+
+
+TYPE_PATTERNS = {
+    resource_type: tuple(pattern for extension in extensions for pattern in extension_patterns(extension))
+    for resource_type, extensions in TYPE_EXTENSIONS.items()
+}
+TRACKER_PATTERNS = tuple(pattern for host in TRACKER_HOSTS for pattern in host_patterns(host))
+
+# Typical transfer size per resource type, used until real loads were seen
+DEFAULT_TYPE_BYTES = {
+    "Image": 40 * 1024,
+    "Font": 30 * 1024,
+    "Media": 500 * 1024,
+    "Script": 30 * 1024,
+    "Stylesheet": 15 * 1024,
+    "XHR": 5 * 1024,
+    "Fetch": 5 * 1024
+}
+DEFAULT_REQUEST_BYTES = 10 * 1024
+
+
+@dataclass(slots=True, frozen=True)
+class NetworkProfile:
+    name: str
+    blocked_types: Tuple[str, ...] = ()
+    block_trackers: bool = False
+    # Fixed when Chrome starts, so pooled sessions are matched on it
+    page_load_strategy: str = PAGE_LOAD_STRATEGY
+
+    def blocked_patterns(self):
+        patterns = [pattern for resource_type in self.blocked_types for pattern in TYPE_PATTERNS[resource_type]]
+        if self.block_trackers:
+            patterns.extend(TRACKER_PATTERNS)
+            patterns.extend(NETWORK_BLOCK_PATTERNS)
+        return patterns
+
+
+PROFILES = {
+    # Everything loads, for visually sensitive tests
+    "full": NetworkProfile("full", page_load_strategy="normal"),
+    "lean": NetworkProfile("lean", ("Font", "Media"), block_trackers=True),
+    "minimal": NetworkProfile("minimal", ("Image", "Font", "Media"), block_trackers=True)
+}
+
+
+def get_network_profile(name=None):
+    """Profile by name, falling back to ``NETWORK_PROFILE``"""
+    profile = PROFILES.get(name or NETWORK_PROFILE)
+    if profile is None:
+        logger.warning(f"Unknown network profile {name!r}; using {NETWORK_PROFILE}")
+        profile = PROFILES.get(NETWORK_PROFILE, PROFILES["full"])
+    return profile
+
+
+def url_origin(url):
+    """``scheme://host[:port]`` of an http(s) URL, or None"""
+    parts = urlsplit(url or "")
+    if parts.scheme not in ("http", "https") or not parts.netloc:
+        return None
+    return f"{parts.scheme}://{parts.netloc.rsplit('@', 1)[-1].lower()}"
+
+
+def _record_origins(driver, entries):
+    # Every document that ran in the session may have left storage behind
+    origins = getattr(driver, "_visited_origins", None)
+    if origins is None:
+        origins = driver._visited_origins = set()
+    for entry in entries:
+        try:
+            message = json.loads(entry["message"])["message"]
+        except (KeyError, TypeError, ValueError):
+            continue
+        if message.get("method") != "Network.requestWillBeSent":
+            continue
+        params = message.get("params", {})
+        urls = [params.get("documentURL")]
+        if params.get("type") == "Document":
+            urls.append(params.get("request", {}).get("url"))
+        for url in urls:
+            origin = url_origin(url)
+            if origin:
+                origins.add(origin)
+
+
+def drain_performance_log(driver):
+    """Read and discard buffered performance log entries, remembering the origins they visited"""
+    try:
+        entries = driver.get_log("performance") or []
+    except Exception as e:
+        logger.debug(f"Performance log unavailable: {str(e)}")
+        driver._origins_unknown = True
+        return []
+    _record_origins(driver, entries)
+    return entries
+
+
+def take_visited_origins(driver):
+    """Origins the session visited since the last call, or None if some may have been missed"""
+    drain_performance_log(driver)
+    origins = getattr(driver, "_visited_origins", None) or set()
+    unknown = getattr(driver, "_origins_unknown", False)
+    driver._visited_origins = set()
+    driver._origins_unknown = False
+    return None if unknown else origins
+
+
+def apply_network_profile(driver, profile):
+    """Set the session's blocked URL patterns and start a fresh request log"""
+    drain_performance_log(driver)
+    driver.execute_cdp_cmd("Network.enable", {})
+    # Pooled sessions keep the previous test's list, so always set it
+    driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": profile.blocked_patterns()})
+
+
+class _TypeSizes:
+    """Running average transfer size per resource type, learned from completed loads"""
+
+    def __init__(self):
+        self._totals = {}
+        self._lock = threading.Lock()
+
+    def observe(self, resource_type, size):
+        with self._lock:
+            total, count = self._totals.get(resource_type, (0, 0))
+            self._totals[resource_type] = (total + size, count + 1)
+
+    def average(self, resource_type):
+        with self._lock:
+            total, count = self._totals.get(resource_type, (0, 0))
+        if count:
+            return total / count
+        return DEFAULT_TYPE_BYTES.get(resource_type, DEFAULT_REQUEST_BYTES)
+
+
+_type_sizes = _TypeSizes()
+
+
+def collect_network_stats(driver, profile):
+    """Requests, bytes loaded, requests blocked and estimated bytes saved since ``apply_network_profile``"""
+    types = {}
+    requests = 0
+    loaded_bytes = 0
+    blocked = 0
+    blocked_by_type = {}
+    saved_bytes = 0.0
+
+    for entry in drain_performance_log(driver):
+        try:
+            message = json.loads(entry["message"])["message"]
+        except (KeyError, TypeError, ValueError):
+            continue
+        method = message.get("method")
+        params = message.get("params", {})
+        if method == "Network.requestWillBeSent":
+            requests += 1
+            types[params.get("requestId")] = params.get("type", "Other")
+        elif method == "Network.loadingFinished":
+            size = params.get("encodedDataLength", 0)
+            loaded_bytes += size
+            resource_type = types.get(params.get("requestId"))
+            if resource_type:
+                _type_sizes.observe(resource_type, size)
+        elif method == "Network.loadingFailed" and params.get("blockedReason"):
+            resource_type = params.get("type") or types.get(params.get("requestId"), "Other")
+            blocked += 1
+            blocked_by_type[resource_type] = blocked_by_type.get(resource_type, 0) + 1
+            saved_bytes += _type_sizes.average(resource_type)
+
+    return {
+        "profile": profile.name,
+        "requests": requests,
+        "bytesLoaded": loaded_bytes,
+        "requestsBlocked": blocked,
+        "blockedByType": blocked_by_type,
+        "estimatedBytesSaved": int(saved_bytes)
+    }
@@ -0,0 +1,359 @@
+import os
+import re
+import time
+import fcntl
+import shutil
+import hashlib
+import logging
+import tempfile
+import threading
+import subprocess
+import urllib.request
+from dataclasses import dataclass
+from urllib.parse import urljoin, urlsplit
+from admission import get_admission_controller
+from file_utils import atomic_write_json, read_json, state_path
+from wait_strategies import settle
+
+logger = logging.getLogger(__name__)
+
+# "1" starts browsers on a clone of a prewarmed profile, "0" on a fresh temporary profile
+PROFILE_TEMPLATE = os.environ.get("PROFILE_TEMPLATE", "1") == "1"
+# Template store (default: in the runner state directory); share it between worker hosts for one warm cache
+PROFILE_TEMPLATE_DIR = os.environ.get("PROFILE_TEMPLATE_DIR", "")
+# Where per-session clones live; on disk, as Chrome runs with --disable-dev-shm-usage and /dev/shm is small
+PROFILE_CLONE_DIR = os.environ.get("PROFILE_CLONE_DIR") or tempfile.gettempdir()
+# Seconds between sweeps for clones left behind by killed workers
+PROFILE_SWEEP_INTERVAL = float(os.environ.get("PROFILE_SWEEP_INTERVAL", "300"))
+# Comma-separated pages loaded to warm the template; defaults to the start pages of tests seen so far
+PROFILE_WARM_URLS = [u.strip() for u in os.environ.get("PROFILE_WARM_URLS", "").split(",") if u.strip()]
+# Seconds before the template is rebuilt even if no asset changed
+PROFILE_TEMPLATE_MAX_AGE = float(os.environ.get("PROFILE_TEMPLATE_MAX_AGE", "86400"))
+# Seconds between checks of the warm pages' script and stylesheet URLs
+PROFILE_ASSET_CHECK_INTERVAL = float(os.environ.get("PROFILE_ASSET_CHECK_INTERVAL", "300"))
+
+MANIFEST_FILE = "manifest.json"
+LOCK_FILE = "build.lock"
+CLONE_PREFIX = "chrome-profile-"
+MAX_WARM_URLS = 20
+ASSET_FETCH_TIMEOUT = 10
+ASSET_FETCH_LIMIT = 2 * 1024 * 1024
+
+# Only caches go into the template; cookies, storage and history never leave a session
+CACHE_DIRS = ("Default/Cache", "Default/Code Cache")
+
+# Bundles usually carry a content hash in their file name
+ASSET_PATTERN = re.compile(r"""(?:src|href)\s*=\s*["']([^"']+\.(?:m?js|css)(?:\?[^"']*)?)["']""", re.IGNORECASE)
+
+
+@dataclass(slots=True)
+class ClonedProfile:
+    """A session's private copy of the template, deleted when the session quits"""
+    path: str
+    generation: str
+
+    def discard(self):
+        shutil.rmtree(self.path, ignore_errors=True)
+
+
+def start_url(actions):
+    """First URL a recorded action list visits"""
+    return next((action.get('url') for action in actions or [] if action.get('url')), None)
+
+
+def copy_tree(source, destination):
+    """Copy a directory, sharing blocks copy-on-write where the filesystem supports it"""
+    os.makedirs(destination, exist_ok=True)
+    try:
+        subprocess.run(["cp", "-a", "--reflink=auto", f"{source}/.", destination],
+                       check=True, capture_output=True, timeout=120)
+    except (OSError, subprocess.SubprocessError):
+        shutil.copytree(source, destination, dirs_exist_ok=True)
+
+
+def asset_hash(urls):
+    """Hash of the script and stylesheet URLs the pages reference, or None if no page could be read"""
+    assets = set()
+    fetched = False
+    for url in urls:
+        try:
+            with urllib.request.urlopen(url, timeout=ASSET_FETCH_TIMEOUT) as response:
+                html = response.read(ASSET_FETCH_LIMIT).decode('utf-8', errors='replace')
+        except Exception as e:
+            logger.debug(f"Failed to read assets of {url}: {str(e)}")
+            continue
+        fetched = True
+        assets.update(urljoin(url, asset) for asset in ASSET_PATTERN.findall(html))
+    if not fetched:
+        return None
+    return hashlib.sha256("\n".join(sorted(assets)).encode('utf-8')).hexdigest()
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        pass
+    return True
+
+
+class ProfileTemplate:
+    """Prewarmed Chrome profile that new sessions start from.
+
+    A builder browser loads the warm pages once and its HTTP and code caches
+    become a template version; sessions get a copy-on-write clone
+    of the current version, so all workers reuse the same cached bundles.
+    The template is rebuilt in the background once it is older than
+    ``max_age`` or the pages reference different assets. A lock file makes
+    sure one process builds while the others keep cloning the old version.
+
+    The builder browser is admitted like a test run. ``builder(urls)``, if
+    set, runs the build elsewhere (a worker process) instead of here.
+    """
+
+    def __init__(self, root=PROFILE_TEMPLATE_DIR, clone_root=PROFILE_CLONE_DIR, warm_urls=PROFILE_WARM_URLS,
+                 max_age=PROFILE_TEMPLATE_MAX_AGE, check_interval=PROFILE_ASSET_CHECK_INTERVAL,
+                 sweep_interval=PROFILE_SWEEP_INTERVAL, builder=None):
+        self.root = root or state_path("profile_template")
+        self.clone_root = clone_root
+        self.warm_urls = list(warm_urls)
+        self.max_age = max_age
+        self.check_interval = check_interval
+        self.sweep_interval = sweep_interval
+        self.builder = builder
+        self._observed = {}
+        self._manifest = None
+        self._manifest_signature = None
+        self._checked_at = None
+        self._building = False
+        self._sweeper = None
+        self._stats = {"clones": 0, "builds": 0, "buildFailures": 0, "swept": 0}
+        self._lock = threading.Lock()
+        os.makedirs(self.root, exist_ok=True)
+
+    def manifest(self):
+        """Current template version, re-read only when another process replaced it"""
+        path = os.path.join(self.root, MANIFEST_FILE)
+        try:
+            stat = os.stat(path)
+            signature = (stat.st_mtime_ns, stat.st_size)
+        except OSError:
+            signature = None
+        with self._lock:
+            if signature != self._manifest_signature:
+                self._manifest = read_json(path) if signature else None
+                self._manifest_signature = signature
+            return self._manifest
+
+    def generation(self):
+        manifest = self.manifest()
+        return manifest["version"] if manifest else None
+
+    def is_stale(self, driver):
+        """Whether a session started from an older template version than the current one"""
+        profile = getattr(driver, "profile", None)
+        return (profile.generation if profile else None) != self.generation()
+
+    def clone(self):
+        """A private copy of the current template, or None while there is none"""
+        manifest = self.manifest()
+        if not manifest:
+            return None
+        os.makedirs(self.clone_root, exist_ok=True)
+        path = tempfile.mkdtemp(prefix=f"{CLONE_PREFIX}{os.getpid()}-", dir=self.clone_root)
+        try:
+            copy_tree(os.path.join(self.root, manifest["version"]), path)
+        except Exception as e:
+            logger.warning(f"Failed to clone browser profile template: {str(e)}")
+            shutil.rmtree(path, ignore_errors=True)
+            return None
+        with self._lock:
+            self._stats["clones"] += 1
+        return ClonedProfile(path, manifest["version"])
+
+    def observe(self, url):
+        """Remember a test's start page as a warm page when none are configured"""
+        if not self.warm_urls and url and urlsplit(url).scheme in ("http", "https"):
+            with self._lock:
+                if url not in self._observed and len(self._observed) < MAX_WARM_URLS:
+                    self._observed[url] = None
+                    # A new page is a reason to rebuild without waiting for the next check
+                    self._checked_at = None
+        self.refresh_async()
+
+    def refresh_async(self):
+        """Check in the background whether the template needs a rebuild"""
+        now = time.monotonic()
+        with self._lock:
+            if self._building or (self._checked_at is not None and now - self._checked_at < self.check_interval):
+                return
+            self._building = True
+            self._checked_at = now
+        threading.Thread(target=self._refresh, name="profile-template-refresh", daemon=True).start()
+
+    def _refresh(self):
+        try:
+            with self._lock:
+                urls = self.warm_urls or list(self._observed)
+            if not urls or not self._needs_build(urls, asset_hash(urls)):
+                return
+            if self.builder is not None:
+                self.builder(urls)
+            else:
+                self.build(urls, force=False)
+        except Exception as e:
+            logger.error(f"Failed to refresh browser profile template: {str(e)}")
+        finally:
+            with self._lock:
+                self._building = False
+
+    def _needs_build(self, urls, hashed):
+        manifest = self.manifest()
+        if not manifest:
+            return True
+        if time.time() - manifest.get("builtAt", 0) >= self.max_age:
+            return True
+        if not set(urls) <= set(manifest.get("urls", [])):
+            return True
+        return hashed is not None and hashed != manifest.get("assetHash")
+
+    def build(self, urls, force=True):
+        """Build a new template version from ``urls``; False if it was current or another process is building"""
+        hashed = asset_hash(urls)
+        if not force and not self._needs_build(urls, hashed):
+            return False
+
+        with open(os.path.join(self.root, LOCK_FILE), "w") as lock:
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                logger.debug("Another process is building the browser profile template")
+                return False
+            # The previous holder may have just built what this process wanted
+            if not force and not self._needs_build(urls, hashed):
+                return False
+            try:
+                self._build_locked(urls, hashed)
+            except Exception:
+                with self._lock:
+                    self._stats["buildFailures"] += 1
+                raise
+            return True
+
+    def _build_locked(self, urls, hashed):
+        # driver_pool clones templates when it launches Chrome, so import it lazily
+        from driver_pool import create_driver
+
+        admission = get_admission_controller()
+        started = time.monotonic()
+        os.makedirs(self.clone_root, exist_ok=True)
+        workdir = tempfile.mkdtemp(prefix=f"{CLONE_PREFIX}{os.getpid()}-build-", dir=self.clone_root)
+        try:
+            with admission.admit():
+                driver = create_driver(user_data_dir=workdir)
+                try:
+                    with admission.track(driver):
+                        for url in urls:
+                            try:
+                                driver.get(url)
+                                settle(driver, 'navigate')
+                            except Exception as e:
+                                logger.warning(f"Failed to warm browser profile with {url}: {str(e)}")
+                finally:
+                    # Chrome flushes its caches to disk on exit
+                    driver.quit()
+
+            version = f"{int(time.time())}-{os.getpid()}"
+            destination = os.path.join(self.root, version)
+            for cache_dir in CACHE_DIRS:
+                source = os.path.join(workdir, cache_dir)
+                if os.path.isdir(source):
+                    copy_tree(source, os.path.join(destination, cache_dir))
+            os.makedirs(destination, exist_ok=True)
+            atomic_write_json(os.path.join(self.root, MANIFEST_FILE), {
+                "version": version,
+                "builtAt": time.time(),
+                "urls": urls,
+                "assetHash": hashed
+            })
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+        self._prune(version)
+        with self._lock:
+            self._stats["builds"] += 1
+        logger.info(f"Built browser profile template {version} from {len(urls)} pages "
+                    f"in {time.monotonic() - started:.1f}s")
+
+    def _prune(self, current):
+        """Delete template versions older than the one before ``current``; sessions may still be cloning that one"""
+        versions = sorted((name for name in os.listdir(self.root)
+                           if name.split("-")[0].isdigit() and os.path.isdir(os.path.join(self.root, name))),
+                          key=lambda name: int(name.split("-")[0]))
+        for name in versions[:-2]:
+            if name != current:
+                shutil.rmtree(os.path.join(self.root, name), ignore_errors=True)
+
+    def sweep(self):
+        """Delete clones left behind by processes that were killed"""
+        try:
+            names = os.listdir(self.clone_root)
+        except OSError:
+            return
+        for name in names:
+            if not name.startswith(CLONE_PREFIX):
+                continue
+            pid = name[len(CLONE_PREFIX):].split("-")[0]
+            if pid.isdigit() and not _pid_alive(int(pid)):
+                shutil.rmtree(os.path.join(self.clone_root, name), ignore_errors=True)
+                with self._lock:
+                    self._stats["swept"] += 1
+
+    def start_sweeper(self):
+        """Sweep every ``sweep_interval`` seconds; workers are killed and replaced without a restart"""
+        with self._lock:
+            if self._sweeper is not None or self.sweep_interval <= 0:
+                return
+            self._sweeper = threading.Thread(target=self._sweep_loop, name="profile-clone-sweeper", daemon=True)
+        self._sweeper.start()
+
+    def _sweep_loop(self):
+        while True:
+            time.sleep(self.sweep_interval)
+            try:
+                self.sweep()
+            except Exception as e:
+                logger.warning(f"Failed to sweep browser profile clones: {str(e)}")
+
+    def stats(self):
+        manifest = self.manifest() or {}
+        with self._lock:
+            return {
+                **self._stats,
+                "enabled": PROFILE_TEMPLATE,
+                "version": manifest.get("version"),
+                "builtAt": manifest.get("builtAt"),
+                "warmUrls": len(self.warm_urls or self._observed),
+                "building": self._building
+            }
+
+
+_template = None
+_template_lock = threading.Lock()
+
+
+def get_profile_template():
+    global _template
+    with _template_lock:
+        if _template is None:
+            _template = ProfileTemplate()
+            _template.sweep()
+            _template.start_sweeper()
+        return _template
+
+
+def peek_profile_template():
+    """The template if something already created it, without the directory and sweeper that creation starts"""
+    return _template
@@ -0,0 +1,294 @@
+import os
+import re
+import json
+import time
+import fcntl
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from file_utils import state_path, atomic_write_text
+from run_result import dumps
+
+logger = logging.getLogger(__name__)
+
+# Flush when this many results are buffered...
+RESULT_FLUSH_SIZE = int(os.environ.get("RESULT_FLUSH_SIZE", "20"))
+# ...or when the oldest buffered result is this many seconds old
+RESULT_FLUSH_INTERVAL = float(os.environ.get("RESULT_FLUSH_INTERVAL", "2.0"))
+# Failed writes of one result before it is moved to the dead-letter file
+RESULT_MAX_RETRIES = int(os.environ.get("RESULT_MAX_RETRIES", "5"))
+RESULT_RETRY_BACKOFF = float(os.environ.get("RESULT_RETRY_BACKOFF", "0.5"))
+# Longest wait between retries while every write fails (e.g. Supabase is unreachable)
+RESULT_MAX_BACKOFF = float(os.environ.get("RESULT_MAX_BACKOFF", "60"))
+# Rows of one flush written concurrently
+RESULT_WRITE_CONCURRENCY = int(os.environ.get("RESULT_WRITE_CONCURRENCY", "8"))
+
+# One spool per process, so processes sharing the state directory never overwrite each other's
+SPOOL_FILE = "result_spool-{pid}.jsonl"
+SPOOL_PATTERN = re.compile(r"result_spool(?:-(\d+))?\.jsonl")
+SPOOL_LOCK_FILE = "result_spool.lock"
+DEAD_LETTER_FILE = "result_dead_letter.jsonl"
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        pass
+    return True
+
+
+class ResultWriter:
+    """Write-behind buffer for test results.
+
+    ``submit`` records a result in this process's append-only spool and
+    returns the merged row immediately; a background thread writes buffered
+    results through ``write_row(row)`` (rows are ``{"id", "response"}``),
+    ``concurrency`` rows at a time. Entries leave the spool only after they
+    were written, so results survive a crash and are replayed on ``start``,
+    along with the spools of processes that died.
+
+    A failing row does not hold up the others. It is retried with
+    exponential backoff and moved to a dead-letter file after
+    ``max_retries`` failures. Failures are only counted against a row
+    while other rows are written; when every write fails the store is
+    assumed to be down and the whole buffer backs off instead.
+    """
+
+    def __init__(self, write_row, batch_size=RESULT_FLUSH_SIZE, flush_interval=RESULT_FLUSH_INTERVAL,
+                 max_retries=RESULT_MAX_RETRIES, retry_backoff=RESULT_RETRY_BACKOFF,
+                 max_backoff=RESULT_MAX_BACKOFF, spool_path=None, dead_letter_path=None,
+                 concurrency=RESULT_WRITE_CONCURRENCY):
+        self.write_row = write_row
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self.max_retries = max(1, max_retries)
+        self.retry_backoff = retry_backoff
+        self.max_backoff = max_backoff
+        self._spool_path = spool_path
+        self.dead_letter_path = dead_letter_path or state_path(DEAD_LETTER_FILE)
+        self._pending = {}
+        self._failures = {}
+        self._retry_at = {}
+        self._outages = 0
+        self._paused_until = 0.0
+        self._dead_letters = 0
+        self._oldest = None
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._executor = ThreadPoolExecutor(max_workers=max(1, concurrency), thread_name_prefix="result-write")
+
+    @property
+    def spool_path(self):
+        # Resolved on use: servers that fork after import give each worker its own pid
+        return self._spool_path or state_path(SPOOL_FILE.format(pid=os.getpid()))
+
+    def start(self):
+        """Replay this process's spool and those of dead processes, then start the background flusher"""
+        with self._lock:
+            for entry in self._read_spool(self.spool_path):
+                self._pending[entry["id"]] = entry
+            self._adopt_orphaned_spools()
+            if self._pending:
+                logger.info(f"Replaying {len(self._pending)} spooled test results")
+                self._oldest = time.monotonic()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="result-writer", daemon=True)
+        self._thread.start()
+
+    def close(self):
+        """Stop the flusher after a final flush attempt"""
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=30)
+            self._thread = None
+        self._executor.shutdown(wait=False)
+
+    def submit(self, row, result_data):
+        """Queue ``result_data`` as the row's response and return the merged row"""
+        entry = {"id": row["id"], "response": result_data}
+        with self._lock:
+            with open(self.spool_path, 'a', encoding='utf-8') as f:
+                f.write(dumps(entry) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            self._pending[entry["id"]] = entry
+            # A newer result starts with a clean slate
+            self._failures.pop(entry["id"], None)
+            self._retry_at.pop(entry["id"], None)
+            if self._oldest is None:
+                self._oldest = time.monotonic()
+            if len(self._pending) >= self.batch_size:
+                self._wake.set()
+        return {**row, "response": result_data}
+
+    def pending_response(self, testcase_id):
+        """Latest result not yet flushed for a test case, if any"""
+        with self._lock:
+            entry = self._pending.get(testcase_id)
+            return entry["response"] if entry else None
+
+    def stats(self):
+        with self._lock:
+            return {
+                "pending": len(self._pending),
+                "retrying": len(self._failures),
+                "deadLetters": self._dead_letters,
+                "outage": self._outages > 0
+            }
+
+    def flush(self, force=False):
+        """Write every buffered result whose retry is due (all of them with ``force``).
+
+        Returns True if the buffer is empty afterwards.
+        """
+        now = time.monotonic()
+        with self._lock:
+            batch = [entry for entry in self._pending.values()
+                     if force or self._retry_at.get(entry["id"], 0) <= now]
+        if not batch:
+            with self._lock:
+                return not self._pending
+
+        started = time.monotonic()
+        written = []
+        failed = []
+        for entry, error in self._executor.map(self._write, batch):
+            if error is None:
+                written.append(entry)
+            else:
+                failed.append((entry, error))
+
+        outage = failed and not written
+        dead = []
+        with self._lock:
+            for entry in written:
+                self._forget(entry)
+            if outage:
+                # Nothing got through, so no row is to blame; back off as a whole
+                self._outages += 1
+                self._paused_until = time.monotonic() + min(
+                    self.max_backoff, self.retry_backoff * (2 ** (self._outages - 1)))
+            else:
+                self._outages = 0
+                self._paused_until = 0.0
+                for entry, error in failed:
+                    if self._pending.get(entry["id"]) is not entry:
+                        continue
+                    failures = self._failures.get(entry["id"], 0) + 1
+                    if failures >= self.max_retries:
+                        dead.append((entry, error))
+                        self._forget(entry)
+                    else:
+                        self._failures[entry["id"]] = failures
+                        self._retry_at[entry["id"]] = time.monotonic() + min(
+                            self.max_backoff, self.retry_backoff * (2 ** (failures - 1)))
+            if dead:
+                self._dead_letters += len(dead)
+                self._append_dead_letters(dead)
+            self._oldest = time.monotonic() if self._pending else None
+            atomic_write_text(self.spool_path, "".join(dumps(e) + "\n" for e in self._pending.values()))
+            empty = not self._pending
+
+        elapsed_ms = (time.monotonic() - started) * 1000
+        if outage:
+            logger.warning(f"Writing {len(batch)} test results failed, retrying later: {failed[0][1]}")
+        else:
+            logger.info(f"Wrote {len(written)} test results in {elapsed_ms:.0f} ms"
+                        + (f", {len(failed)} failed" if failed else ""))
+        for entry, error in failed:
+            logger.debug(f"Writing the result of test case {entry['id']} failed: {error}")
+        for entry, error in dead:
+            logger.error(f"Moved the result of test case {entry['id']} to {self.dead_letter_path}: {error}")
+        return empty
+
+    def _write(self, entry):
+        try:
+            self.write_row(entry)
+            return entry, None
+        except Exception as e:
+            return entry, str(e)
+
+    def _forget(self, entry):
+        # Entries replaced by a newer result during the flush stay pending
+        if self._pending.get(entry["id"]) is entry:
+            del self._pending[entry["id"]]
+            self._failures.pop(entry["id"], None)
+            self._retry_at.pop(entry["id"], None)
+
+    def _append_dead_letters(self, dead):
+        failed_at = datetime.now().isoformat()
+        with open(self.dead_letter_path, 'a', encoding='utf-8') as f:
+            for entry, error in dead:
+                f.write(dumps({**entry, "error": error, "failedAt": failed_at}) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _due(self):
+        now = time.monotonic()
+        with self._lock:
+            if not self._pending or now < self._paused_until:
+                return False
+            ready = [entry_id for entry_id in self._pending if self._retry_at.get(entry_id, 0) <= now]
+            if not ready:
+                return False
+            return (len(ready) >= self.batch_size
+                    or now - self._oldest >= self.flush_interval)
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.wait(timeout=min(self.flush_interval, 1.0))
+            self._wake.clear()
+            if self._due():
+                self.flush()
+        self.flush(force=True)
+
+    def _adopt_orphaned_spools(self):
+        """Move the entries of spools whose process died into this one; called with ``_lock`` held"""
+        directory = os.path.dirname(self.spool_path) or "."
+        with open(os.path.join(directory, SPOOL_LOCK_FILE), 'a') as lock:
+            # Processes starting together must not both adopt the same spool
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            orphans = []
+            for name in os.listdir(directory):
+                path = os.path.join(directory, name)
+                match = SPOOL_PATTERN.fullmatch(name)
+                if not match or os.path.abspath(path) == os.path.abspath(self.spool_path):
+                    continue
+                # The unnumbered spool predates per-process spools
+                if match.group(1) is None or not _pid_alive(int(match.group(1))):
+                    orphans.append(path)
+            if not orphans:
+                return
+            for path in orphans:
+                for entry in self._read_spool(path):
+                    self._pending.setdefault(entry["id"], entry)
+            # Persist the adopted entries before their old spools disappear
+            atomic_write_text(self.spool_path, "".join(dumps(e) + "\n" for e in self._pending.values()))
+            for path in orphans:
+                os.remove(path)
+            logger.info(f"Adopted {len(orphans)} result spools left by stopped processes")
+
+    @staticmethod
+    def _read_spool(path):
+        entries = []
+        try:
+            with open(path, encoding='utf-8') as f:
+                for line in f:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        entries.append(json.loads(line))
+                    except ValueError:
+                        # A torn final line from a crash mid-write
+                        logger.warning("Skipping unreadable line in result spool")
+        except FileNotFoundError:
+            pass
+        return entries
@@ -0,0 +1,142 @@
+import json
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+try:
+    import orjson
+except ImportError:  # fall back to the standard library encoder
+    orjson = None
+
+
+def dumps(data, pretty=False):
+    """Serialize to a JSON string, using orjson when it is installed"""
+    if orjson is not None:
+        return orjson.dumps(data, option=orjson.OPT_INDENT_2 if pretty else 0).decode('utf-8')
+    if pretty:
+        return json.dumps(data, indent=2)
+    return json.dumps(data, separators=(',', ':'))
+
+
+@dataclass(slots=True)
+class StepResult:
+    step: int
+    description: str
+    status: str
+    debug: List[str]
+    error: Optional[str] = None
+    duration_ms: Optional[float] = None
+
+    def to_dict(self):
+        return {
+            "step": self.step,
+            "description": self.description,
+            "status": self.status,
+            "debug": self.debug,
+            "error": self.error,
+            "durationMs": self.duration_ms
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data["step"], data["description"], data["status"], data.get("debug") or [], data.get("error"),
+                   data.get("durationMs"))
+
+
+@dataclass(slots=True)
+class RunSummary:
+    total_steps: int = 0
+    passed: int = 0
+    failed: int = 0
+    skipped: int = 0
+    success_rate: int = 0
+    status: str = "PASSED"
+    duration_ms: Optional[float] = None
+    # Milliseconds per trace category (driver, module, step, webdriver, wait)
+    phases_ms: Optional[dict] = None
+    # Login steps replaced by a cached session; they did not run
+    restored: int = 0
+
+    def to_dict(self):
+        data = {
+            "totalSteps": self.total_steps,
+            "passed": self.passed,
+            "failed": self.failed,
+            "skipped": self.skipped,
+            "restored": self.restored,
+            "successRate": self.success_rate,
+            "status": self.status,
+            "durationMs": self.duration_ms
+        }
+        if self.phases_ms is not None:
+            data["phasesMs"] = self.phases_ms
+        return data
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data["totalSteps"], data["passed"], data["failed"], data.get("skipped", 0),
+                   data["successRate"], data["status"], data.get("durationMs"), data.get("phasesMs"),
+                   data.get("restored", 0))
+
+
+@dataclass(slots=True)
+class RunResult:
+    """Result of one test case run.
+
+    Kept as objects while the test runs; ``to_dict`` produces the stored
+    shape and ``to_json`` is only needed at the storage or HTTP boundary.
+    """
+    test_case_id: Optional[str]
+    name: Optional[str]
+    steps: List[StepResult] = field(default_factory=list)
+    summary: RunSummary = field(default_factory=RunSummary)
+    network: Optional[dict] = None
+    # The run's ``tracing.Trace``; exported separately, never part of the stored shape
+    trace: Optional[object] = field(default=None, repr=False, compare=False)
+
+    def add_step(self, step_result):
+        self.steps.append(step_result)
+        if step_result.status == "PASSED":
+            self.summary.passed += 1
+        elif step_result.status == "SKIPPED":
+            self.summary.skipped += 1
+        elif step_result.status == "RESTORED":
+            self.summary.restored += 1
+        else:
+            self.summary.failed += 1
+            self.summary.status = "FAILED"
+
+    def finalize(self):
+        """Fill in the derived summary fields"""
+        self.summary.total_steps = len(self.steps)
+        # Restored steps did not run, so they neither raise nor lower the rate
+        ran = self.summary.total_steps - self.summary.restored
+        if ran > 0:
+            self.summary.success_rate = int((self.summary.passed / ran) * 100)
+
+    def to_dict(self):
+        response = {
+            "steps": [step.to_dict() for step in self.steps],
+            "summary": self.summary.to_dict()
+        }
+        if self.network is not None:
+            response["network"] = self.network
+        return {
+            "testCaseId": self.test_case_id,
+            "name": self.name,
+            "response": response
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        """Rebuild a result from its ``to_dict`` shape, e.g. one posted back by a remote worker"""
+        response = data["response"]
+        return cls(
+            data.get("testCaseId"),
+            data.get("name"),
+            [StepResult.from_dict(step) for step in response["steps"]],
+            RunSummary.from_dict(response["summary"]),
+            response.get("network")
+        )
+
+    def to_json(self, pretty=False):
+        return dumps(self.to_dict(), pretty=pretty)
@@ -0,0 +1,167 @@
+import os
+import time
+import heapq
+import atexit
+import logging
+import threading
+import statistics
+from dataclasses import dataclass
+from typing import List
+from file_utils import state_path, read_json, atomic_write_json
+from suite_runner import PAGE_SIZE
+
+logger = logging.getLogger(__name__)
+
+# Estimated seconds for a test case with no history and nothing to compare with
+DEFAULT_TEST_ESTIMATE = float(os.environ.get("DEFAULT_TEST_ESTIMATE", "30"))
+# Priority classes dispatched ahead of the rest, in order ("" for pure LPT)
+SCHEDULE_PRIORITIES = [p for p in os.environ.get("SCHEDULE_PRIORITIES", "failed,changed").split(",") if p]
+# Weight of the newest duration in the moving average
+HISTORY_SMOOTHING = 0.3
+# Minimum seconds between writes of the history file
+HISTORY_SAVE_INTERVAL = 5.0
+
+RUN_HISTORY_FILE = "run_history.json"
+
+
+class RunHistory:
+    """Persisted per-test-case run durations and outcomes"""
+
+    def __init__(self, path=None):
+        self.path = path or state_path(RUN_HISTORY_FILE)
+        self._entries = read_json(self.path, default={}) or {}
+        self._dirty = False
+        self._saved_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def get(self, test_id):
+        with self._lock:
+            entry = self._entries.get(str(test_id))
+            return dict(entry) if entry else None
+
+    def record(self, test_id, duration, status, actions_digest):
+        with self._lock:
+            entry = self._entries.get(str(test_id))
+            if entry is None:
+                estimate = duration
+            else:
+                estimate = HISTORY_SMOOTHING * duration + (1 - HISTORY_SMOOTHING) * entry["estimate"]
+            self._entries[str(test_id)] = {
+                "estimate": round(estimate, 3),
+                "lastDuration": round(duration, 3),
+                "status": status,
+                "actionsHash": actions_digest
+            }
+            self._dirty = True
+            due = time.monotonic() - self._saved_at >= HISTORY_SAVE_INTERVAL
+        if due:
+            self.save()
+
+    def save(self):
+        with self._lock:
+            if not self._dirty:
+                return
+            snapshot = {key: dict(entry) for key, entry in self._entries.items()}
+            self._dirty = False
+            self._saved_at = time.monotonic()
+        try:
+            atomic_write_json(self.path, snapshot)
+        except OSError as e:
+            logger.warning(f"Failed to save run history: {str(e)}")
+
+
+_history = None
+_history_lock = threading.Lock()
+
+
+def get_run_history():
+    global _history
+    with _history_lock:
+        if _history is None:
+            _history = RunHistory()
+            atexit.register(_history.save)
+        return _history
+
+
+@dataclass(slots=True)
+class ScheduledTest:
+    id: int
+    estimate: float
+    priority: int
+
+
+@dataclass(slots=True)
+class Schedule:
+    """Dispatch order of a suite and the makespan it is expected to take"""
+    tests: List[ScheduledTest]
+    workers: int
+    predicted_makespan: float
+
+    def __len__(self):
+        return len(self.tests)
+
+    def to_dict(self):
+        return {
+            "tests": len(self.tests),
+            "workers": self.workers,
+            "predictedMakespanSeconds": round(self.predicted_makespan, 1)
+        }
+
+
+def priority_of(entry, actions_digest, priorities=SCHEDULE_PRIORITIES):
+    """Index of the first priority class a test case falls in (lower runs first)"""
+    for index, name in enumerate(priorities):
+        if name == "failed" and entry is not None and entry["status"] != "PASSED":
+            return index
+        if name == "changed" and (entry is None or entry["actionsHash"] != actions_digest):
+            return index
+    return len(priorities)
+
+
+def predict_makespan(estimates, workers):
+    """Finish time of greedy list scheduling of ``estimates`` in order on ``workers``"""
+    finish_times = [0.0] * max(1, workers)
+    for estimate in estimates:
+        heapq.heappush(finish_times, heapq.heappop(finish_times) + estimate)
+    return max(finish_times)
+
+
+def build_schedule(rows, actions_digest, workers, history=None, priorities=SCHEDULE_PRIORITIES):
+    """Order test cases by priority class, then longest estimated duration first (LPT).
+
+    ``rows`` only needs to be iterated once; just the id, estimate and class
+    of each row are kept. ``actions_digest(row)`` detects changed test cases.
+    """
+    history = history or get_run_history()
+    tests = []
+    unknown = []
+    for row in rows:
+        entry = history.get(row["id"])
+        test = ScheduledTest(row["id"], entry["estimate"] if entry else None,
+                             priority_of(entry, actions_digest(row), priorities))
+        tests.append(test)
+        if entry is None:
+            unknown.append(test)
+
+    # Test cases never run before are assumed to take a typical duration
+    known = [test.estimate for test in tests if test.estimate is not None]
+    fallback = statistics.median(known) if known else DEFAULT_TEST_ESTIMATE
+    for test in unknown:
+        test.estimate = fallback
+
+    tests.sort(key=lambda test: (test.priority, -test.estimate))
+    return Schedule(tests, workers, predict_makespan((test.estimate for test in tests), workers))
+
+
+def iter_scheduled(schedule, fetch_rows, chunk_size=PAGE_SIZE):
+    """Yield full rows in schedule order, fetching them ``chunk_size`` ids at a time.
+
+    ``fetch_rows(ids)`` returns the rows for ``ids`` in any order.
+    """
+    for start in range(0, len(schedule.tests), chunk_size):
+        ids = [test.id for test in schedule.tests[start:start + chunk_size]]
+        rows = {row["id"]: row for row in fetch_rows(ids)}
+        for testcase_id in ids:
+            row = rows.get(testcase_id)
+            if row is not None:
+                yield row
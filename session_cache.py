@@ -0,0 +1,340 @@
+import os
+import json
+import time
+import hashlib
+import logging
+import threading
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+from locator import page_key
+from wait_strategies import settle
+
+logger = logging.getLogger(__name__)
+
+# "1" restores captured logins instead of replaying them, "0" always replays
+SESSION_REUSE = os.environ.get("SESSION_REUSE", "1") == "1"
+# Seconds a captured session is restored before the prefix is run again
+SESSION_CACHE_TTL = float(os.environ.get("SESSION_CACHE_TTL", "900"))
+# Seconds a run waits for a concurrent run that is capturing the same prefix
+SESSION_CAPTURE_WAIT = float(os.environ.get("SESSION_CAPTURE_WAIT", "60"))
+# Seconds the login prefix gets to leave the login page before no session is captured
+SESSION_LOGIN_WAIT = float(os.environ.get("SESSION_LOGIN_WAIT", "10"))
+
+LOGIN_POLL_INTERVAL = 0.1
+
+# Fields of a CDP Network.Cookie accepted back by Network.setCookies
+COOKIE_PARAMS = ("name", "value", "domain", "path", "secure", "httpOnly", "sameSite",
+                 "expires", "priority", "sourceScheme", "sourcePort")
+
+READ_STORAGE_JS = """
+function dump(storage) {
+    var items = {};
+    for (var i = 0; i < storage.length; i++) {
+        var key = storage.key(i);
+        items[key] = storage.getItem(key);
+    }
+    return items;
+}
+return {origin: window.location.origin, local: dump(window.localStorage), session: dump(window.sessionStorage)};
+"""
+
+# Runs before any page script of the first document on the captured origin
+RESTORE_STORAGE_JS = """
+(function (origin, local, session) {
+    if (window.location.origin !== origin) { return; }
+    Object.keys(local).forEach(function (key) { window.localStorage.setItem(key, local[key]); });
+    Object.keys(session).forEach(function (key) { window.sessionStorage.setItem(key, session[key]); });
+})(%s, %s, %s);
+"""
+
+
+@dataclass(slots=True)
+class SessionPrefix:
+    """Leading login steps of a test case that can be replaced by a captured session"""
+    key: str
+    steps: int
+    login_url: str
+    resume_url: str
+
+
+@dataclass(slots=True)
+class CapturedSession:
+    cookies: List[dict]
+    origin: str
+    local_storage: Dict[str, str] = field(default_factory=dict)
+    session_storage: Dict[str, str] = field(default_factory=dict)
+    captured_at: float = field(default_factory=time.monotonic)
+
+
+@dataclass(slots=True)
+class SessionOutcome:
+    """What a run in a worker process did with the session it was handed"""
+    restored: bool = False
+    invalidated: bool = False
+    captured: Optional[CapturedSession] = None
+
+
+def find_session_prefix(actions):
+    """The login prefix of a recorded action list, or None.
+
+    The prefix is the run of change/click actions on the login page (the
+    page of the first change or click, which the runners navigate to as
+    step 1). It must type something, submit with a click and be followed
+    by an action on another page, which is where a restored session resumes.
+    """
+    recorded = [action for action in actions or [] if action.get('type') != 'navigate']
+    login_url = next((action.get('url') for action in recorded
+                      if action.get('type') in ['change', 'click'] and action.get('url')), None)
+    if not login_url:
+        return None
+
+    prefix = []
+    for action in recorded:
+        element = action.get('element') or {}
+        if (action.get('type') not in ['change', 'click']
+                or not (element.get('uniqueSelector') or element.get('xpath'))
+                or page_key(action.get('url')) != page_key(login_url)):
+            break
+        prefix.append(action)
+
+    rest = recorded[len(prefix):]
+    resume_url = rest[0].get('url') if rest else None
+    types = {action.get('type') for action in prefix}
+    if not resume_url or types != {'change', 'click'} or page_key(resume_url) == page_key(login_url):
+        return None
+
+    normalized = json.dumps({"loginUrl": login_url, "actions": [
+        {"type": action.get('type'), "element": action.get('element'), "value": action.get('value')}
+        for action in prefix
+    ]}, sort_keys=True, separators=(',', ':'), default=str)
+    key = hashlib.sha256(normalized.encode('utf-8')).hexdigest()
+    # Step 1 is the navigation to the login page, then one step per prefix action
+    return SessionPrefix(key, len(prefix) + 1, login_url, resume_url)
+
+
+def capture_session(driver):
+    """Cookies of every domain plus the current origin's web storage"""
+    cookies = driver.execute_cdp_cmd("Network.getAllCookies", {})["cookies"]
+    storage = driver.execute_script(READ_STORAGE_JS)
+    return CapturedSession(
+        cookies=[{name: cookie[name] for name in COOKIE_PARAMS if name in cookie and not
+                  (name == "expires" and cookie.get("session"))} for cookie in cookies],
+        origin=storage["origin"],
+        local_storage=storage["local"],
+        session_storage=storage["session"]
+    )
+
+
+def wait_for_login(driver, login_url, timeout=SESSION_LOGIN_WAIT):
+    """Wait until the browser left the login page and the next page is ready; False on timeout.
+
+    Logins submitted by fetch/XHR set their cookie or token only when the
+    response arrives, so the submit click returning proves nothing yet.
+    """
+    deadline = time.monotonic() + timeout
+    while page_key(driver.current_url) == page_key(login_url):
+        if time.monotonic() >= deadline:
+            return False
+        time.sleep(LOGIN_POLL_INTERVAL)
+    settle(driver, 'navigate')
+    return True
+
+
+def restore_session(driver, prefix, session):
+    """Load a captured session and open the page after the prefix; False if it is no longer valid"""
+    driver.execute_cdp_cmd("Network.setCookies", {"cookies": session.cookies})
+    script = driver.execute_cdp_cmd("Page.addScriptToEvaluateOnNewDocument", {
+        "source": RESTORE_STORAGE_JS % (json.dumps(session.origin), json.dumps(session.local_storage),
+                                        json.dumps(session.session_storage))
+    })
+    try:
+        driver.get(prefix.resume_url)
+    finally:
+        driver.execute_cdp_cmd("Page.removeScriptToEvaluateOnNewDocument", {"identifier": script["identifier"]})
+    settle(driver, 'navigate')
+    # An expired login sends the browser back to the login page
+    return page_key(driver.current_url) != page_key(prefix.login_url)
+
+
+class SessionCache:
+    """Captured sessions by prefix key, with a TTL and one capture at a time per key"""
+
+    def __init__(self, ttl=SESSION_CACHE_TTL, capture_wait=SESSION_CAPTURE_WAIT):
+        self.ttl = ttl
+        self.capture_wait = capture_wait
+        self._sessions = {}
+        self._capturing = {}
+        self._stats = {"restored": 0, "captured": 0, "invalid": 0, "expired": 0}
+        self._lock = threading.Lock()
+
+    def acquire(self, key):
+        """(session, capture): a fresh session to restore, or whether the caller should capture one"""
+        deadline = time.monotonic() + self.capture_wait
+        while True:
+            with self._lock:
+                session = self._sessions.get(key)
+                if session is not None and time.monotonic() - session.captured_at >= self.ttl:
+                    del self._sessions[key]
+                    self._stats["expired"] += 1
+                    session = None
+                if session is not None:
+                    return session, False
+                capture = self._capturing.get(key)
+                if capture is None:
+                    self._capturing[key] = threading.Event()
+                    return None, True
+            # Another run is logging in with this prefix; reuse its session
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or not capture.wait(remaining):
+                return None, False
+
+    def store(self, key, session):
+        with self._lock:
+            self._sessions[key] = session
+            self._stats["captured"] += 1
+        self.abandon(key)
+
+    def abandon(self, key):
+        """Give up a capture so waiting runs stop waiting"""
+        with self._lock:
+            capture = self._capturing.pop(key, None)
+        if capture is not None:
+            capture.set()
+
+    def invalidate(self, key):
+        with self._lock:
+            if self._sessions.pop(key, None) is not None:
+                self._stats["invalid"] += 1
+
+    def record_restore(self):
+        with self._lock:
+            self._stats["restored"] += 1
+
+    def apply(self, key, outcome):
+        """Apply a ``SessionOutcome`` reported by a worker process"""
+        if outcome.invalidated:
+            self.invalidate(key)
+        if outcome.restored:
+            self.record_restore()
+        if outcome.captured is not None:
+            self.store(key, outcome.captured)
+
+    def stats(self):
+        with self._lock:
+            return {**self._stats, "sessions": len(self._sessions), "capturing": len(self._capturing)}
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_session_cache():
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = SessionCache()
+        return _cache
+
+
+class SessionHandoff:
+    """Stands in for the ``SessionCache`` inside a worker process.
+
+    The API process acquires from its own cache and sends the session, or
+    the turn to capture one, with the task; ``outcome`` goes back with the
+    result and is applied to the cache there.
+    """
+
+    def __init__(self, session=None, capture=False):
+        self.session = session
+        self.capture = capture
+        self.outcome = SessionOutcome()
+
+    def acquire(self, key):
+        session, self.session = self.session, None
+        if session is not None:
+            return session, False
+        return None, self.capture
+
+    def store(self, key, session):
+        self.outcome.captured = session
+
+    def abandon(self, key):
+        pass
+
+    def invalidate(self, key):
+        self.outcome.invalidated = True
+        # The run replays the login and captures a fresh session for the API process
+        self.capture = True
+
+    def record_restore(self):
+        self.outcome.restored = True
+
+
+class PrefixRun:
+    """Restores or captures the login prefix for one test run.
+
+    ``before_step`` is asked before each step; it returns True for prefix
+    steps a restored session made unnecessary. ``after_step`` captures the
+    session once every prefix step passed and the login has completed.
+    """
+
+    def __init__(self, prefix, cache=None, login_wait=SESSION_LOGIN_WAIT):
+        self.prefix = prefix
+        self.cache = cache or get_session_cache()
+        self.login_wait = login_wait
+        self.restored = False
+        self.capturing = False
+        self.prefix_ok = True
+
+    def before_step(self, driver, step_num, log_debug):
+        if step_num == 1:
+            self._start(driver, log_debug)
+        return self.restored and step_num <= self.prefix.steps
+
+    def after_step(self, driver, step_num, success):
+        if not self.capturing or step_num > self.prefix.steps:
+            return
+        self.prefix_ok = self.prefix_ok and success
+        if step_num < self.prefix.steps and self.prefix_ok:
+            return
+        self.capturing = False
+        if not self.prefix_ok:
+            self.cache.abandon(self.prefix.key)
+            return
+        try:
+            if not wait_for_login(driver, self.prefix.login_url, self.login_wait):
+                logger.info(f"Login prefix did not leave {self.prefix.login_url} within "
+                            f"{self.login_wait}s; not capturing its session")
+                self.cache.abandon(self.prefix.key)
+                return
+            self.cache.store(self.prefix.key, capture_session(driver))
+        except Exception as e:
+            logger.warning(f"Failed to capture session after login prefix: {str(e)}")
+            self.cache.abandon(self.prefix.key)
+
+    def close(self):
+        if self.capturing:
+            self.capturing = False
+            self.cache.abandon(self.prefix.key)
+
+    def _start(self, driver, log_debug):
+        session, self.capturing = self.cache.acquire(self.prefix.key)
+        if session is None:
+            return
+        try:
+            self.restored = restore_session(driver, self.prefix, session)
+        except Exception as e:
+            logger.warning(f"Failed to restore cached session: {str(e)}")
+        if self.restored:
+            self.cache.record_restore()
+            log_debug(f"Restored session captured {time.monotonic() - session.captured_at:.0f}s ago; "
+                      f"skipping {self.prefix.steps} login steps")
+            return
+        # The session was rejected; log in again and capture a fresh one
+        log_debug("Cached session is no longer valid; replaying the login steps")
+        self.cache.invalidate(self.prefix.key)
+        try:
+            driver.execute_cdp_cmd("Network.clearBrowserCookies", {})
+        except Exception as e:
+            logger.warning(f"Failed to clear rejected session cookies: {str(e)}")
+        session, self.capturing = self.cache.acquire(self.prefix.key)
@@ -0,0 +1,75 @@
+import os
+import time
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Seconds a finished run's result is reused instead of running again (0 disables)
+RUN_FRESHNESS_WINDOW = float(os.environ.get("RUN_FRESHNESS_WINDOW", "0"))
+
+
+class _Call:
+    __slots__ = ("done", "value", "error", "finished_at")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+        self.finished_at = None
+
+
+class SingleFlight:
+    """Collapse concurrent calls with the same key into one execution.
+
+    Callers arriving while a call is running wait for it and share its
+    result. With a ``freshness_window``, callers arriving shortly after a
+    successful call finished get its result without a new execution.
+    """
+
+    def __init__(self, freshness_window=RUN_FRESHNESS_WINDOW):
+        self.freshness_window = freshness_window
+        self._calls = {}
+        self._recent = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, fn):
+        """Run ``fn`` for ``key`` or join the run in progress; returns (value, shared)"""
+        with self._lock:
+            recent = self._recent.get(key)
+            if recent is not None:
+                if time.monotonic() - recent.finished_at < self.freshness_window:
+                    return recent.value, True
+                del self._recent[key]
+
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.value, True
+
+        try:
+            call.value = fn()
+            return call.value, False
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            call.finished_at = time.monotonic()
+            with self._lock:
+                del self._calls[key]
+                if call.error is None and self.freshness_window > 0:
+                    self._recent[key] = call
+                self._prune()
+            call.done.set()
+
+    def _prune(self):
+        now = time.monotonic()
+        expired = [key for key, call in self._recent.items() if now - call.finished_at >= self.freshness_window]
+        for key in expired:
+            del self._recent[key]
@@ -0,0 +1,158 @@
+import os
+import time
+import math
+import atexit
+import logging
+import threading
+from file_utils import state_path, read_json, update_json
+from locator import LOCATOR_GRACE
+
+logger = logging.getLogger(__name__)
+
+# Element wait used until a step has enough recorded history
+DEFAULT_STEP_TIMEOUT = float(os.environ.get("DEFAULT_STEP_TIMEOUT", "10"))
+STEP_TIMEOUT_MARGIN = float(os.environ.get("STEP_TIMEOUT_MARGIN", "3.0"))
+STEP_TIMEOUT_FLOOR = float(os.environ.get("STEP_TIMEOUT_FLOOR", "2.0"))
+STEP_TIMEOUT_CEILING = float(os.environ.get("STEP_TIMEOUT_CEILING", "30.0"))
+# Passing runs needed before a step's history replaces the default timeout
+STEP_TIMEOUT_MIN_SAMPLES = int(os.environ.get("STEP_TIMEOUT_MIN_SAMPLES", "5"))
+# Most recent durations kept per step
+STEP_TIMING_WINDOW = 50
+# Minimum seconds between writes of the timings file
+TIMINGS_SAVE_INTERVAL = 5.0
+
+TIMINGS_FILE = "step_timings.json"
+
+
+def percentile(samples, fraction):
+    """Nearest-rank percentile of a non-empty list"""
+    ordered = sorted(samples)
+    rank = max(1, math.ceil(fraction * len(ordered)))
+    return ordered[rank - 1]
+
+
+def _step_key(test_id, step):
+    return f"{test_id}|{step}"
+
+
+class StepTimings:
+    """Persisted step durations, used to size each step's timeout and idle grace.
+
+    A step's timeout is p99 of its recent durations times ``margin``, kept
+    between ``floor`` and ``ceiling``. Failed runs are kept as samples too,
+    so a step's calibration survives a failure and a page that became
+    slower raises its own p99.
+
+    Worker processes share the file: a save merges this process's new
+    samples into the file's current contents under a lock.
+    """
+
+    def __init__(self, path=None, margin=STEP_TIMEOUT_MARGIN, floor=STEP_TIMEOUT_FLOOR,
+                 ceiling=STEP_TIMEOUT_CEILING, min_samples=STEP_TIMEOUT_MIN_SAMPLES):
+        self.path = path or state_path(TIMINGS_FILE)
+        self.margin = margin
+        self.floor = floor
+        self.ceiling = ceiling
+        self.min_samples = max(1, min_samples)
+        self._samples = read_json(self.path, default={}) or {}
+        # Changes since the last save, merged into the file on save
+        self._added = {}
+        self._dirty = False
+        self._saved_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def timeout_for(self, test_id, step, default=DEFAULT_STEP_TIMEOUT):
+        if test_id is None:
+            return default
+        with self._lock:
+            samples = list(self._samples.get(_step_key(test_id, step), ()))
+        if len(samples) < self.min_samples:
+            return default
+        timeout = percentile(samples, 0.99) * self.margin
+        return round(min(self.ceiling, max(self.floor, timeout)), 2)
+
+    def grace_for(self, test_id, step, floor=LOCATOR_GRACE):
+        """Seconds a step may wait on an idle page: p99 of its durations, at least ``floor``.
+
+        Steps without ``min_samples`` runs get ``floor``, so a broken selector
+        fails fast from its first run on.
+        """
+        if test_id is None:
+            return floor
+        with self._lock:
+            samples = list(self._samples.get(_step_key(test_id, step), ()))
+        if len(samples) < self.min_samples:
+            return floor
+        return round(max(floor, percentile(samples, 0.99)), 2)
+
+    def record(self, test_id, step, duration):
+        """Add a run's duration; failed runs count too, as the time the step was given"""
+        if test_id is None:
+            return
+        key = _step_key(test_id, step)
+        with self._lock:
+            samples = self._samples.setdefault(key, [])
+            samples.append(round(duration, 3))
+            del samples[:-STEP_TIMING_WINDOW]
+            self._added.setdefault(key, []).append(round(duration, 3))
+            self._dirty = True
+            due = time.monotonic() - self._saved_at >= TIMINGS_SAVE_INTERVAL
+        if due:
+            self.save()
+
+    def save(self):
+        with self._lock:
+            if not self._dirty:
+                return
+            added = self._added
+            self._added = {}
+            self._dirty = False
+            self._saved_at = time.monotonic()
+
+        def merge(stored):
+            stored = stored if isinstance(stored, dict) else {}
+            for key, samples in added.items():
+                merged = stored.setdefault(key, [])
+                merged.extend(samples)
+                del merged[:-STEP_TIMING_WINDOW]
+            return stored
+
+        try:
+            merged = update_json(self.path, merge, default={})
+        except OSError as e:
+            logger.warning(f"Failed to save step timings: {str(e)}")
+            with self._lock:
+                # Keep the samples for the next save
+                for key, samples in added.items():
+                    self._added[key] = samples + self._added.get(key, [])
+                self._dirty = True
+            return
+        with self._lock:
+            # Adopt other processes' samples, keeping what was recorded during the write
+            for key, samples in self._added.items():
+                merged.setdefault(key, []).extend(samples)
+                del merged[key][:-STEP_TIMING_WINDOW]
+            self._samples = merged
+
+
+_timings = None
+_timings_lock = threading.Lock()
+
+
+def get_step_timings():
+    global _timings
+    with _timings_lock:
+        if _timings is None:
+            _timings = StepTimings()
+            atexit.register(_timings.save)
+        return _timings
+
+
+def step_timeout(test_id, step, default=DEFAULT_STEP_TIMEOUT):
+    """Element wait for a step, calibrated from its recorded durations"""
+    return get_step_timings().timeout_for(test_id, step, default)
+
+
+def step_grace(test_id, step):
+    """Idle-page grace for a step's element lookup, calibrated from its recorded durations"""
+    return get_step_timings().grace_for(test_id, step)
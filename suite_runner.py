@@ -0,0 +1,103 @@
+import os
+import queue
+import logging
+import threading
+from functools import partial
+
+logger = logging.getLogger(__name__)
+
+# Rows fetched per Supabase page when iterating test cases
+PAGE_SIZE = int(os.environ.get("RUN_ALL_PAGE_SIZE", "50"))
+
+_DONE = object()
+
+
+def iter_pages(fetch_page, page_size=PAGE_SIZE):
+    """Iterate rows using keyset pagination on ``id``.
+
+    ``fetch_page(after_id, limit)`` returns up to ``limit`` rows ordered by
+    id, starting after ``after_id`` (None for the first page).
+    """
+    after_id = None
+    while True:
+        rows = fetch_page(after_id, page_size)
+        yield from rows
+        if len(rows) < page_size:
+            return
+        after_id = rows[-1]["id"]
+
+
+def _acquire(slots, cancel_event):
+    """Wait for a free slot; False if the run was cancelled meanwhile"""
+    while not cancel_event.is_set():
+        if slots.acquire(timeout=0.5):
+            if cancel_event.is_set():
+                slots.release()
+                return False
+            return True
+    return False
+
+
+def run_suite(testcases, run_one, executor, max_in_flight, cancel_event=None):
+    """Run test cases on ``executor`` and yield each result as it finishes.
+
+    ``testcases`` is consumed lazily by a feeder thread. At most
+    ``max_in_flight`` test cases are running or waiting to be consumed, so
+    memory stays bounded however many rows the source pages through. ``run_one`` results of None
+    (skipped runs) are not yielded. Closing the generator early sets
+    ``cancel_event`` so no further test cases are started.
+    """
+    cancel_event = cancel_event or threading.Event()
+    results = queue.Queue()
+    slots = threading.BoundedSemaphore(max(1, max_in_flight))
+
+    def on_done(testcase, future):
+        try:
+            result = future.result()
+        except Exception as e:
+            logger.error(f"Test case {testcase.get('id')} failed: {str(e)}")
+            result = {
+                "testcaseId": testcase.get("id"),
+                "success": False,
+                "error": str(e)
+            }
+        results.put(result)
+
+    def feed():
+        submitted = 0
+        error = None
+        try:
+            for testcase in testcases:
+                if not _acquire(slots, cancel_event):
+                    break
+                future = executor.submit(run_one, testcase)
+                submitted += 1
+                future.add_done_callback(partial(on_done, testcase))
+        except Exception as e:
+            logger.error(f"Failed to read test cases: {str(e)}")
+            error = e
+        finally:
+            results.put((_DONE, submitted, error))
+
+    threading.Thread(target=feed, name="suite-feeder", daemon=True).start()
+
+    received = 0
+    expected = None
+    feed_error = None
+    try:
+        while expected is None or received < expected:
+            item = results.get()
+            if isinstance(item, tuple) and item and item[0] is _DONE:
+                _, expected, feed_error = item
+                continue
+            # The slot frees up once the result is consumed, so unconsumed results stay bounded too
+            slots.release()
+            received += 1
+            if item is not None:
+                yield item
+    finally:
+        if expected is None or received < expected:
+            cancel_event.set()
+
+    if feed_error is not None:
+        raise feed_error
@@ -1,19 +1,57 @@
 import os
+import json
+import hashlib
 import logging
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
+from locator import locator_key, page_key
+from wait_strategies import WAIT_MODE, FIXED_SLEEPS, wait_bound
+from fast_actions import ACTION_MODE
+from file_utils import atomic_write_text
 import time
 logger = logging.getLogger(__name__)
 
+# Bump whenever the emitted code changes so cached files are regenerated
+GENERATOR_VERSION = "6"
+
 def escape_string(s: str) -> str:
     return s.replace('"', '\\"').replace("'", "\\'")
 
-def generate_testcase_file(testcase: dict, output_dir: str = "testcases") -> str:
+def settle_line(action_type: str, wait_mode: str, bound: float, element: bool = False) -> str:
+    """Code that waits for the page after an action of ``action_type``"""
+    if wait_mode == "fixed":
+        return f"            time.sleep({FIXED_SLEEPS.get(action_type, 1)})"
+    target = ", element" if element else ""
+    return f"            settle(driver, '{action_type}'{target}, timeout={bound})"
+
+def gated(step_index: int, description: str, page: str, body: list) -> list:
+    """Wrap a step's code so the run's failure policy can skip it"""
+    return [f"        if not skip_step({step_index}, '{description}', '{escape_string(page)}'):"] + \
+        ["    " + line for line in body]
+
+def testcase_digest(actions: list, wait_mode: str, action_mode: str, test_id=None) -> str:
+    """Content hash of the normalized actions and every input that shapes the emitted code"""
+    normalized = json.dumps({
+        "generator": GENERATOR_VERSION,
+        "testId": test_id,
+        "waitMode": wait_mode,
+        "actionMode": action_mode,
+        "actions": actions
+    }, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(normalized.encode('utf-8')).hexdigest()
+
+def generate_testcase_file(testcase: dict, output_dir: str = "testcases", wait_mode: str = WAIT_MODE,
+                           action_mode: str = ACTION_MODE) -> str:
     try:
         os.makedirs(output_dir, exist_ok=True)
         test_name = testcase.get('name', 'testcase').lower().replace(' ', '_')
         actions = testcase.get('actions', [])
+        test_id = testcase.get('id')
+
+        # Files are content-addressed: unchanged actions reuse the existing file
+        digest = testcase_digest(actions, wait_mode, action_mode, test_id)
+        file_name = os.path.join(output_dir, f"test_{test_name}_{digest[:16]}.py")
+        if os.path.isfile(file_name):
+            logger.debug(f"Reusing generated test case file: {file_name}")
+            return file_name
 
         # Find the login page URL from change or click actions
         login_url = None
@@ -24,35 +62,49 @@ def generate_testcase_file(testcase: dict, output_dir: str = "testcases") -> str
 
         file_content = [
             f"# Selenium Test: {test_name}",
-            "from selenium.webdriver.common.by import By",
-            "from selenium.webdriver.support.ui import WebDriverWait",
-            "from selenium.webdriver.support import expected_conditions as EC",
+            "from locator import locate, recorded_strategies",
             "import time",
+        ]
+        if test_id is not None:
+            file_content.append("from step_timings import step_grace, step_timeout")
+        if wait_mode != "fixed":
+            file_content.append("from wait_strategies import install_network_tracker, settle")
+        if action_mode == "fast":
+            file_content.append("from fast_actions import fast_change, fast_click")
+        file_content.extend([
             "",
-            "def run_test(driver, log_debug, print_step_result):",
-            "    wait = WebDriverWait(driver, 10)",
-            "    driver.implicitly_wait(5)",
+            "def run_test(driver, log_debug, print_step_result, skip_step):",
+            "    driver.implicitly_wait(0)",
             "    driver.maximize_window()",
+        ])
+        if wait_mode != "fixed":
+            file_content.append("    install_network_tracker(driver)")
+        file_content.extend([
             "",
             "    try:"
-        ]
+        ])
 
         step_index = 1
+        # Page context of the current step, used by skip-dependent failure handling
+        page = ""
 
         # Add initial navigation to login page if found
         if login_url:
+            page = page_key(login_url)
             login_url = escape_string(login_url)
             file_content.extend([
                 f"        # Step {step_index}: Navigate to login page",
                 f"        log_debug('Navigate to login page')",
+            ])
+            file_content.extend(gated(step_index, 'Navigate to login page', page, [
                 "        try:",
                 f"            driver.get('{login_url}')",
-                "            time.sleep(3)",
+                settle_line('navigate', wait_mode, wait_bound('navigate')),
                 f"            print_step_result({step_index}, 'Navigate to login page', True)",
                 "        except Exception as e:",
                 f"            print_step_result({step_index}, 'Navigate to login page', False, str(e))",
-                ""
-            ])
+            ]))
+            file_content.append("")
             step_index += 1
 
         # Process non-navigate actions
@@ -67,53 +119,54 @@ def generate_testcase_file(testcase: dict, output_dir: str = "testcases") -> str
             value = escape_string(str(action.get('value', '')))
             scroll_x = action.get('scrollX', 0)
             scroll_y = action.get('scrollY', 0)
+            bound = wait_bound(action_type, action)
+            page = page_key(action.get('url')) or page
+            # Keys the learned locator ranking for this step
+            key = "None"
+            if test_id is not None:
+                key = f"'{escape_string(locator_key(test_id, step_index, action.get('url', '')))}'"
+            # Element wait calibrated from this step's recorded durations at run time
+            timeout = f"step_timeout({test_id!r}, {step_index})" if test_id is not None else "10"
+            # Idle-page grace from the same history; without it lookups use the default grace
+            grace = f", grace=step_grace({test_id!r}, {step_index})" if test_id is not None else ""
 
             file_content.append(f"        # Step {step_index}: {description}")
             file_content.append(f"        log_debug('{description}')")
+            body_start = len(file_content)
 
-            if action_type == 'change' and (css_selector or xpath) and value is not None:
-                file_content.extend(["        try:"])
-                if css_selector:
-                    file_content.extend([
-                        f"            element = wait.until(EC.presence_of_element_located((By.CSS_SELECTOR, '{css_selector}')))",
-                        "            driver.execute_script(\"arguments[0].scrollIntoView({behavior: 'smooth', block: 'center'});\", element)",
-                        "            time.sleep(1)",
-                        "            element.clear()",
-                        f"            element.send_keys('{value}')",
-                        f"            print_step_result({step_index}, '{description}', True)",
-                    ])
-                elif xpath:
-                    file_content.extend([
-                        f"            element = wait.until(EC.presence_of_element_located((By.XPATH, '{xpath}')))",
-                        "            driver.execute_script(\"arguments[0].scrollIntoView({behavior: 'smooth', block: 'center'});\", element)",
-                        "            time.sleep(1)",
-                        "            element.clear()",
-                        f"            element.send_keys('{value}')",
-                        f"            print_step_result({step_index}, '{description}', True)",
-                    ])
+            if action_mode == 'fast' and action_type in ['change', 'click'] and (css_selector or xpath):
+                if action_type == 'change':
+                    native_keys = ", native_keys=True" if action.get('requiresKeyEvents') else ""
+                    call = f"fast_change(driver, '{css_selector}', '{xpath}', '{value}', timeout={timeout}{native_keys}, key={key}{grace})"
+                else:
+                    call = f"fast_click(driver, '{css_selector}', '{xpath}', timeout={timeout}, key={key}{grace})"
+                file_content.extend([
+                    "        try:",
+                    f"            {call}",
+                    f"            print_step_result({step_index}, '{description}', True)",
+                    "        except Exception as e:",
+                    f"            print_step_result({step_index}, '{description}', False, str(e))"
+                ])
+            elif action_type == 'change' and (css_selector or xpath) and value is not None:
                 file_content.extend([
+                    "        try:",
+                    f"            element = locate(driver, recorded_strategies('{css_selector}', '{xpath}'), timeout={timeout}, condition='present', key={key}{grace})",
+                    "            driver.execute_script(\"arguments[0].scrollIntoView({behavior: 'smooth', block: 'center'});\", element)",
+                    settle_line('change', wait_mode, bound, element=True),
+                    "            element.clear()",
+                    f"            element.send_keys('{value}')",
+                    f"            print_step_result({step_index}, '{description}', True)",
                     "        except Exception as e:",
                     f"            print_step_result({step_index}, '{description}', False, str(e))"
                 ])
             elif action_type == 'click' and (css_selector or xpath):
-                file_content.extend(["        try:"])
-                if css_selector:
-                    file_content.extend([
-                        f"            element = wait.until(EC.element_to_be_clickable((By.CSS_SELECTOR, '{css_selector}')))",
-                        "            driver.execute_script(\"arguments[0].scrollIntoView({behavior: 'smooth', block: 'center'});\", element)",
-                        "            time.sleep(1)",
-                        "            element.click()",
-                        f"            print_step_result({step_index}, '{description}', True)",
-                    ])
-                elif xpath:
-                    file_content.extend([
-                        f"            element = wait.until(EC.element_to_be_clickable((By.XPATH, '{xpath}')))",
-                        "            driver.execute_script(\"arguments[0].scrollIntoView({behavior: 'smooth', block: 'center'});\", element)",
-                        "            time.sleep(1)",
-                        "            element.click()",
-                        f"            print_step_result({step_index}, '{description}', True)",
-                    ])
                 file_content.extend([
+                    "        try:",
+                    f"            element = locate(driver, recorded_strategies('{css_selector}', '{xpath}'), timeout={timeout}, condition='clickable', key={key}{grace})",
+                    "            driver.execute_script(\"arguments[0].scrollIntoView({behavior: 'smooth', block: 'center'});\", element)",
+                    settle_line('click', wait_mode, bound, element=True),
+                    "            element.click()",
+                    f"            print_step_result({step_index}, '{description}', True)",
                     "        except Exception as e:",
                     f"            print_step_result({step_index}, '{description}', False, str(e))"
                 ])
@@ -121,7 +174,7 @@ def generate_testcase_file(testcase: dict, output_dir: str = "testcases") -> str
                 file_content.extend([
                     "        try:",
                     f"            driver.execute_script(f\"window.scrollTo({scroll_x}, {scroll_y})\")",
-                    "            time.sleep(1)",
+                    settle_line('scroll', wait_mode, bound),
                     f"            print_step_result({step_index}, '{description}', True)",
                     "        except Exception as e:",
                     f"            print_step_result({step_index}, '{description}', False, str(e))"
@@ -134,6 +187,8 @@ def generate_testcase_file(testcase: dict, output_dir: str = "testcases") -> str
                     "        except Exception as e:",
                     f"            print_step_result({step_index}, '{description}', False, str(e))"
                 ])
+            if action_type == 'scroll' or (action_type in ['change', 'click'] and (css_selector or xpath)):
+                file_content[body_start:] = gated(step_index, description, page, file_content[body_start:])
             file_content.append("")
             step_index += 1
 
@@ -144,9 +199,8 @@ def generate_testcase_file(testcase: dict, output_dir: str = "testcases") -> str
             "        raise"
         ])
 
-        file_name = os.path.join(output_dir, f"test_{test_name}.py")
-        with open(file_name, 'w', encoding='utf-8') as f:
-            f.write('\n'.join(file_content))
+        # Atomic so concurrent runs never load a half-written file
+        atomic_write_text(file_name, '\n'.join(file_content))
 
         logger.info(f"Generated test case file: {file_name}")
         return file_name
@@ -5,13 +5,13 @@ from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.common.action_chains import ActionChains
-from webdriver_manager.chrome import ChromeDriverManager
+from driver_provisioning import get_chromedriver_path
 import time
 import os
 
-# Set up ChromeDriver using webdriver_manager
+# Set up ChromeDriver from the provisioned manifest
 options = webdriver.ChromeOptions()
-service = Service(ChromeDriverManager().install())
+service = Service(get_chromedriver_path())
 driver = webdriver.Chrome(service=service, options=options)
 wait = WebDriverWait(driver, 10)
 driver.implicitly_wait(5)
@@ -0,0 +1,119 @@
+import json
+import pytest
+from driver_pool import DriverPool, reset_driver
+
+
+def request_entry(url, document_url, resource_type):
+    return {"message": json.dumps({"message": {"method": "Network.requestWillBeSent", "params": {
+        "documentURL": document_url, "type": resource_type, "request": {"url": url}
+    }}})}
+
+
+class FakeDriver:
+    def __init__(self, log=(), current_url="chrome-error://chromewebdata/", log_available=True):
+        self.log = list(log)
+        self.current_url = current_url
+        self.log_available = log_available
+        self.window_handles = ["main"]
+        self.switch_to = self
+        self.cleared = []
+        self.quit_called = False
+
+    def window(self, handle):
+        pass
+
+    def get_log(self, log_type):
+        if not self.log_available:
+            raise RuntimeError("performance log not enabled")
+        entries, self.log = self.log, []
+        return entries
+
+    def execute_script(self, script):
+        return None
+
+    def execute_cdp_cmd(self, cmd, params):
+        if cmd == "Storage.clearDataForOrigin":
+            self.cleared.append(params["origin"])
+        return {}
+
+    def get(self, url):
+        self.current_url = url
+
+    def implicitly_wait(self, seconds):
+        pass
+
+    def set_script_timeout(self, seconds):
+        pass
+
+    def quit(self):
+        self.quit_called = True
+
+
+def test_reset_clears_every_visited_origin():
+    driver = FakeDriver([
+        request_entry("https://app.example.com/", "https://app.example.com/", "Document"),
+        request_entry("https://api.example.com/me", "https://app.example.com/", "Fetch"),
+        request_entry("https://sso.example.org/login", "https://sso.example.org/login", "Document")
+    ])
+    reset_driver(driver)
+
+    assert driver.cleared == ["https://app.example.com", "https://sso.example.org"]
+    # The next lease starts from an empty record
+    reset_driver(driver)
+    assert driver.cleared[2:] == []
+
+
+def test_reset_fails_without_the_performance_log():
+    with pytest.raises(RuntimeError):
+        reset_driver(FakeDriver(log_available=False))
+
+
+def test_session_with_unknown_origins_is_recycled():
+    pool = DriverPool(size=1, driver_factory=lambda page_load_strategy: FakeDriver(log_available=False))
+    session = pool.acquire()
+    pool.release(session)
+
+    assert session.driver.quit_called
+    pool.close()
+
+
+def test_sessions_are_kept_up_to_the_peak_lease_count():
+    launched = []
+
+    def factory(page_load_strategy):
+        launched.append(FakeDriver())
+        return launched[-1]
+
+    pool = DriverPool(size=1, driver_factory=factory)
+    sessions = [pool.acquire() for _ in range(3)]
+    for session in sessions:
+        pool.release(session)
+    assert pool.stats()["idle"] == 3
+
+    # A second suite of the same width launches nothing new
+    again = [pool.acquire() for _ in range(3)]
+    assert len(launched) == 3
+    for session in again:
+        pool.release(session)
+    pool.close()
+
+
+def test_leases_reuse_only_sessions_with_their_page_load_strategy():
+    launched = []
+
+    def factory(page_load_strategy):
+        launched.append(page_load_strategy)
+        return FakeDriver()
+
+    pool = DriverPool(size=0, driver_factory=factory)
+    eager, normal = pool.acquire("eager"), pool.acquire("normal")
+    pool.release(eager)
+    pool.release(normal)
+    assert launched == ["eager", "normal"]
+
+    # Most recently released first, but never a session of the other strategy
+    assert pool.acquire("eager") is eager
+    assert pool.acquire("normal") is normal
+    assert pool.acquire("normal") is not normal
+    assert launched == ["eager", "normal", "normal"]
+    pool.close()
\ No newline at end of file
@@ -0,0 +1,46 @@
+import json
+import time
+import pytest
+from selenium.common.exceptions import NoSuchElementException
+import locator
+from locator import LocatorRanking, locate
+from step_timings import StepTimings
+
+
+def test_wins_from_two_processes_are_added(tmp_path):
+    path = str(tmp_path / "ranking.json")
+    first = LocatorRanking(path=path)
+    second = LocatorRanking(path=path)
+
+    first.record("t|1|/login", "css selector")
+    second.record("t|1|/login", "css selector")
+    second.record("t|1|/login", "xpath")
+    first.save()
+    second.save()
+
+    with open(path, encoding='utf-8') as f:
+        stored = json.load(f)
+    assert stored["t|1|/login"] == {"css selector": 2, "xpath": 1}
+    assert second.order("t|1|/login", [("xpath", "//a"), ("css selector", "a")])[0][0] == "css selector"
+
+
+class IdlePageDriver:
+    """A loaded, idle page on which no selector matches"""
+
+    def find_elements(self, by, value):
+        return []
+
+    def execute_script(self, script):
+        return True
+
+
+def test_dead_selector_fails_fast_on_every_run(tmp_path, monkeypatch):
+    monkeypatch.setattr(locator, "LOCATOR_POLL_INTERVAL", 0.01)
+    timings = StepTimings(path=str(tmp_path / "timings.json"))
+    for _ in range(3):
+        started = time.monotonic()
+        with pytest.raises(NoSuchElementException):
+            locate(IdlePageDriver(), [("css selector", "#dead")], timeout=10, grace=timings.grace_for("t", 1))
+        elapsed = time.monotonic() - started
+        assert elapsed < 2
+        timings.record("t", 1, elapsed)
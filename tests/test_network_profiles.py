@@ -0,0 +1,53 @@
+import re
+import pytest
+from network_profiles import PAGE_LOAD_STRATEGY, PROFILES
+
+NEVER_BLOCKED = [
+    "https://www.wave.com/login",
+    "https://www.webmd.com/",
+    "https://www.movavi.com/",
+    "https://www.icons8.com/app",
+    "https://app.example.com/api/search?q=foo.mp3&page=2",
+    "https://app.example.com/download?file=clip.mov&inline=1",
+    "https://app.example.com/docs/fonts.woff-guide",
+    "https://example.com/?ref=hotjar.com",
+    "https://nothotjar.com/",
+    "https://app.example.com/main.js",
+    "https://app.example.com/styles.css?v=3",
+]
+
+
+def url_blocked(url, patterns):
+    """Whether Chrome blocks ``url`` for ``patterns``: ``*`` matches any run of characters, all else is literal"""
+    return any(re.fullmatch(".*".join(re.escape(part) for part in pattern.split("*")), url, re.DOTALL)
+               for pattern in patterns)
+
+
+@pytest.mark.parametrize("profile", ["lean", "minimal"])
+@pytest.mark.parametrize("url", NEVER_BLOCKED)
+def test_pages_and_lookalike_urls_load(profile, url):
+    assert not url_blocked(url, PROFILES[profile].blocked_patterns())
+
+
+@pytest.mark.parametrize("url", [
+    "https://cdn.example.com/fonts/inter.woff2",
+    "https://cdn.example.com/fonts/inter.woff?v=4",
+    "https://cdn.example.com/intro.mp4",
+    "https://www.google-analytics.com/analytics.js",
+    "https://static.hotjar.com/c/hotjar-1.js?sv=6",
+    "https://connect.facebook.net/en_US/fbevents.js",
+])
+def test_lean_blocks_fonts_media_and_trackers(url):
+    assert url_blocked(url, PROFILES["lean"].blocked_patterns())
+
+
+def test_images_only_blocked_by_minimal():
+    url = "https://cdn.example.com/img/hero.png?w=800"
+    assert not url_blocked(url, PROFILES["lean"].blocked_patterns())
+    assert url_blocked(url, PROFILES["minimal"].blocked_patterns())
+    assert PROFILES["full"].blocked_patterns() == []
+
+
+def test_full_profile_waits_for_the_load_event():
+    assert PROFILES["full"].page_load_strategy == "normal"
+    assert PROFILES["lean"].page_load_strategy == PAGE_LOAD_STRATEGY
\ No newline at end of file
@@ -0,0 +1,45 @@
+import os
+import subprocess
+import sys
+import pytest
+import profile_template
+from profile_template import CLONE_PREFIX, ProfileTemplate
+
+
+def dead_pid():
+    process = subprocess.Popen([sys.executable, "-c", "pass"])
+    process.wait()
+    return process.pid
+
+
+def test_sweep_deletes_only_clones_of_dead_processes(tmp_path):
+    clone_root = tmp_path / "clones"
+    dead = clone_root / f"{CLONE_PREFIX}{dead_pid()}-abc"
+    live = clone_root / f"{CLONE_PREFIX}{os.getpid()}-def"
+    other = clone_root / "unrelated"
+    for path in (dead, live, other):
+        path.mkdir(parents=True)
+
+    template = ProfileTemplate(root=str(tmp_path / "template"), clone_root=str(clone_root), sweep_interval=0)
+    template.sweep()
+
+    assert not dead.exists()
+    assert live.exists() and other.exists()
+    assert template.stats()["swept"] == 1
+
+
+def test_refresh_hands_builds_to_the_builder(tmp_path, monkeypatch):
+    monkeypatch.setattr(profile_template, "asset_hash", lambda urls: "hash")
+    built = []
+    template = ProfileTemplate(root=str(tmp_path / "template"), clone_root=str(tmp_path / "clones"),
+                               warm_urls=["https://app.example.com/"], builder=built.append)
+    monkeypatch.setattr(template, "build", lambda urls, force=True: pytest.fail("built in this process"))
+    template._refresh()
+
+    assert built == [["https://app.example.com/"]]
+
+
+def test_peek_does_not_create_the_template(monkeypatch):
+    monkeypatch.setattr(profile_template, "_template", None)
+    assert profile_template.peek_profile_template() is None
+    assert profile_template._template is None
\ No newline at end of file
@@ -0,0 +1,139 @@
+import os
+import sys
+import json
+import time
+import subprocess
+import pytest
+from result_writer import ResultWriter
+
+
+class FlakyStore:
+    """Stores rows by id; rows whose id is in ``bad`` always fail"""
+
+    def __init__(self, bad=(), down=False):
+        self.bad = set(bad)
+        self.down = down
+        self.rows = {}
+
+    def __call__(self, row):
+        if self.down:
+            raise ConnectionError("store unreachable")
+        if row["id"] in self.bad:
+            raise ValueError(f"null value in column violates not-null constraint for {row['id']}")
+        self.rows[row["id"]] = row["response"]
+
+
+@pytest.fixture
+def paths(tmp_path):
+    return {"spool_path": str(tmp_path / "spool.jsonl"), "dead_letter_path": str(tmp_path / "dead.jsonl")}
+
+
+def read_lines(path):
+    try:
+        with open(path, encoding='utf-8') as f:
+            return [json.loads(line) for line in f if line.strip()]
+    except FileNotFoundError:
+        return []
+
+
+def test_failing_row_does_not_block_the_batch(paths):
+    store = FlakyStore(bad={2})
+    writer = ResultWriter(store, max_retries=3, retry_backoff=0, **paths)
+    for testcase_id in (1, 2, 3):
+        writer.submit({"id": testcase_id}, {"status": testcase_id})
+
+    assert writer.flush() is False
+    assert store.rows == {1: {"status": 1}, 3: {"status": 3}}
+    assert [entry["id"] for entry in read_lines(paths["spool_path"])] == [2]
+
+    # Still failing while other rows get through: dead-lettered after max_retries
+    writer.submit({"id": 4}, {"status": 4})
+    writer.flush()
+    writer.submit({"id": 5}, {"status": 5})
+    assert writer.flush() is True
+
+    dead = read_lines(paths["dead_letter_path"])
+    assert [entry["id"] for entry in dead] == [2]
+    assert "not-null" in dead[0]["error"]
+    assert read_lines(paths["spool_path"]) == []
+    assert set(store.rows) == {1, 3, 4, 5}
+    assert writer.stats()["deadLetters"] == 1
+
+
+def test_outage_keeps_every_row_without_dead_lettering(paths):
+    store = FlakyStore(down=True)
+    writer = ResultWriter(store, max_retries=1, retry_backoff=0, **paths)
+    writer.submit({"id": 1}, {"status": 1})
+    writer.submit({"id": 2}, {"status": 2})
+
+    for _ in range(3):
+        assert writer.flush(force=True) is False
+    assert read_lines(paths["dead_letter_path"]) == []
+    assert writer.stats()["outage"] is True
+
+    store.down = False
+    assert writer.flush(force=True) is True
+    assert set(store.rows) == {1, 2}
+
+
+def test_newer_result_resets_failures(paths):
+    store = FlakyStore(bad={1})
+    writer = ResultWriter(store, max_retries=2, retry_backoff=0, **paths)
+    writer.submit({"id": 1}, {"status": "old"})
+    writer.submit({"id": 2}, {"status": 2})
+    writer.flush()
+
+    store.bad.clear()
+    writer.submit({"id": 1}, {"status": "new"})
+    assert writer.flush() is True
+    assert store.rows[1] == {"status": "new"}
+    assert read_lines(paths["dead_letter_path"]) == []
+
+
+def dead_pid():
+    process = subprocess.Popen([sys.executable, "-c", "pass"])
+    process.wait()
+    return process.pid
+
+
+def test_processes_sharing_a_state_dir_keep_their_own_spools(tmp_path):
+    store = FlakyStore(bad={1, 2})
+    first = ResultWriter(store, retry_backoff=0, spool_path=str(tmp_path / "result_spool-101.jsonl"),
+                         dead_letter_path=str(tmp_path / "dead.jsonl"))
+    second = ResultWriter(store, retry_backoff=0, spool_path=str(tmp_path / "result_spool-102.jsonl"),
+                          dead_letter_path=str(tmp_path / "dead.jsonl"))
+    first.submit({"id": 1}, {"status": 1})
+    second.submit({"id": 2}, {"status": 2})
+    second.submit({"id": 3}, {"status": 3})
+    second.flush()
+
+    assert [entry["id"] for entry in read_lines(str(tmp_path / "result_spool-101.jsonl"))] == [1]
+    assert [entry["id"] for entry in read_lines(str(tmp_path / "result_spool-102.jsonl"))] == [2]
+
+
+def test_spools_of_dead_processes_are_replayed(tmp_path):
+    orphan = tmp_path / f"result_spool-{dead_pid()}.jsonl"
+    orphan.write_text(json.dumps({"id": 7, "response": {"status": "orphaned"}}) + "\n", encoding='utf-8')
+    legacy = tmp_path / "result_spool.jsonl"
+    legacy.write_text(json.dumps({"id": 8, "response": {"status": "legacy"}}) + "\n", encoding='utf-8')
+
+    store = FlakyStore()
+    writer = ResultWriter(store, spool_path=str(tmp_path / f"result_spool-{os.getpid()}.jsonl"),
+                          dead_letter_path=str(tmp_path / "dead.jsonl"))
+    writer.start()
+    writer.close()
+
+    assert store.rows == {7: {"status": "orphaned"}, 8: {"status": "legacy"}}
+    assert not orphan.exists() and not legacy.exists()
+
+
+def test_rows_of_a_batch_are_written_concurrently(paths):
+    def slow_store(row):
+        time.sleep(0.2)
+
+    writer = ResultWriter(slow_store, concurrency=8, **paths)
+    for testcase_id in range(8):
+        writer.submit({"id": testcase_id}, {})
+    started = time.monotonic()
+    assert writer.flush() is True
+    assert time.monotonic() - started < 1
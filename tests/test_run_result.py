@@ -0,0 +1,19 @@
+from run_result import RunResult, StepResult
+
+
+def test_restored_steps_are_neither_passed_nor_failed():
+    result = RunResult("1", "Login then search")
+    result.add_step(StepResult(1, "Navigate to login page", "RESTORED", []))
+    result.add_step(StepResult(2, "Type the user name", "RESTORED", []))
+    result.add_step(StepResult(3, "Search", "PASSED", []))
+    result.add_step(StepResult(4, "Open the result", "FAILED", [], "not found"))
+    result.finalize()
+
+    summary = result.summary
+    assert (summary.passed, summary.failed, summary.restored) == (1, 1, 2)
+    assert summary.success_rate == 50
+    assert summary.status == "FAILED"
+
+    restored = RunResult.from_dict(result.to_dict())
+    assert restored.summary.restored == 2
+    assert [step.status for step in restored.steps][:2] == ["RESTORED", "RESTORED"]
@@ -0,0 +1,56 @@
+import session_cache
+from session_cache import PrefixRun, SessionCache, SessionPrefix
+
+
+class LoginDriver:
+    """Stays on the login page for ``redirect_after`` URL reads, like a fetch login awaiting its response"""
+
+    def __init__(self, redirect_after):
+        self.reads = 0
+        self.redirect_after = redirect_after
+        self.captured_url = None
+
+    @property
+    def current_url(self):
+        self.reads += 1
+        if self.redirect_after is not None and self.reads > self.redirect_after:
+            return "https://app.example.com/dashboard"
+        return "https://app.example.com/login"
+
+    def execute_cdp_cmd(self, cmd, params):
+        self.captured_url = self.current_url
+        return {"cookies": [{"name": "sid", "value": "1", "domain": "app.example.com"}]}
+
+    def execute_script(self, script):
+        return {"origin": "https://app.example.com", "local": {"token": "t"}, "session": {}}
+
+
+PREFIX = SessionPrefix("key", 3, "https://app.example.com/login", "https://app.example.com/dashboard")
+
+
+def run_prefix(driver, cache, login_wait=5):
+    run = PrefixRun(PREFIX, cache, login_wait=login_wait)
+    run.before_step(driver, 1, lambda message: None)
+    for step in range(1, PREFIX.steps + 1):
+        run.after_step(driver, step, True)
+
+
+def test_session_is_captured_after_leaving_the_login_page(monkeypatch):
+    monkeypatch.setattr(session_cache, "settle", lambda driver, action_type: True)
+    monkeypatch.setattr(session_cache, "LOGIN_POLL_INTERVAL", 0)
+    cache = SessionCache()
+    driver = LoginDriver(redirect_after=5)
+    run_prefix(driver, cache)
+
+    assert cache.stats()["captured"] == 1
+    assert driver.captured_url == "https://app.example.com/dashboard"
+
+
+def test_login_that_never_completes_is_not_captured(monkeypatch):
+    monkeypatch.setattr(session_cache, "settle", lambda driver, action_type: True)
+    monkeypatch.setattr(session_cache, "LOGIN_POLL_INTERVAL", 0)
+    cache = SessionCache()
+    run_prefix(LoginDriver(redirect_after=None), cache, login_wait=0.05)
+
+    assert cache.stats()["captured"] == 0
+    assert cache.stats()["capturing"] == 0
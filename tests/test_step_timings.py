@@ -0,0 +1,45 @@
+import json
+from step_timings import StepTimings
+
+
+def test_saves_from_two_processes_are_merged(tmp_path):
+    path = str(tmp_path / "timings.json")
+    first = StepTimings(path=path)
+    second = StepTimings(path=path)
+
+    first.record("a", 1, 0.5)
+    second.record("b", 1, 0.7)
+    second.record("a", 1, 0.6)
+    first.save()
+    second.save()
+
+    with open(path, encoding='utf-8') as f:
+        stored = json.load(f)
+    assert sorted(stored["a|1"]) == [0.5, 0.6]
+    assert stored["b|1"] == [0.7]
+
+
+def test_failed_runs_are_kept_as_samples(tmp_path):
+    path = str(tmp_path / "timings.json")
+    timings = StepTimings(path=path, min_samples=2)
+    timings.record("a", 1, 0.5)
+    timings.record("a", 1, 4.0)
+    timings.save()
+
+    assert timings.grace_for("a", 1, floor=0.5) == 4.0
+    with open(path, encoding='utf-8') as f:
+        assert json.load(f)["a|1"] == [0.5, 4.0]
+
+
+def test_grace_follows_the_step_history(tmp_path):
+    timings = StepTimings(path=str(tmp_path / "timings.json"), min_samples=3)
+    # A step without history still fails fast on an idle page
+    assert timings.grace_for("a", 1, floor=0.5) == 0.5
+
+    for duration in (1.2, 2.5, 1.8):
+        timings.record("a", 1, duration)
+    assert timings.grace_for("a", 1, floor=0.5) == 2.5
+
+    for _ in range(3):
+        timings.record("b", 1, 0.1)
+    assert timings.grace_for("b", 1, floor=0.5) == 0.5
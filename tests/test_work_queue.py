@@ -0,0 +1,97 @@
+import pytest
+from distributed import Coordinator
+from work_queue import DONE, FAILED, SQLiteWorkQueue, WorkQueue
+
+
+@pytest.fixture
+def queue(tmp_path):
+    return SQLiteWorkQueue(str(tmp_path / "queue.sqlite3"), max_attempts=2)
+
+
+def test_work_queue_is_abstract():
+    with pytest.raises(TypeError):
+        WorkQueue()
+
+
+def test_items_are_leased_oldest_first_and_once(queue):
+    first = queue.enqueue({"n": 1})
+    second = queue.enqueue({"n": 2})
+
+    item = queue.claim("w1")
+    assert (item.id, item.payload, item.attempts) == (first, {"n": 1}, 1)
+    assert queue.claim("w2").id == second
+    assert queue.claim("w3") is None
+    assert queue.stats()["leased"] == 2
+
+
+def test_heartbeat_and_complete_need_the_lease(queue):
+    item_id = queue.enqueue({})
+    queue.claim("w1")
+
+    assert queue.heartbeat(item_id, "w1")
+    assert not queue.heartbeat(item_id, "w2")
+    assert not queue.complete(item_id, "w2", {"ok": False})
+    assert queue.complete(item_id, "w1", {"ok": True})
+
+    [finished] = queue.finished([item_id])
+    assert (finished.status, finished.result) == (DONE, {"ok": True})
+    queue.acknowledge([item_id])
+    assert queue.finished([item_id]) == []
+
+
+def test_expired_leases_are_requeued_until_max_attempts(queue):
+    item_id = queue.enqueue({})
+
+    queue.claim("w1", lease_seconds=-1)
+    assert queue.requeue_expired() == 1
+    assert queue.stats()["queued"] == 1
+    # The old holder's result no longer counts
+    assert not queue.complete(item_id, "w1", {})
+
+    item = queue.claim("w2", lease_seconds=-1)
+    assert item.attempts == 2
+    queue.requeue_expired()
+    [finished] = queue.finished([item_id])
+    assert (finished.status, finished.error) == (FAILED, "Worker lease expired")
+
+
+def test_released_items_are_retried_then_failed(queue):
+    item_id = queue.enqueue({})
+
+    queue.claim("w1")
+    queue.release(item_id, "w1", "browser crashed")
+    assert queue.claim("w1").attempts == 2
+    queue.release(item_id, "w1", "browser crashed again")
+
+    [finished] = queue.finished([item_id])
+    assert (finished.status, finished.error) == (FAILED, "browser crashed again")
+
+
+def test_cancel_drops_leased_items(queue):
+    item_id = queue.enqueue({})
+    queue.claim("w1")
+    queue.cancel([item_id])
+
+    assert not queue.heartbeat(item_id, "w1")
+    assert not queue.complete(item_id, "w1", {"ok": True})
+    assert queue.finished([item_id]) == []
+    assert queue.stats()["leased"] == 0
+
+
+def test_coordinator_timeout_removes_the_claimed_item(queue):
+    coordinator = Coordinator(queue=queue, result_timeout=0.05)
+    claimed = []
+    original_enqueue = queue.enqueue
+
+    def enqueue_and_claim(payload):
+        item_id = original_enqueue(payload)
+        claimed.append(queue.claim("slow-worker"))
+        return item_id
+
+    queue.enqueue = enqueue_and_claim
+    result = coordinator.run({"id": 1, "actions": []}, "1", "Test", "interpreter")
+
+    assert result.summary.status == "ERROR"
+    # The late result is rejected instead of sitting in the queue unacknowledged
+    assert not queue.complete(claimed[0].id, "slow-worker", {"ok": True})
+    assert queue.stats()["done"] == 0
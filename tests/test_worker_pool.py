@@ -0,0 +1,96 @@
+import pickle
+from session_cache import CapturedSession, SessionCache, SessionHandoff, SessionOutcome, SessionPrefix
+from worker_pool import ProcessWorkerPool, WorkerTask
+
+PREFIX = SessionPrefix("login", 3, "https://app.example.com/login", "https://app.example.com/home")
+
+
+def captured():
+    return CapturedSession([{"name": "sid", "value": "1"}], "https://app.example.com", {"token": "t"})
+
+
+def test_sessions_captured_by_one_worker_are_handed_to_the_next():
+    cache = SessionCache()
+    pool = ProcessWorkerPool(size=2, session_cache=cache)
+    sent = []
+
+    def fake_run(task, on_event, on_session):
+        # The task crosses the process boundary by pickle
+        task = pickle.loads(pickle.dumps(task))
+        sent.append(task)
+        handoff = SessionHandoff(task.session, task.capture_session)
+        session, capture = handoff.acquire(task.session_prefix.key)
+        if capture:
+            handoff.store(task.session_prefix.key, captured())
+        else:
+            handoff.record_restore()
+        on_session(pickle.loads(pickle.dumps(handoff.outcome)))
+        return "result"
+
+    pool._run = fake_run
+    task = WorkerTask("plan", [], "1", "Test", session_prefix=PREFIX)
+    assert pool.run(task) == "result"
+    assert pool.run(task) == "result"
+
+    assert (sent[0].session, sent[0].capture_session) == (None, True)
+    assert sent[1].session.local_storage == {"token": "t"} and not sent[1].capture_session
+    assert cache.stats()["captured"] == 1 and cache.stats()["restored"] == 1
+    assert cache.stats()["capturing"] == 0
+
+
+def test_failed_capture_frees_the_turn():
+    cache = SessionCache()
+    pool = ProcessWorkerPool(size=1, session_cache=cache)
+    pool._run = lambda task, on_event, on_session: "error result"
+    pool.run(WorkerTask("plan", [], "1", "Test", session_prefix=PREFIX))
+
+    assert cache.stats()["capturing"] == 0
+    assert cache.acquire(PREFIX.key) == (None, True)
+
+
+def test_rejected_session_is_invalidated_and_recaptured():
+    cache = SessionCache()
+    cache.acquire(PREFIX.key)
+    cache.store(PREFIX.key, captured())
+    session, _ = cache.acquire(PREFIX.key)
+
+    handoff = SessionHandoff(session, False)
+    assert handoff.acquire(PREFIX.key) == (session, False)
+    handoff.invalidate(PREFIX.key)
+    assert handoff.acquire(PREFIX.key) == (None, True)
+    fresh = captured()
+    handoff.store(PREFIX.key, fresh)
+
+    cache.apply(PREFIX.key, handoff.outcome)
+    assert cache.stats()["invalid"] == 1
+    assert cache.acquire(PREFIX.key) == (fresh, False)
+
+
+def test_outcome_defaults_change_nothing():
+    cache = SessionCache()
+    cache.apply(PREFIX.key, SessionOutcome())
+    assert cache.stats()["sessions"] == 0
+
+
+def test_killed_worker_closes_its_pipe(monkeypatch):
+    import worker_pool
+
+    class FakeProcess:
+        pid = 12345
+
+        def join(self, timeout):
+            pass
+
+    worker = worker_pool._Worker.__new__(worker_pool._Worker)
+    worker.conn, other_end = worker_pool._context.Pipe()
+    worker.process = FakeProcess()
+    monkeypatch.setattr(worker_pool, "kill_process_tree", lambda pid: None)
+    worker.kill()
+
+    assert worker.conn.closed
+    other_end.close()
+
+
+def test_all_workers_stay_idle_by_default():
+    pool = ProcessWorkerPool(size=6)
+    assert pool.max_idle == 6
@@ -0,0 +1,221 @@
+import os
+import time
+import logging
+import secrets
+import threading
+import contextvars
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Dict, List
+from file_utils import atomic_write_text
+from run_result import dumps
+
+logger = logging.getLogger(__name__)
+
+# Directory that receives one trace file per test run; empty disables the export
+TRACE_EXPORT_DIR = os.environ.get("TRACE_EXPORT_DIR", "")
+# "chrome" for chrome://tracing / Perfetto, "otel" for OTLP JSON
+TRACE_FORMAT = os.environ.get("TRACE_FORMAT", "chrome")
+# "1" records a span for every WebDriver command
+TRACE_COMMANDS = os.environ.get("TRACE_COMMANDS", "1") == "1"
+
+SERVICE_NAME = "testcase-runner"
+
+_current = contextvars.ContextVar("trace", default=None)
+
+
+@dataclass(slots=True)
+class Span:
+    name: str
+    category: str
+    start_ns: int
+    end_ns: int
+    pid: int
+    tid: int
+    attributes: Dict[str, object] = field(default_factory=dict)
+
+
+class Trace:
+    """Spans of one test run, timed with the monotonic clock.
+
+    The monotonic clock is shared by all processes on a host, so spans
+    recorded by a worker process line up with the API process's spans.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.spans: List[Span] = []
+        self.started_ns = time.monotonic_ns()
+        # Anchors monotonic times to the wall clock for formats that need epoch times
+        self.epoch_offset_ns = time.time_ns() - self.started_ns
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        # Results carrying a trace are pickled back from worker processes
+        state = self.__dict__.copy()
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def add(self, name, category, start_ns, end_ns=None, **attributes):
+        span = Span(name, category, start_ns, time.monotonic_ns() if end_ns is None else end_ns,
+                    os.getpid(), threading.get_native_id(), attributes)
+        with self._lock:
+            self.spans.append(span)
+        return span
+
+    @contextmanager
+    def span(self, name, category, **attributes):
+        started = time.monotonic_ns()
+        try:
+            yield attributes
+        finally:
+            self.add(name, category, started, **attributes)
+
+    def elapsed_ms(self):
+        return (time.monotonic_ns() - self.started_ns) / 1e6
+
+    def breakdown(self):
+        """Milliseconds per category, counting nested time only once per category"""
+        totals = {}
+        for category, spans in self._by_category().items():
+            total = 0
+            covered_until = None
+            for span in sorted(spans, key=lambda span: span.start_ns):
+                start = span.start_ns if covered_until is None else max(span.start_ns, covered_until)
+                if span.end_ns > start:
+                    total += span.end_ns - start
+                covered_until = span.end_ns if covered_until is None else max(covered_until, span.end_ns)
+            totals[category] = round(total / 1e6, 1)
+        return totals
+
+    def _by_category(self):
+        with self._lock:
+            spans = list(self.spans)
+        grouped = {}
+        for span in spans:
+            grouped.setdefault(span.category, []).append(span)
+        return grouped
+
+    def to_chrome(self):
+        """Trace Event Format, as loaded by chrome://tracing and Perfetto"""
+        with self._lock:
+            spans = list(self.spans)
+        return {
+            "traceEvents": [{
+                "name": span.name,
+                "cat": span.category,
+                "ph": "X",
+                "ts": span.start_ns / 1000,
+                "dur": (span.end_ns - span.start_ns) / 1000,
+                "pid": span.pid,
+                "tid": span.tid,
+                "args": span.attributes
+            } for span in sorted(spans, key=lambda span: (span.start_ns, -span.end_ns))],
+            "displayTimeUnit": "ms",
+            "otherData": {"trace": self.name}
+        }
+
+    def to_otel(self):
+        """OTLP/JSON export request; parents are the innermost enclosing span of the same thread"""
+        with self._lock:
+            spans = sorted(self.spans, key=lambda span: (span.start_ns, -span.end_ns))
+        trace_id = secrets.token_hex(16)
+        span_ids = [secrets.token_hex(8) for _ in spans]
+        open_spans = {}
+        otel_spans = []
+        for span, span_id in zip(spans, span_ids):
+            stack = open_spans.setdefault((span.pid, span.tid), [])
+            while stack and stack[-1][0].end_ns < span.end_ns:
+                stack.pop()
+            otel_spans.append({
+                "traceId": trace_id,
+                "spanId": span_id,
+                "parentSpanId": stack[-1][1] if stack else "",
+                "name": span.name,
+                "kind": 1,
+                "startTimeUnixNano": str(span.start_ns + self.epoch_offset_ns),
+                "endTimeUnixNano": str(span.end_ns + self.epoch_offset_ns),
+                "attributes": [_otel_attribute("category", span.category), _otel_attribute("process.pid", span.pid)]
+                + [_otel_attribute(key, value) for key, value in span.attributes.items()]
+            })
+            stack.append((span, span_id))
+        return {
+            "resourceSpans": [{
+                "resource": {"attributes": [_otel_attribute("service.name", SERVICE_NAME)]},
+                "scopeSpans": [{"scope": {"name": __name__}, "spans": otel_spans}]
+            }]
+        }
+
+
+def _otel_attribute(key, value):
+    if isinstance(value, bool):
+        typed = {"boolValue": value}
+    elif isinstance(value, int):
+        typed = {"intValue": str(value)}
+    elif isinstance(value, float):
+        typed = {"doubleValue": value}
+    else:
+        typed = {"stringValue": str(value)}
+    return {"key": key, "value": typed}
+
+
+@contextmanager
+def activate(trace):
+    """Make ``trace`` the one ``span`` records into on this thread"""
+    token = _current.set(trace)
+    try:
+        yield trace
+    finally:
+        _current.reset(token)
+
+
+@contextmanager
+def span(name, category, **attributes):
+    """Record a span in the active trace; does nothing outside a traced run"""
+    trace = _current.get()
+    if trace is None:
+        yield attributes
+        return
+    with trace.span(name, category, **attributes) as span_attributes:
+        yield span_attributes
+
+
+@contextmanager
+def trace_commands(driver, trace):
+    """Record every WebDriver command sent through ``driver`` (element commands included)"""
+    if not TRACE_COMMANDS:
+        yield
+        return
+    execute = driver.execute
+
+    def traced_execute(driver_command, params=None):
+        started = time.monotonic_ns()
+        try:
+            return execute(driver_command, params)
+        finally:
+            trace.add(driver_command, "webdriver", started)
+
+    # Shadows the bound method on this instance only; pooled drivers get it back afterwards
+    driver.execute = traced_execute
+    try:
+        yield
+    finally:
+        del driver.execute
+
+
+def export_trace(trace, test_case_id, export_dir=TRACE_EXPORT_DIR, trace_format=TRACE_FORMAT):
+    """Write ``trace`` to ``export_dir`` and return the file path, if exporting is enabled"""
+    if not export_dir or trace is None:
+        return None
+    data = trace.to_otel() if trace_format == "otel" else trace.to_chrome()
+    path = os.path.join(export_dir, f"trace-{test_case_id}-{time.time_ns() // 1_000_000}.json")
+    try:
+        atomic_write_text(path, dumps(data))
+    except OSError as e:
+        logger.warning(f"Failed to export trace for test case {test_case_id}: {str(e)}")
+        return None
+    return path
@@ -0,0 +1,162 @@
+import os
+import time
+import logging
+from tracing import span
+
+logger = logging.getLogger(__name__)
+
+# "ready" waits on page/element signals; "fixed" keeps the legacy sleeps
+WAIT_MODE = os.environ.get("WAIT_MODE", "ready")
+
+# Upper bound (seconds) of the readiness wait after each action type
+WAIT_BOUNDS = {
+    "navigate": 15,
+    "change": 5,
+    "click": 5,
+    "scroll": 2
+}
+DEFAULT_WAIT_BOUND = 5
+
+# Legacy fixed sleeps used in "fixed" mode
+FIXED_SLEEPS = {
+    "navigate": 3,
+    "change": 1,
+    "click": 1,
+    "scroll": 1
+}
+
+POLL_INTERVAL = 0.05
+
+# Counts in-flight fetch/XHR requests in window.__pendingRequests
+NETWORK_TRACKER_JS = """
+(function () {
+    if (window.__pendingRequests !== undefined) { return; }
+    window.__pendingRequests = 0;
+    function done() { window.__pendingRequests = Math.max(0, window.__pendingRequests - 1); }
+    if (window.fetch) {
+        var originalFetch = window.fetch;
+        window.fetch = function () {
+            window.__pendingRequests++;
+            try {
+                return originalFetch.apply(this, arguments).then(
+                    function (response) { done(); return response; },
+                    function (error) { done(); throw error; }
+                );
+            } catch (e) { done(); throw e; }
+        };
+    }
+    var originalSend = XMLHttpRequest.prototype.send;
+    XMLHttpRequest.prototype.send = function () {
+        window.__pendingRequests++;
+        this.addEventListener('loadend', done);
+        try { return originalSend.apply(this, arguments); } catch (e) { done(); throw e; }
+    };
+})();
+"""
+
+PAGE_READY_JS = (
+    "return document.readyState === 'complete' && !(window.__pendingRequests > 0);"
+)
+
+ELEMENT_STABLE_JS = """
+var el = arguments[0], callback = arguments[arguments.length - 1];
+function box() {
+    var r = el.getBoundingClientRect();
+    return [r.top, r.left, r.width, r.height].join(',');
+}
+var first = box();
+setTimeout(function () {
+    var style = window.getComputedStyle(el);
+    var visible = el.getClientRects().length > 0 && style.visibility !== 'hidden' && style.display !== 'none';
+    callback(visible && box() === first);
+}, 50);
+"""
+
+SCROLL_SETTLED_JS = """
+var callback = arguments[arguments.length - 1];
+var x = window.scrollX, y = window.scrollY;
+setTimeout(function () { callback(window.scrollX === x && window.scrollY === y); }, 50);
+"""
+
+
+def wait_bound(action_type, action=None):
+    """Per-action upper bound, overridable by a recorded ``waitTimeout``"""
+    if action and action.get('waitTimeout') is not None:
+        return float(action['waitTimeout'])
+    return WAIT_BOUNDS.get(action_type, DEFAULT_WAIT_BOUND)
+
+
+def install_network_tracker(driver):
+    """Track pending fetch/XHR requests on every document the driver loads"""
+    if getattr(driver, "_network_tracker_installed", False):
+        return
+    try:
+        driver.execute_cdp_cmd("Page.addScriptToEvaluateOnNewDocument", {"source": NETWORK_TRACKER_JS})
+        driver.execute_script(NETWORK_TRACKER_JS)
+        driver._network_tracker_installed = True
+    except Exception as e:
+        # Page readiness then relies on document.readyState alone
+        logger.warning(f"Failed to install network tracker: {str(e)}")
+
+
+def _poll(check, timeout, settle_checks=1):
+    """Poll ``check`` until it holds ``settle_checks`` times in a row or the timeout expires"""
+    deadline = time.monotonic() + timeout
+    streak = 0
+    while True:
+        try:
+            streak = streak + 1 if check() else 0
+        except Exception:
+            streak = 0
+        if streak >= settle_checks:
+            return True
+        if time.monotonic() >= deadline:
+            return False
+        time.sleep(POLL_INTERVAL)
+
+
+def wait_for_page_ready(driver, timeout):
+    """document.readyState is complete and no fetch/XHR is pending"""
+    return _poll(lambda: driver.execute_script(PAGE_READY_JS), timeout, settle_checks=2)
+
+
+def wait_for_element_stable(driver, element, timeout):
+    """Element is visible and its bounding box stopped moving"""
+    return _poll(lambda: driver.execute_async_script(ELEMENT_STABLE_JS, element), timeout)
+
+
+def wait_for_scroll_settled(driver, timeout):
+    """Window scroll position stopped changing"""
+    return _poll(lambda: driver.execute_async_script(SCROLL_SETTLED_JS), timeout)
+
+
+def settle(driver, action_type, element=None, timeout=None, mode=None):
+    """Wait until the page is ready for the step that follows ``action_type``.
+
+    In "fixed" mode this is the legacy ``time.sleep``. A readiness wait that
+    reaches its bound is logged and execution continues, just like the sleep.
+    """
+    mode = mode or WAIT_MODE
+    if mode == "fixed":
+        with span(f"sleep.{action_type}", "wait"):
+            time.sleep(FIXED_SLEEPS.get(action_type, 1))
+        return True
+
+    if timeout is None:
+        timeout = wait_bound(action_type)
+    started = time.monotonic()
+
+    with span(f"settle.{action_type}", "wait") as attributes:
+        if action_type == "navigate":
+            ready = wait_for_page_ready(driver, timeout)
+        elif element is not None:
+            ready = wait_for_element_stable(driver, element, timeout)
+        else:
+            ready = wait_for_scroll_settled(driver, timeout)
+        attributes["ready"] = ready
+
+    if not ready:
+        logger.debug(f"Readiness wait after {action_type} hit its {timeout}s bound")
+    else:
+        logger.debug(f"Ready after {action_type} in {(time.monotonic() - started) * 1000:.0f} ms")
+    return ready
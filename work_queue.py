@@ -0,0 +1,260 @@
+import os
+import json
+import time
+import sqlite3
+import logging
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from typing import Any
+from file_utils import state_path
+
+logger = logging.getLogger(__name__)
+
+# Queue backend shared by the coordinator and all workers, e.g. sqlite:////mnt/shared/queue.sqlite3
+WORK_QUEUE_URL = os.environ.get("WORK_QUEUE_URL", "")
+# Seconds a claimed item stays leased without a heartbeat
+WORK_LEASE_SECONDS = float(os.environ.get("WORK_LEASE_SECONDS", "60"))
+# Claims of one item before it is failed instead of requeued
+WORK_MAX_ATTEMPTS = int(os.environ.get("WORK_MAX_ATTEMPTS", "3"))
+
+QUEUE_FILE = "work_queue.sqlite3"
+
+QUEUED = "queued"
+LEASED = "leased"
+DONE = "done"
+FAILED = "failed"
+
+
+@dataclass(slots=True)
+class WorkItem:
+    id: int
+    payload: Any
+    attempts: int
+
+
+@dataclass(slots=True)
+class FinishedItem:
+    id: int
+    status: str
+    result: Any
+    error: str
+
+
+class WorkQueue(ABC):
+    """Contract of a work queue backend.
+
+    Items are claimed under a lease that workers extend with ``heartbeat``;
+    leases that expire (the worker died or lost contact) are requeued until
+    ``max_attempts`` claims, then failed. Lease times use the wall clock
+    since coordinator and workers may run on different hosts.
+    """
+
+    @abstractmethod
+    def enqueue(self, payload):
+        """Add an item and return its id"""
+
+    @abstractmethod
+    def claim(self, worker_id, lease_seconds=WORK_LEASE_SECONDS):
+        """Lease the oldest queued item to ``worker_id``; None if the queue is empty"""
+
+    @abstractmethod
+    def heartbeat(self, item_id, worker_id, lease_seconds=WORK_LEASE_SECONDS):
+        """Extend a lease; False if the worker no longer holds it"""
+
+    @abstractmethod
+    def complete(self, item_id, worker_id, result):
+        """Store the result of a leased item; False if the lease was lost"""
+
+    @abstractmethod
+    def release(self, item_id, worker_id, error):
+        """Give a leased item back after a worker-side error"""
+
+    @abstractmethod
+    def requeue_expired(self):
+        """Requeue or fail items whose lease expired; returns how many"""
+
+    @abstractmethod
+    def finished(self, item_ids):
+        """``FinishedItem`` for each of ``item_ids`` that is done or failed"""
+
+    @abstractmethod
+    def acknowledge(self, item_ids):
+        """Drop finished items once their results were collected"""
+
+    @abstractmethod
+    def cancel(self, item_ids):
+        """Drop items in any state; a worker still running one loses its lease and its result"""
+
+    @abstractmethod
+    def stats(self):
+        """Item counts by status and the number of recently seen workers"""
+
+
+class SQLiteWorkQueue(WorkQueue):
+    """Work queue in a SQLite file; needs no services, only a path every node can reach"""
+
+    def __init__(self, path, max_attempts=WORK_MAX_ATTEMPTS):
+        self.path = path
+        self.max_attempts = max(1, max_attempts)
+        # Default rollback journal: WAL is unsafe when the file sits on a network share
+        with self._connect() as db:
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS work_items ("
+                " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+                " payload TEXT NOT NULL,"
+                " status TEXT NOT NULL,"
+                " worker_id TEXT,"
+                " lease_expires REAL,"
+                " attempts INTEGER NOT NULL DEFAULT 0,"
+                " result TEXT,"
+                " error TEXT,"
+                " updated_at REAL NOT NULL)"
+            )
+            db.execute("CREATE INDEX IF NOT EXISTS work_items_status ON work_items (status, id)")
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS workers ("
+                " worker_id TEXT PRIMARY KEY,"
+                " last_seen REAL NOT NULL)"
+            )
+
+    def _connect(self):
+        # A connection per call keeps the queue usable from any thread
+        db = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        return _Transaction(db)
+
+    def enqueue(self, payload):
+        with self._connect() as db:
+            cursor = db.execute(
+                "INSERT INTO work_items (payload, status, updated_at) VALUES (?, ?, ?)",
+                (json.dumps(payload), QUEUED, time.time())
+            )
+            return cursor.lastrowid
+
+    def claim(self, worker_id, lease_seconds=WORK_LEASE_SECONDS):
+        self.requeue_expired()
+        now = time.time()
+        with self._connect() as db:
+            db.execute("INSERT OR REPLACE INTO workers (worker_id, last_seen) VALUES (?, ?)", (worker_id, now))
+            row = db.execute(
+                "SELECT id, payload, attempts FROM work_items WHERE status = ? ORDER BY id LIMIT 1", (QUEUED,)
+            ).fetchone()
+            if row is None:
+                return None
+            db.execute(
+                "UPDATE work_items SET status = ?, worker_id = ?, lease_expires = ?, attempts = attempts + 1,"
+                " updated_at = ? WHERE id = ?",
+                (LEASED, worker_id, now + lease_seconds, now, row[0])
+            )
+            return WorkItem(row[0], json.loads(row[1]), row[2] + 1)
+
+    def heartbeat(self, item_id, worker_id, lease_seconds=WORK_LEASE_SECONDS):
+        now = time.time()
+        with self._connect() as db:
+            db.execute("INSERT OR REPLACE INTO workers (worker_id, last_seen) VALUES (?, ?)", (worker_id, now))
+            cursor = db.execute(
+                "UPDATE work_items SET lease_expires = ?, updated_at = ?"
+                " WHERE id = ? AND status = ? AND worker_id = ?",
+                (now + lease_seconds, now, item_id, LEASED, worker_id)
+            )
+            return cursor.rowcount == 1
+
+    def complete(self, item_id, worker_id, result):
+        with self._connect() as db:
+            cursor = db.execute(
+                "UPDATE work_items SET status = ?, result = ?, error = NULL, lease_expires = NULL, updated_at = ?"
+                " WHERE id = ? AND status = ? AND worker_id = ?",
+                (DONE, json.dumps(result), time.time(), item_id, LEASED, worker_id)
+            )
+            return cursor.rowcount == 1
+
+    def release(self, item_id, worker_id, error):
+        with self._connect() as db:
+            db.execute(
+                "UPDATE work_items SET status = CASE WHEN attempts >= ? THEN ? ELSE ? END,"
+                " worker_id = NULL, lease_expires = NULL, error = ?, updated_at = ?"
+                " WHERE id = ? AND status = ? AND worker_id = ?",
+                (self.max_attempts, FAILED, QUEUED, error, time.time(), item_id, LEASED, worker_id)
+            )
+
+    def requeue_expired(self):
+        now = time.time()
+        with self._connect() as db:
+            cursor = db.execute(
+                "UPDATE work_items SET status = CASE WHEN attempts >= ? THEN ? ELSE ? END,"
+                " error = 'Worker lease expired', worker_id = NULL, lease_expires = NULL, updated_at = ?"
+                " WHERE status = ? AND lease_expires < ?",
+                (self.max_attempts, FAILED, QUEUED, now, LEASED, now)
+            )
+            if cursor.rowcount:
+                logger.warning(f"Requeued {cursor.rowcount} work items with expired leases")
+            return cursor.rowcount
+
+    def finished(self, item_ids):
+        if not item_ids:
+            return []
+        placeholders = ",".join("?" * len(item_ids))
+        with self._connect() as db:
+            rows = db.execute(
+                f"SELECT id, status, result, error FROM work_items"
+                f" WHERE id IN ({placeholders}) AND status IN (?, ?)",
+                (*item_ids, DONE, FAILED)
+            ).fetchall()
+        return [FinishedItem(row[0], row[1], json.loads(row[2]) if row[2] else None, row[3]) for row in rows]
+
+    def acknowledge(self, item_ids):
+        self._delete(item_ids, (DONE, FAILED))
+
+    def cancel(self, item_ids):
+        self._delete(item_ids, (QUEUED, LEASED, DONE, FAILED))
+
+    def _delete(self, item_ids, statuses):
+        if not item_ids:
+            return
+        placeholders = ",".join("?" * len(item_ids))
+        status_placeholders = ",".join("?" * len(statuses))
+        with self._connect() as db:
+            db.execute(
+                f"DELETE FROM work_items WHERE id IN ({placeholders}) AND status IN ({status_placeholders})",
+                (*item_ids, *statuses)
+            )
+
+    def stats(self):
+        with self._connect() as db:
+            counts = dict(db.execute("SELECT status, COUNT(*) FROM work_items GROUP BY status").fetchall())
+            workers = db.execute(
+                "SELECT COUNT(*) FROM workers WHERE last_seen > ?", (time.time() - 2 * WORK_LEASE_SECONDS,)
+            ).fetchone()[0]
+        return {
+            "queued": counts.get(QUEUED, 0),
+            "leased": counts.get(LEASED, 0),
+            "done": counts.get(DONE, 0),
+            "failed": counts.get(FAILED, 0),
+            "activeWorkers": workers
+        }
+
+
+class _Transaction:
+    """Runs the statements of a ``with`` block in one immediate transaction"""
+
+    def __init__(self, db):
+        self.db = db
+
+    def __enter__(self):
+        self.db.execute("BEGIN IMMEDIATE")
+        return self.db
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            self.db.execute("ROLLBACK" if exc_type else "COMMIT")
+        finally:
+            self.db.close()
+        return False
+
+
+def open_work_queue(url=WORK_QUEUE_URL):
+    """Open the queue backend named by ``url`` (a local SQLite file by default)"""
+    if not url:
+        return SQLiteWorkQueue(state_path(QUEUE_FILE))
+    if url.startswith("sqlite:///"):
+        return SQLiteWorkQueue(url[len("sqlite:///"):])
+    raise ValueError(f"Unsupported work queue backend: {url}")
@@ -0,0 +1,333 @@
+import os
+import time
+import signal
+import logging
+import threading
+import multiprocessing
+from dataclasses import dataclass, replace
+from typing import Optional
+from admission import ADMISSION_MAX_CONCURRENCY, MB, get_admission_controller, process_tree, process_tree_rss
+from action_interpreter import compile_plan
+from app import create_error_result, run_selenium_plan, run_selenium_test
+from driver_pool import DriverPool
+from failure_policy import FAILURE_POLICY
+from locator import get_locator_ranking
+from profile_template import get_profile_template
+from run_result import RunResult
+from session_cache import CapturedSession, SessionHandoff, SessionPrefix, get_session_cache
+from step_timings import get_step_timings
+
+logger = logging.getLogger(__name__)
+
+# "process" runs tests in worker processes, "thread" on threads of the API process
+EXECUTION_ISOLATION = os.environ.get("EXECUTION_ISOLATION", "process")
+# Concurrent worker processes
+WORKER_POOL_SIZE = int(os.environ.get("WORKER_POOL_SIZE", str(ADMISSION_MAX_CONCURRENCY)))
+# Idle workers kept running between tests; all of them when unset, so a suite never respawns workers
+WORKER_MAX_IDLE = int(os.environ["WORKER_MAX_IDLE"]) if os.environ.get("WORKER_MAX_IDLE") else None
+# Restart a worker after this many tests...
+WORKER_MAX_TESTS = int(os.environ.get("WORKER_MAX_TESTS", "50"))
+# ...or once its process tree (including Chrome) uses this much memory
+WORKER_MAX_RSS_MB = int(os.environ.get("WORKER_MAX_RSS_MB", "1500"))
+# Wall-clock limit per test before the worker and its browser are killed
+WORKER_TEST_TIMEOUT = float(os.environ.get("WORKER_TEST_TIMEOUT", "600"))
+WORKER_STOP_TIMEOUT = 10
+
+# Spawned workers start clean instead of inheriting the API's threads
+_context = multiprocessing.get_context("spawn")
+
+
+@dataclass(slots=True)
+class WorkerTask:
+    """A test run sent to a worker: a recorded action list or a generated file.
+
+    Kind "profile" builds the browser profile template from the URLs in ``source``.
+    """
+    kind: str
+    source: object
+    test_case_id: Optional[str]
+    test_case_name: Optional[str]
+    failure_policy: str = FAILURE_POLICY
+    session_prefix: Optional[SessionPrefix] = None
+    network_profile: Optional[str] = None
+    # Filled in by ProcessWorkerPool.run from the API process's session cache
+    session: Optional[CapturedSession] = None
+    capture_session: bool = False
+
+
+def _worker_main(conn):
+    """Worker process loop: run tasks on this worker's own browser until told to stop"""
+    logging.basicConfig(level=logging.INFO)
+    pool = DriverPool(size=1)
+    # Launch the browser while the worker waits for its first test
+    pool.warm()
+    try:
+        while True:
+            task = conn.recv()
+            if task is None:
+                return
+
+            def on_event(event):
+                conn.send(("event", event))
+
+            handoff = SessionHandoff(task.session, task.capture_session) if task.session_prefix else None
+
+            if task.kind == "profile":
+                try:
+                    result = get_profile_template().build(task.source, force=False)
+                except Exception as e:
+                    logger.error(f"Failed to build browser profile template: {str(e)}")
+                    result = False
+            elif task.kind == "plan":
+                result = run_selenium_plan(compile_plan(task.source), task.test_case_id, task.test_case_name,
+                                           pool=pool, on_event=on_event, failure_policy=task.failure_policy,
+                                           session_prefix=task.session_prefix,
+                                           network_profile=task.network_profile, session_cache=handoff)
+            else:
+                result = run_selenium_test(task.source, task.test_case_id, task.test_case_name,
+                                           pool=pool, on_event=on_event, failure_policy=task.failure_policy,
+                                           session_prefix=task.session_prefix,
+                                           network_profile=task.network_profile, session_cache=handoff)
+            if handoff is not None:
+                conn.send(("session", handoff.outcome))
+            # Save before reporting: the watchdog may kill this worker at any later point
+            get_step_timings().save()
+            get_locator_ranking().save()
+            rss = process_tree_rss([os.getpid()])[os.getpid()]
+            conn.send(("result", result, rss))
+    except (EOFError, KeyboardInterrupt):
+        pass
+    finally:
+        pool.close()
+
+
+def kill_process_tree(pid):
+    """SIGKILL a process and every descendant (chromedriver, Chrome and its helpers)"""
+    for tree_pid in process_tree(pid):
+        try:
+            os.kill(tree_pid, signal.SIGKILL)
+        except OSError:
+            pass
+
+
+class _Worker:
+    def __init__(self):
+        self.conn, child_conn = _context.Pipe()
+        self.process = _context.Process(target=_worker_main, args=(child_conn,), name="test-worker", daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.tests = 0
+        self.rss = 0
+
+    @property
+    def pid(self):
+        return self.process.pid
+
+    def stop(self):
+        try:
+            self.conn.send(None)
+            self.process.join(WORKER_STOP_TIMEOUT)
+        except (OSError, ValueError):
+            pass
+        if self.process.is_alive():
+            self.kill()
+        self.conn.close()
+
+    def kill(self):
+        kill_process_tree(self.pid)
+        self.process.join(WORKER_STOP_TIMEOUT)
+        self.conn.close()
+
+
+class WorkerFailed(Exception):
+    """A worker died or overran its time limit during a test"""
+
+
+class ProcessWorkerPool:
+    """Runs tests in worker processes that each own a browser.
+
+    A test that overruns ``test_timeout`` or crashes its worker has the
+    worker's whole process tree killed and yields an error result; the API
+    process only relays messages. Workers are replaced after ``max_tests``
+    tests or once their tree exceeds ``max_rss`` bytes. At most ``max_idle``
+    workers wait for work; extra ones exit after their test.
+
+    Captured login sessions live in this process's ``session_cache``, so
+    every worker reuses them: a task carries the session to restore (or the
+    turn to capture one) and the worker reports back what it did with it.
+    """
+
+    def __init__(self, size=WORKER_POOL_SIZE, max_idle=WORKER_MAX_IDLE, max_tests=WORKER_MAX_TESTS,
+                 max_rss=WORKER_MAX_RSS_MB * MB, test_timeout=WORKER_TEST_TIMEOUT, session_cache=None):
+        self.size = max(1, size)
+        self.max_idle = self.size if max_idle is None else max(0, max_idle)
+        self.max_tests = max(1, max_tests)
+        self.max_rss = max_rss
+        self.test_timeout = test_timeout
+        self.session_cache = session_cache
+        self._slots = threading.BoundedSemaphore(self.size)
+        self._idle = []
+        self._busy = 0
+        self._restarts = 0
+        self._timeouts = 0
+        self._closed = False
+        self._lock = threading.Lock()
+
+    def warm(self):
+        """Start workers until ``max_idle`` are waiting"""
+        while True:
+            with self._lock:
+                if self._closed or len(self._idle) >= self.max_idle:
+                    return
+            worker = _Worker()
+            with self._lock:
+                if self._closed:
+                    break
+                self._idle.append(worker)
+        worker.stop()
+
+    def warm_async(self):
+        threading.Thread(target=self.warm, name="worker-pool-warm", daemon=True).start()
+
+    def run(self, task, on_event=None):
+        """Run ``task`` on a worker and return its ``RunResult``"""
+        if task.session_prefix is None:
+            return self._run(task, on_event, None)
+        cache = self.session_cache or get_session_cache()
+        # Waits for a concurrent capture of the same login before taking a worker slot
+        session, capture = cache.acquire(task.session_prefix.key)
+        try:
+            return self._run(replace(task, session=session, capture_session=capture), on_event,
+                             lambda outcome: cache.apply(task.session_prefix.key, outcome))
+        finally:
+            if capture:
+                # No-op once a captured session was stored; frees waiting runs if the worker failed
+                cache.abandon(task.session_prefix.key)
+
+    def _run(self, task, on_event, on_session):
+        self._slots.acquire()
+        try:
+            worker = self._acquire()
+            try:
+                with get_admission_controller().track_pid(worker.pid):
+                    result = self._dispatch(worker, task, on_event, on_session)
+            except WorkerFailed as e:
+                logger.error(f"Worker {worker.pid} failed on test case {task.test_case_id}: {str(e)}")
+                worker.kill()
+                with self._lock:
+                    self._busy -= 1
+                    self._restarts += 1
+                return create_error_result(RunResult(task.test_case_id, task.test_case_name), str(e))
+            self._release(worker)
+            return result
+        finally:
+            self._slots.release()
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+            idle, self._idle = self._idle, []
+        for worker in idle:
+            worker.stop()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "size": self.size,
+                "idle": len(self._idle),
+                "busy": self._busy,
+                "restarts": self._restarts,
+                "timeouts": self._timeouts,
+                "maxTests": self.max_tests,
+                "maxRssBytes": self.max_rss,
+                "testTimeout": self.test_timeout
+            }
+
+    def _acquire(self):
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("Worker pool is closed")
+            self._busy += 1
+            while self._idle:
+                worker = self._idle.pop()
+                if worker.process.is_alive():
+                    return worker
+                worker.conn.close()
+        try:
+            return _Worker()
+        except Exception:
+            with self._lock:
+                self._busy -= 1
+            raise
+
+    def _release(self, worker):
+        recycle = worker.tests >= self.max_tests or worker.rss >= self.max_rss
+        with self._lock:
+            self._busy -= 1
+            keep = not recycle and not self._closed and len(self._idle) < self.max_idle
+            if keep:
+                self._idle.append(worker)
+            elif recycle:
+                self._restarts += 1
+        if not keep:
+            if recycle:
+                logger.info(f"Restarting worker {worker.pid} after {worker.tests} tests "
+                            f"at {worker.rss // MB} MB")
+            worker.stop()
+            self.warm_async()
+
+    def _dispatch(self, worker, task, on_event, on_session):
+        deadline = time.monotonic() + self.test_timeout
+        try:
+            worker.conn.send(task)
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    with self._lock:
+                        self._timeouts += 1
+                    raise WorkerFailed(f"Test exceeded the {self.test_timeout:.0f}s time limit and was killed")
+                if not worker.conn.poll(min(remaining, 1.0)):
+                    if not worker.process.is_alive():
+                        raise WorkerFailed(f"Worker exited with code {worker.process.exitcode}")
+                    continue
+                message = worker.conn.recv()
+                if message[0] == "event":
+                    if on_event is not None:
+                        on_event(message[1])
+                    continue
+                if message[0] == "session":
+                    if on_session is not None:
+                        on_session(message[1])
+                    continue
+                _, result, worker.rss = message
+                worker.tests += 1
+                return result
+        except (EOFError, OSError) as e:
+            raise WorkerFailed(f"Lost connection to worker: {str(e)}")
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_worker_pool():
+    """Return the process-wide worker pool, creating it on first use"""
+    global _pool
+    with _pool_lock:
+        if _pool is None or _pool._closed:
+            _pool = ProcessWorkerPool()
+        return _pool
+
+
+def build_profile_template_in_worker(urls):
+    """Build the browser profile template on a worker, admitted like a test run"""
+    with get_admission_controller().admit():
+        get_worker_pool().run(WorkerTask("profile", urls, None, "Browser profile template"))
+
+
+def shutdown_worker_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+            _pool = None